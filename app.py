@@ -1,20 +1,38 @@
+import functools
+import os
 import streamlit as st
 import time
-from llm_manager import LLMManager
-from utils import init_session_state, get_base64_download_link, create_pdf_report
+import threading
+from client_registry import get_llm_manager, get_registry
+from prefetch import QuestionBatcher, QuestionPrefetcher
+from sandbox import get_engine, evaluation_from_result
+from profiler import get_profiler
+from dedup_index import generate_unique, get_dedup_index, question_text
+from history_store import get_history_store
+from question_bank import get_question_bank, mode_name
+from report_digest import HistoryDigest
+from telemetry_view import is_dev_mode, render_telemetry_page
+from pdf_report import get_report_cache
+from utils import init_session_state, record_history, read_static, begin_rerun, end_rerun, rerun, save_session_state, fragment
 
 # Page Config
 st.set_page_config(page_title="Cognitio Libera", page_icon="🚀", layout="wide")
+begin_rerun()
 
 # Load CSS
 def load_css():
-    with open("style.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{read_static('style.css')}</style>", unsafe_allow_html=True)
 load_css()
 
 # Initialize Session State
 init_session_state()
 
+# Dev-only telemetry page (?view=telemetry)
+if is_dev_mode() and st.query_params.get("view") == "telemetry":
+    render_telemetry_page()
+    end_rerun()
+    st.stop()
+
 # Sidebar Setup
 with st.sidebar:
     st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/8/8a/Google_Gemini_logo.svg/2560px-Google_Gemini_logo.svg.png", width=150)
@@ -30,26 +48,39 @@ with st.sidebar:
         st.error("❌ GEMINI_API_KEY is missing in .streamlit/secrets.toml")
         st.stop()
 
-    language = st.selectbox("Programming Language", ["Python", "Java", "Java (BlueJ)", "JavaScript", "PHP", "HTML5", "CSS", "XHTML"])
-    difficulty = st.selectbox("Difficulty", ["Easy", "Medium", "Hard (DSA)"])
+    # Shared process-wide client: configured once, reused by every rerun and session
+    llm_manager = get_llm_manager(api_key)
+
+    # Rolling report input, updated by record_history as answers land
+    if "history_digest" not in st.session_state:
+        st.session_state.history_digest = HistoryDigest.from_store(
+            get_history_store(), st.session_state.user_id, summarizer=llm_manager.summarize_history)
+
+    language = st.selectbox("Programming Language", ["Python", "Java", "Java (BlueJ)", "JavaScript", "PHP", "HTML5", "CSS", "XHTML"], key="language")
+    difficulty = st.selectbox("Difficulty", ["Easy", "Medium", "Hard (DSA)"], key="difficulty")
     
     # Practice Mode Selection
-    practice_mode = st.radio("Practice Mode", ["Coding Challenge (LeetCode)", "Quiz Mode (MCQ)"])
+    practice_mode = st.radio("Practice Mode", ["Coding Challenge (LeetCode)", "Quiz Mode (MCQ)"], key="practice_mode_choice")
     if "practice_mode" not in st.session_state or st.session_state.practice_mode != practice_mode:
         st.session_state.practice_mode = practice_mode
         st.session_state.current_question = None # Reset question on mode switch
-        st.rerun()
+        rerun()
 
     st.markdown("---")
     if st.button("Generate Report 📊"):
         if st.session_state.history:
             try:
-                llm_manager = LLMManager(api_key)
-                with st.spinner("Generating detailed report..."):
-                    report_text = llm_manager.generate_report(st.session_state.history)
-                    # Convert to PDF
-                    pdf_bytes = create_pdf_report(report_text)
-                    st.markdown(get_base64_download_link(pdf_bytes, "progress_report.pdf", "📥 Download PDF Report", mime_type='application/pdf'), unsafe_allow_html=True)
+                # Stream the Markdown report as it is generated, then convert the full text
+                # Token-budgeted digest: aggregates, cached summaries of older answers, recent answers
+                digest = st.session_state.history_digest.render()
+                report_text = st.write_stream(llm_manager.stream_report(digest))
+                with st.spinner("Preparing PDF..."):
+                    # Rendered once per distinct report and kept on disk; the download is served
+                    # from that file instead of a base64 blob in the page
+                    pdf_path = get_report_cache().get_or_render(report_text)
+                    with open(pdf_path, "rb") as pdf_file:
+                        st.download_button("📥 Download PDF Report", pdf_file, file_name="progress_report.pdf",
+                                           mime="application/pdf", on_click="ignore")
             except Exception as e:
                     st.error(f"Error generating report: {e}")
         else:
@@ -58,14 +89,125 @@ with st.sidebar:
 # Main App Logic
 st.title("🚀 Cognitio Libera")
 
-# No longer checking if api_key is missing here because we stop earlier if it is.
-llm_manager = LLMManager(api_key)
+# Live questions are generated this many per request and handed out one at a time (1 = one per request)
+QUESTION_BATCH_SIZE = int(os.environ.get("COGNITIO_QUESTION_BATCH", "5"))
 
-# Helper for continuous timer
-def timer_component(start_time):
-    # This HTML/JS will update the timer client-side without rerunning the script
-    st.components.v1.html(
-        f"""
+def make_question_generator(manager, user_id):
+    def generate_batch(language, difficulty, practice_mode, avoid, count):
+        if "Coding" in practice_mode:
+            return manager.generate_coding_question_batch(language, difficulty, count, avoid)
+        return manager.generate_mcq_batch(language, difficulty, count, avoid)
+    batcher = QuestionBatcher(generate_batch, QUESTION_BATCH_SIZE)
+    # Titles drawn from the bank and not yet served or discarded. generate runs on prefetch workers
+    # while serve/discard run on the script thread, so every access holds banked_lock.
+    banked_titles = set()
+    banked_lock = threading.Lock()
+
+    def take_banked(title):
+        # True (and forgets the title) if it came from the bank
+        with banked_lock:
+            if title in banked_titles:
+                banked_titles.discard(title)
+                return True
+            return False
+
+    def dedup_scope(language, practice_mode):
+        # Near-duplicates of anything this user has been given before are regenerated
+        return f"{user_id}|{language}|{practice_mode}"
+
+    def generate(language, difficulty, practice_mode, topic_history):
+        def generate_once(avoid):
+            if batcher.batch_size > 1:
+                return batcher.next(language, difficulty, practice_mode, avoid)
+            if "Coding" in practice_mode:
+                return manager.generate_coding_question(language, difficulty, avoid)
+            return manager.generate_mcq(language, difficulty, avoid)
+        scope = dedup_scope(language, practice_mode)
+        # Pre-generated bank first (an index lookup); live generation only once it is exhausted
+        banked = get_question_bank().draw(user_id, language, difficulty, mode_name(practice_mode),
+                                          exclude_titles=topic_history)
+        if banked is not None:
+            # The bank is deduplicated already; the index learns about it in serve()
+            with banked_lock:
+                banked_titles.add(banked.title)
+            return banked
+        return generate_unique(generate_once, get_dedup_index(), scope, topic_history)
+
+    def serve(key, question):
+        # A banked question counts as served for this user once it is shown, not when it is drawn
+        language, _, practice_mode = key
+        get_question_bank().mark_served(user_id, language, mode_name(practice_mode), question.title)
+        if take_banked(question.title):
+            get_dedup_index().add(question_text(question), question.title, dedup_scope(language, practice_mode))
+
+    def discard(key, question):
+        # Never shown: give back the bank reservation, or the dedup entry generate_unique added
+        language, _, practice_mode = key
+        if take_banked(question.title):
+            get_question_bank().release(user_id, language, mode_name(practice_mode), question.title)
+        else:
+            get_dedup_index().remove(question_text(question), question.title, dedup_scope(language, practice_mode))
+    generate.batcher = batcher
+    generate.serve = serve
+    generate.discard = discard
+    return generate
+
+# Background queue of ready-to-serve questions for the current sidebar selection. The prefetcher and
+# the synchronous path share one generator, so both draw from the same batches.
+if "prefetcher" not in st.session_state:
+    st.session_state.question_generator = make_question_generator(llm_manager, st.session_state.user_id)
+    generator = st.session_state.question_generator
+    st.session_state.prefetcher = QuestionPrefetcher(generator, on_serve=generator.serve, on_discard=generator.discard)
+prefetcher = st.session_state.prefetcher
+prefetch_key = (language, difficulty, practice_mode)
+prefetcher.set_active(prefetch_key, st.session_state.topic_history)
+
+with st.sidebar:
+    with st.expander("⚡ Performance"):
+        st.json(prefetcher.stats.as_dict())
+        st.json(st.session_state.question_generator.batcher.as_dict())
+        st.json(llm_manager.stream_metrics.summary())
+        st.json(llm_manager.structured_stats.summary())
+        # Response length and latency per task and difficulty, with each task's current output cap
+        st.json(llm_manager.profiles.summary())
+        # Submissions answered by the local pre-check instead of an evaluation call
+        st.json(llm_manager.prechecker.stats.as_dict())
+        if hasattr(llm_manager.model, "stats"):
+            st.json(llm_manager.model.stats())
+        st.json(get_dedup_index().stats())
+        st.json(get_question_bank().stats())
+        st.json(get_report_cache().stats())
+        # Script runs this session: full reruns vs fragment-only reruns
+        st.json(st.session_state.get("rerun_counts", {}))
+        if llm_manager.eval_cache is not None:
+            st.json(llm_manager.eval_cache.stats())
+        if st.button("Check API health"):
+            st.json(get_registry().health_check(api_key))
+        if is_dev_mode() and st.button("Open telemetry"):
+            st.query_params["view"] = "telemetry"
+            rerun()
+
+    with st.expander("📜 History"):
+        # Paged straight from the history store; only the visible page is loaded
+        store = get_history_store()
+        filter_language = st.selectbox("Language", ["All", language], key="history_language")
+        filter_result = st.selectbox("Result", ["All", "Correct", "Incorrect"], key="history_result")
+        filters = {
+            "language": None if filter_language == "All" else filter_language,
+            "is_correct": None if filter_result == "All" else filter_result == "Correct",
+        }
+        total = store.count(st.session_state.user_id, **filters)
+        page_size = 10
+        pages = max(1, (total + page_size - 1) // page_size)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="history_page")
+        for item in store.query(st.session_state.user_id, limit=page_size, offset=(page - 1) * page_size, **filters):
+            st.markdown(f"{'✅' if item['is_correct'] else '❌'} **{item['question']}** · {item['language']} · {item['difficulty']}")
+
+# Question-level HTML is built once per question and reused by every rerun; an unchanged element
+# is also kept as-is by the frontend, so the timer iframe is not reloaded on unrelated reruns
+@functools.lru_cache(maxsize=64)
+def timer_html(start_time):
+    return f"""
         <div style="font-family: 'Inter', sans-serif; font-size: 1.5rem; font-weight: 600; color: #e0e0e0;">
             <span id="timer">00:00</span>
         </div>
@@ -84,9 +226,251 @@ def timer_component(start_time):
             setInterval(updateTimer, 1000);
             updateTimer();
         </script>
-        """,
-        height=50
-    )
+        """
+
+# Helper for continuous timer
+def timer_component(start_time):
+    # This HTML/JS will update the timer client-side without rerunning the script
+    st.components.v1.html(timer_html(start_time), height=50)
+
+@functools.lru_cache(maxsize=256)
+def coding_card_html(title, description, examples, constraints):
+    return f"""
+        <div class="question-card">
+            <h2>{title}</h2>
+            <p>{description}</p>
+            <h4>Examples:</h4>
+            <ul>{"".join([f"<li>{ex}</li>" for ex in examples])}</ul>
+            <h4>Constraints:</h4>
+            <ul>{"".join([f"<li>{c}</li>" for c in constraints])}</ul>
+        </div>
+        """
+
+@functools.lru_cache(maxsize=256)
+def quiz_card_html(title):
+    return f"""
+        <div class="question-card">
+            <h2>{title}</h2>
+        </div>
+        """
+
+@fragment
+def coding_answer_area(llm_manager, language, difficulty):
+    # Editing and submitting rerun only this fragment; Refresh/Skip need a full run for the next question
+    q = st.session_state.current_question
+    if q is None:
+        return
+
+    # Code Input
+    user_code = st.text_area("Your Solution:", value=q.starter_code, height=300)
+    
+    col1, col2, col3 = st.columns([1.5, 1, 1])
+    with col1:
+        submit = st.button("Submit Solution", type="primary")
+    with col2:
+        if st.button("🔄 Refresh"):
+            st.session_state.current_question = None
+            st.session_state.trigger_next = True
+            rerun()
+    with col3:
+        if st.button("⏩ Skip"):
+            st.session_state.current_question = None
+            st.session_state.trigger_next = True
+            rerun()
+
+    if submit:
+        with st.spinner("Evaluating your solution..."):
+            try:
+                # Empty, unchanged, non-compiling or stub submissions are answered instantly
+                evaluation = llm_manager.prechecker.check(q, user_code, language)
+                # Then, where the deployment opted in (COGNITIO_LOCAL_EXECUTION), the question's test
+                # cases run locally; that verdict needs no LLM call either
+                execution = get_engine().run(q, user_code, language) if evaluation is None else None
+                if evaluation is not None:
+                    st.session_state.mentor_request = None
+                elif execution is not None:
+                    evaluation = evaluation_from_result(execution)
+                    # Mentor review (style, complexity, tips) is an LLM call, made only if asked for
+                    st.session_state.mentor_request = (q, user_code, language, difficulty)
+                    if execution.all_passed and get_profiler().supports(q, language):
+                        # Correct answers are benchmarked on growing inputs to measure their complexity
+                        st.session_state.profile_future = get_profiler().submit(q, user_code, language)
+                else:
+                    # No local run (disabled, or no tests): stream the mentor's explanation while the verdict is generated
+                    live_explanation = st.empty()
+                    evaluation_stream = llm_manager.evaluate_code_stream(q, user_code, language, difficulty)
+                    with live_explanation.container():
+                        st.write_stream(evaluation_stream)
+                    live_explanation.empty()
+                    evaluation = evaluation_stream.result
+                    st.session_state.mentor_request = None
+                st.session_state.feedback = evaluation
+                st.session_state.question_answered = True
+                
+                # Update history immediately
+                entry = {
+                    "question": q.title,
+                    "mode": "coding",
+                    "difficulty": difficulty,
+                    "language": language,
+                    "user_code": user_code,
+                    "is_correct": evaluation.is_correct,
+                    "explanation": evaluation.explanation
+                }
+                if execution is not None:
+                    entry["tests_passed"] = f"{execution.passed}/{execution.total}"
+                    entry["runtime_ms"] = round(execution.runtime_ms, 3)
+                record_history(entry)
+                
+                if evaluation.is_correct:
+                    st.balloons()
+            except Exception as e:
+                st.error(f"Error evaluating code: {e}")
+
+    coding_feedback_panel()
+
+@fragment
+def coding_feedback_panel():
+    # Consistent Feedback Display (Persists after reload); the mentor button reruns only this panel
+    q = st.session_state.current_question
+    if not (q is not None and st.session_state.get("question_answered", False) and st.session_state.feedback):
+        return
+    evaluation = st.session_state.feedback
+    if evaluation.is_correct:
+        st.markdown(f"""
+        <div class="feedback-card correct">
+            <h3>✅ Correct!</h3>
+            <p>{evaluation.explanation}</p>
+            <h4>Thinking Process:</h4>
+            <ul>{"".join([f"<li>{tip}</li>" for tip in evaluation.tips])}</ul>
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown(f"""
+        <div class="feedback-card incorrect">
+            <h3>❌ Incorrect</h3>
+            <p>{evaluation.explanation}</p>
+            <h4>How to Improve:</h4>
+            <ul>{"".join([f"<li>{tip}</li>" for tip in evaluation.tips])}</ul>
+        </div>
+        """, unsafe_allow_html=True)
+
+    profile_future = st.session_state.get("profile_future")
+    if profile_future is not None and profile_future.done():
+        try:
+            evaluation.complexity = profile_future.result()
+            if evaluation.complexity and st.session_state.history and st.session_state.history[-1]["question"] == q.title:
+                measured = {
+                    "time": evaluation.complexity.time_class,
+                    "space": evaluation.complexity.memory_class,
+                    "too_slow": evaluation.complexity.too_slow,
+                }
+                st.session_state.history[-1]["measured_complexity"] = measured
+                # History rows are append-only; late results are stored as annotations
+                get_history_store().annotate(st.session_state.history[-1]["id"], measured_complexity=measured)
+        except Exception as e:
+            print(f"Complexity profiling failed: {e}")
+        st.session_state.profile_future = None
+
+    if evaluation.complexity:
+        profile = evaluation.complexity
+        with st.expander(f"📈 Measured complexity: time {profile.time_class}, space {profile.memory_class}"):
+            if profile.too_slow:
+                st.warning(f"⚠️ Correct but likely too slow: about {profile.projected_ms_at_max or 0:.0f} ms at n = {profile.max_n}.")
+            st.line_chart({"n": profile.sizes, "time (ms)": profile.times_ms}, x="n", y="time (ms)")
+            st.line_chart({"n": profile.sizes, "peak memory (KiB)": profile.peak_memory_kb}, x="n", y="peak memory (KiB)")
+    elif st.session_state.get("profile_future") is not None:
+        st.caption("📈 Measuring time and space complexity...")
+
+    mentor_request = st.session_state.get("mentor_request")
+    if mentor_request is not None and st.button("🧑‍🏫 Show mentor feedback"):
+        with st.spinner("Waiting for mentor review..."):
+            try:
+                mentor = llm_manager.evaluate_code(*mentor_request)
+                # The local test run decides correctness; the mentor adds explanation and tips
+                evaluation.explanation = f"{evaluation.explanation}\n\n{mentor.explanation}"
+                evaluation.tips = evaluation.tips + mentor.tips
+                evaluation.rating = mentor.rating if evaluation.is_correct else min(mentor.rating, evaluation.rating)
+                st.session_state.mentor_request = None
+                rerun(scope="fragment")
+            except Exception as e:
+                st.session_state.mentor_request = None
+                st.error(f"Error fetching mentor feedback: {e}")
+
+    if st.button("Next Question"):
+        st.session_state.current_question = None
+        st.session_state.question_answered = False
+        st.session_state.feedback = None
+        st.session_state.mentor_request = None
+        st.session_state.profile_future = None
+        st.session_state.trigger_next = True
+        rerun()
+
+@fragment
+def quiz_answer_area(language, difficulty):
+    # Picking an option and checking it rerun only this fragment
+    q = st.session_state.current_question
+    if q is None:
+        return
+
+    selected_option = st.radio("Choose the correct answer:", q.options, index=None)
+    
+    col1, col2, col3 = st.columns([1.5, 1, 1])
+    with col1:
+        submit = st.button("Check Answer", type="primary")
+    with col2:
+        if st.button("🔄 Refresh"):
+            st.session_state.current_question = None
+            st.session_state.question_answered = False
+            st.session_state.trigger_next = True
+            rerun()
+    with col3:
+         if st.button("⏩ Skip"):
+            st.session_state.current_question = None
+            st.session_state.question_answered = False
+            st.session_state.trigger_next = True
+            rerun()
+    
+    if submit:
+        if selected_option is None:
+            st.warning("⚠️ Please select an answer before checking!")
+        else:
+            user_index = q.options.index(selected_option)
+            is_correct = (user_index == q.correct_option_index)
+            st.session_state.question_answered = True
+            st.session_state.feedback = {"is_correct": is_correct, "explanation": q.explanation, "correct_option": q.options[q.correct_option_index]}
+            
+            # Check if this question was already recorded to avoid duplicates on multi-clicks (though state prevents rendering submit again usually)
+            # But here we just append. To be safe, we rely on the flow.
+            
+            record_history({
+                "question": q.title,
+                "mode": "quiz",
+                "difficulty": difficulty,
+                "language": language,
+                "user_answer": selected_option,
+                "is_correct": is_correct,
+                "explanation": q.explanation
+            })
+
+            if is_correct:
+                st.balloons()
+    
+    # Display Quiz Feedback
+    if st.session_state.get("question_answered", False) and st.session_state.feedback:
+        fb = st.session_state.feedback
+        if fb["is_correct"]:
+            st.success(f"✅ Correct! {fb['explanation']}")
+        else:
+            st.error(f"❌ Incorrect. The correct answer was: {fb['correct_option']}")
+            st.info(f"Explanation: {fb['explanation']}")
+
+        if st.button("Next Question"):
+            st.session_state.current_question = None
+            st.session_state.question_answered = False
+            st.session_state.feedback = None
+            st.session_state.trigger_next = True
+            rerun()
 
 # Logic to determine if we should generate a question
 should_generate = False
@@ -102,18 +486,24 @@ elif st.session_state.current_question is None:
 
 if should_generate:
     # Get history of topics/questions to avoid repeats
-    topic_history = [item["question"] for item in st.session_state.history]
+    topic_history = st.session_state.topic_history
     
+    # Serve from the prefetch queue when possible, otherwise generate synchronously
+    q = prefetcher.get(prefetch_key, topic_history)
     with st.spinner(f"Generating {difficulty} {practice_mode}..."):
         try:
-            if "Coding" in practice_mode:
-                q = llm_manager.generate_coding_question(language, difficulty, topic_history)
-            else:
-                q = llm_manager.generate_mcq(language, difficulty, topic_history)
+            if q is None:
+                q = st.session_state.question_generator(language, difficulty, practice_mode, topic_history)
+                prefetcher.mark_served(prefetch_key, q)
             
             st.session_state.current_question = q
             st.session_state.question_start_time = time.time()
-            st.rerun()
+            # Feedback belongs to the previous question (Refresh/Skip and mode switches leave it set)
+            st.session_state.question_answered = False
+            st.session_state.feedback = None
+            st.session_state.mentor_request = None
+            st.session_state.profile_future = None
+            rerun()
         except Exception as e:
             st.error(f"Failed to generate question: {e}")
 
@@ -126,152 +516,14 @@ if st.session_state.current_question:
     if st.session_state.question_start_time:
         timer_component(st.session_state.question_start_time)
     
-    # Render UI based on Mode
+    # Render UI based on Mode. The card has no widgets, so only a full run (new question or mode)
+    # redraws it; clicks and typing in the answer area rerun just that fragment.
     if "Coding" in practice_mode:
-        st.markdown(f"""
-        <div class="question-card">
-            <h2>{q.title}</h2>
-            <p>{q.description}</p>
-            <h4>Examples:</h4>
-            <ul>{"".join([f"<li>{ex}</li>" for ex in q.examples])}</ul>
-            <h4>Constraints:</h4>
-            <ul>{"".join([f"<li>{c}</li>" for c in q.constraints])}</ul>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Code Input
-        user_code = st.text_area("Your Solution:", value=q.starter_code, height=300)
-        
-        col1, col2, col3 = st.columns([1.5, 1, 1])
-        with col1:
-            submit = st.button("Submit Solution", type="primary")
-        with col2:
-            if st.button("🔄 Refresh"):
-                st.session_state.current_question = None
-                st.session_state.trigger_next = True
-                st.rerun()
-        with col3:
-            if st.button("⏩ Skip"):
-                st.session_state.current_question = None
-                st.session_state.trigger_next = True
-                st.rerun()
-
-        if submit:
-            with st.spinner("Evaluating your solution..."):
-                try:
-                    evaluation = llm_manager.evaluate_code(q, user_code, language)
-                    st.session_state.feedback = evaluation
-                    st.session_state.question_answered = True
-                    
-                    # Update history immediately
-                    st.session_state.history.append({
-                        "question": q.title,
-                        "mode": "coding",
-                        "difficulty": difficulty,
-                        "language": language,
-                        "user_code": user_code,
-                        "is_correct": evaluation.is_correct,
-                        "explanation": evaluation.explanation
-                    })
-                    
-                    if evaluation.is_correct:
-                        st.session_state.score += 1
-                        st.balloons()
-                except Exception as e:
-                    st.error(f"Error evaluating code: {e}")
-        
-        # Consistent Feedback Display (Persists after reload)
-        if st.session_state.get("question_answered", False) and st.session_state.feedback:
-            evaluation = st.session_state.feedback
-            if evaluation.is_correct:
-                st.markdown(f"""
-                <div class="feedback-card correct">
-                    <h3>✅ Correct!</h3>
-                    <p>{evaluation.explanation}</p>
-                    <h4>Thinking Process:</h4>
-                    <ul>{"".join([f"<li>{tip}</li>" for tip in evaluation.tips])}</ul>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="feedback-card incorrect">
-                    <h3>❌ Incorrect</h3>
-                    <p>{evaluation.explanation}</p>
-                    <h4>How to Improve:</h4>
-                    <ul>{"".join([f"<li>{tip}</li>" for tip in evaluation.tips])}</ul>
-                </div>
-                """, unsafe_allow_html=True)
-
-            if st.button("Next Question"):
-                st.session_state.current_question = None
-                st.session_state.question_answered = False
-                st.session_state.feedback = None
-                st.session_state.trigger_next = True
-                st.rerun()
-
+        st.markdown(coding_card_html(q.title, q.description, tuple(q.examples), tuple(q.constraints)), unsafe_allow_html=True)
+        coding_answer_area(llm_manager, language, difficulty)
     else: # Quiz Mode
-        st.markdown(f"""
-        <div class="question-card">
-            <h2>{q.title}</h2>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        selected_option = st.radio("Choose the correct answer:", q.options, index=None)
-        
-        col1, col2, col3 = st.columns([1.5, 1, 1])
-        with col1:
-            submit = st.button("Check Answer", type="primary")
-        with col2:
-            if st.button("🔄 Refresh"):
-                st.session_state.current_question = None
-                st.session_state.question_answered = False
-                st.session_state.trigger_next = True
-                st.rerun()
-        with col3:
-             if st.button("⏩ Skip"):
-                st.session_state.current_question = None
-                st.session_state.question_answered = False
-                st.session_state.trigger_next = True
-                st.rerun()
-        
-        if submit:
-            if selected_option is None:
-                st.warning("⚠️ Please select an answer before checking!")
-            else:
-                user_index = q.options.index(selected_option)
-                is_correct = (user_index == q.correct_option_index)
-                st.session_state.question_answered = True
-                st.session_state.feedback = {"is_correct": is_correct, "explanation": q.explanation, "correct_option": q.options[q.correct_option_index]}
-                
-                # Check if this question was already recorded to avoid duplicates on multi-clicks (though state prevents rendering submit again usually)
-                # But here we just append. To be safe, we rely on the flow.
-                
-                st.session_state.history.append({
-                    "question": q.title,
-                    "mode": "quiz",
-                    "difficulty": difficulty,
-                    "language": language,
-                    "user_answer": selected_option,
-                    "is_correct": is_correct,
-                    "explanation": q.explanation
-                })
+        st.markdown(quiz_card_html(q.title), unsafe_allow_html=True)
+        quiz_answer_area(language, difficulty)
 
-                if is_correct:
-                    st.session_state.score += 1
-                    st.balloons()
-        
-        # Display Quiz Feedback
-        if st.session_state.get("question_answered", False) and st.session_state.feedback:
-            fb = st.session_state.feedback
-            if fb["is_correct"]:
-                st.success(f"✅ Correct! {fb['explanation']}")
-            else:
-                st.error(f"❌ Incorrect. The correct answer was: {fb['correct_option']}")
-                st.info(f"Explanation: {fb['explanation']}")
-
-            if st.button("Next Question"):
-                st.session_state.current_question = None
-                st.session_state.question_answered = False
-                st.session_state.feedback = None
-                st.session_state.trigger_next = True
-                st.rerun()
+save_session_state()
+end_rerun()
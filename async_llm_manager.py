@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, List, Optional
+
+from generation_profiles import get_generation_profiles, is_truncated
+from llm_manager import (
+    DEFAULT_MODEL,
+    EVALUATION_PROMPT_VERSION,
+    CodingQuestion,
+    Evaluation,
+    LLMManager,
+    MCQQuestion,
+    coding_question_prompt,
+    dump_model,
+    evaluation_prompt,
+    mcq_prompt,
+    report_prompt,
+)
+from model_router import task_name
+from precheck import get_prechecker
+from structured_output import StructuredOutputStats, agenerate_structured, supports_native_json, validate_model
+from telemetry import Span, get_telemetry, response_token_counts
+
+# asyncio client for scripts that fan many calls out from one thread (e.g. grading or generating
+# in bulk); the app overlaps its calls with the prefetch and profiler threads instead.
+#   manager = AsyncLLMManager.from_manager(get_llm_manager(api_key), max_concurrency=8)
+#   evaluations = await manager.gather(*(manager.evaluate_code(q, code, "Python") for code in codes))
+# from_manager shares the sync client's model (rate limiter, router), evaluation cache and profiles.
+
+
+@contextmanager
+def _span(name: str, parent: Optional[Span] = None, **attributes):
+    # telemetry.span nests through a per-thread stack, which concurrent tasks on one loop would
+    # interleave; here the parent is passed explicitly and the span is only emitted when it ends
+    current = Span(name, parent, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        get_telemetry().end(current, e)
+        raise
+    get_telemetry().end(current)
+
+
+class AsyncLLMManager:
+    def __init__(self, api_key: str, model=None, max_concurrency: int = 4, model_name: str = DEFAULT_MODEL,
+                 eval_cache=None, profiles=None, prechecker=None):
+        if model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        # Optional eval_cache.EvaluationCache, keyed the same way as LLMManager's
+        self.eval_cache = eval_cache
+        self.structured_stats = StructuredOutputStats()
+        self.profiles = profiles or get_generation_profiles()
+        self.prechecker = prechecker or get_prechecker()
+        # Created lazily so the semaphore binds to whichever loop runs the first call
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_manager(cls, manager: LLMManager, max_concurrency: int = 4) -> "AsyncLLMManager":
+        return cls(None, model=manager.model, max_concurrency=max_concurrency,
+                   model_name=manager.model_name, eval_cache=manager.eval_cache, profiles=manager.profiles,
+                   prechecker=manager.prechecker)
+
+    async def _generate(self, prompt_text: str, task: str, difficulty: Optional[str] = None,
+                        parent: Optional[Span] = None, **kwargs):
+        # Same per-task caps and sampling settings as LLMManager, fed by the same observations
+        kwargs["generation_config"] = self.profiles.generation_config(task, kwargs.get("generation_config"))
+        if getattr(self.model, "routes_tasks", False):
+            kwargs["task"] = task
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            with _span("network", parent, task=task,
+                       max_output_tokens=kwargs["generation_config"].get("max_output_tokens")) as current:
+                start = time.perf_counter()
+                if hasattr(self.model, "generate_content_async"):
+                    response = await self.model.generate_content_async(prompt_text, **kwargs)
+                else:
+                    # Models without a native async API run in the default executor
+                    response = await asyncio.to_thread(self.model.generate_content, prompt_text, **kwargs)
+                counts = response_token_counts(response, prompt_text)
+                current.set(**counts)
+        self.profiles.record(task, difficulty, counts.get("response_tokens", 0),
+                             time.perf_counter() - start, is_truncated(response))
+        return response
+
+    async def _get_json_response(self, prompt_text: str, pydantic_model, task: str,
+                                 difficulty: Optional[str] = None, parent: Optional[Span] = None):
+        async def generate(prompt, generation_config):
+            response = await self._generate(prompt, task, difficulty, parent, generation_config=generation_config)
+            return response.text
+
+        return await agenerate_structured(generate, prompt_text, pydantic_model,
+                                          self.structured_stats, native_json=supports_native_json(self.model_name))
+
+    async def generate_coding_question(self, language: str, difficulty: str, topic_history: List[str] = [],
+                                       topic: Optional[str] = None) -> CodingQuestion:
+        task = task_name("coding_question", difficulty)
+        with _span("generate_coding_question", task=task, model=self.model_name, language=language) as current:
+            return await self._get_json_response(coding_question_prompt(language, difficulty, topic_history, topic),
+                                                 CodingQuestion, task, difficulty, current)
+
+    async def generate_mcq(self, language: str, difficulty: str, topic_history: List[str] = [],
+                           topic: Optional[str] = None) -> MCQQuestion:
+        task = task_name("mcq", difficulty)
+        with _span("generate_mcq", task=task, model=self.model_name, language=language) as current:
+            return await self._get_json_response(mcq_prompt(language, difficulty, topic_history, topic),
+                                                 MCQQuestion, task, difficulty, current)
+
+    async def evaluate_code(self, question, user_code: str, language: str,
+                            difficulty: Optional[str] = None) -> Evaluation:
+        task = task_name("evaluation", difficulty)
+        with _span("evaluate_code", task=task, model=self.model_name, language=language) as current:
+            # node/javac checks spawn a process, so the pre-check runs off the event loop
+            prechecked = await asyncio.to_thread(self.prechecker.check, question, user_code, language)
+            current.set(prechecked=prechecked is not None)
+            if prechecked is not None:
+                return prechecked
+            cache_key = None
+            if self.eval_cache is not None:
+                from eval_cache import evaluation_cache_key
+                cache_key = evaluation_cache_key(question, user_code, language, self.model_name,
+                                                 EVALUATION_PROMPT_VERSION)
+                cached = self.eval_cache.get(cache_key)
+                current.set(cache_hit=cached is not None)
+                if cached is not None:
+                    return validate_model(Evaluation, cached)
+            evaluation = await self._get_json_response(evaluation_prompt(question, user_code, language), Evaluation,
+                                                       task, difficulty, current)
+            if cache_key is not None:
+                self.eval_cache.put(cache_key, dump_model(evaluation))
+            return evaluation
+
+    async def generate_report(self, history: List[dict]) -> str:
+        with _span("generate_report", task="report", model=self.model_name) as current:
+            try:
+                response = await self._generate(report_prompt(history), "report", parent=current)
+                return response.text
+            except Exception as e:
+                print(f"Error generating report: {e}")
+                current.set(failed=f"{type(e).__name__}: {e}")
+                return "Could not generate report due to an error."
+
+    async def gather(self, *calls: Awaitable, return_exceptions: bool = False) -> list:
+        # Like asyncio.gather; the number of in-flight model calls is capped by max_concurrency
+        return await asyncio.gather(*calls, return_exceptions=return_exceptions)
+
+
+class SyncLLMManager:
+    # Blocking facade over AsyncLLMManager for Streamlit callers.
+    # Coroutines run on a private event loop thread, so several calls can overlap via submit().
+    def __init__(self, api_key: str, model=None, max_concurrency: int = 4, model_name: str = DEFAULT_MODEL,
+                 eval_cache=None):
+        self.async_manager = AsyncLLMManager(api_key, model=model, max_concurrency=max_concurrency,
+                                             model_name=model_name, eval_cache=eval_cache)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-event-loop", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro: Awaitable):
+        # Returns a concurrent.futures.Future without blocking the caller
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _run(self, coro: Awaitable):
+        return self.submit(coro).result()
+
+    def generate_coding_question(self, language: str, difficulty: str, topic_history: List[str] = [],
+                                 topic: Optional[str] = None) -> CodingQuestion:
+        return self._run(self.async_manager.generate_coding_question(language, difficulty, topic_history, topic))
+
+    def generate_mcq(self, language: str, difficulty: str, topic_history: List[str] = [],
+                     topic: Optional[str] = None) -> MCQQuestion:
+        return self._run(self.async_manager.generate_mcq(language, difficulty, topic_history, topic))
+
+    def evaluate_code(self, question, user_code: str, language: str, difficulty: Optional[str] = None) -> Evaluation:
+        return self._run(self.async_manager.evaluate_code(question, user_code, language, difficulty))
+
+    def generate_report(self, history: List[dict]) -> str:
+        return self._run(self.async_manager.generate_report(history))
+
+    def gather(self, *calls: Awaitable, return_exceptions: bool = False) -> list:
+        return self._run(self.async_manager.gather(*calls, return_exceptions=return_exceptions))
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,273 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from llm_manager import CodingQuestion, LLMManager
+from structured_output import validate_model
+
+# Batch grading of many submissions to one CodingQuestion (e.g. a whole class).
+#   python batch_grader.py --question two_sum.json --submissions answers/ --output grades.csv
+#   python batch_grader.py --question two_sum.json --submissions answers.jsonl --output grades.jsonl --fake
+# Identical submissions (after normalizing whitespace) are graded once, short submissions are packed
+# several to a request, and rows are appended to the output as they finish. Rerunning with the same
+# output skips ids that already have a successful row, so an interrupted run picks up where it stopped.
+#   grader = BatchGrader(manager, question)
+#   for row in grader.grade(load_submissions("answers/"), ResultWriter("grades.jsonl")): ...
+
+EXTENSION_LANGUAGES = {".py": "Python", ".java": "Java", ".js": "JavaScript", ".php": "PHP",
+                       ".html": "HTML5", ".css": "CSS", ".xhtml": "XHTML"}
+
+# Packing limits: only short submissions share a request, so one long answer cannot crowd out
+# the others and a failed pack is cheap to redo one by one
+PACK_MAX_CHARS = 1200
+PACK_MAX_ITEMS = 4
+PACK_BUDGET_CHARS = 4000
+
+FIELDS = ["id", "language", "is_correct", "rating", "explanation", "tips", "duplicate_of", "packed", "error"]
+
+
+class Submission:
+    def __init__(self, submission_id: str, code: str, language: str):
+        self.id = submission_id
+        self.code = code
+        self.language = language
+
+
+def load_submissions(path: str, default_language: str = "Python") -> List[Submission]:
+    # A directory (one file per submission, id = relative path) or JSONL with id/code[/language]
+    if os.path.isdir(path):
+        submissions = []
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(files):
+                if name.startswith("."):
+                    continue
+                full_path = os.path.join(root, name)
+                with open(full_path, errors="replace") as f:
+                    code = f.read()
+                language = EXTENSION_LANGUAGES.get(os.path.splitext(name)[1].lower(), default_language)
+                submissions.append(Submission(os.path.relpath(full_path, path), code, language))
+        return submissions
+    submissions = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            submissions.append(Submission(str(record.get("id", line_number)),
+                                          record.get("code", record.get("user_code", "")),
+                                          record.get("language", default_language)))
+    return submissions
+
+
+def normalize_code(code: str) -> str:
+    return "\n".join(line.rstrip() for line in code.replace("\r\n", "\n").split("\n") if line.strip())
+
+
+def submission_key(submission: Submission) -> str:
+    return hashlib.sha256(f"{submission.language}\0{normalize_code(submission.code)}".encode()).hexdigest()
+
+
+class ResultWriter:
+    # Appends one row per submission to JSONL or CSV (by extension), flushed as rows arrive
+    def __init__(self, path: str):
+        self.path = path
+        self.format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def completed_ids(self) -> set:
+        # Ids with a successful row; later rows win, so a retried error counts once it succeeds
+        if not os.path.exists(self.path):
+            return set()
+        status = {}
+        with open(self.path, newline="") as f:
+            if self.format == "csv":
+                rows = csv.DictReader(f)
+            else:
+                rows = (json.loads(line) for line in f if line.strip())
+            for row in rows:
+                status[str(row["id"])] = not row.get("error")
+        return {submission_id for submission_id, ok in status.items() if ok}
+
+    def write(self, row: dict):
+        with self._lock:
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", newline="") as f:
+                if self.format == "csv":
+                    writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+                    if new_file:
+                        writer.writeheader()
+                    writer.writerow(dict(row, tips=" | ".join(row.get("tips") or [])))
+                else:
+                    f.write(json.dumps(row) + "\n")
+
+
+class _Group:
+    # One distinct submission and the ids of its identical copies
+    def __init__(self, submission: Submission):
+        self.submission = submission
+        self.duplicates: List[Submission] = []
+
+
+def plan_jobs(groups: List[_Group], pack: bool = True, max_chars: int = PACK_MAX_CHARS,
+              max_items: int = PACK_MAX_ITEMS, budget_chars: int = PACK_BUDGET_CHARS) -> List[List[_Group]]:
+    # Long submissions get a request each; short ones of the same language are packed greedily
+    jobs, open_packs = [], {}
+    for group in groups:
+        size = len(group.submission.code)
+        if not pack or size > max_chars:
+            jobs.append([group])
+            continue
+        current = open_packs.get(group.submission.language)
+        if current is None or len(current) >= max_items or sum(len(g.submission.code) for g in current) + size > budget_chars:
+            current = []
+            open_packs[group.submission.language] = current
+            jobs.append(current)
+        current.append(group)
+    return jobs
+
+
+class BatchGrader:
+    def __init__(self, manager: LLMManager, question: CodingQuestion, difficulty: Optional[str] = None,
+                 workers: int = 4, pack: bool = True):
+        self.manager = manager
+        self.question = question
+        self.difficulty = difficulty
+        self.workers = workers
+        self.pack = pack
+        self.stats = {"submissions": 0, "skipped": 0, "duplicates": 0, "requests": 0, "packed": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def grade(self, submissions: Iterable[Submission], writer: Optional[ResultWriter] = None) -> Iterator[dict]:
+        # Yields one row per submission as its job finishes (and appends it to `writer`)
+        done = writer.completed_ids() if writer is not None else set()
+        groups: Dict[str, _Group] = {}
+        for submission in submissions:
+            self.stats["submissions"] += 1
+            if submission.id in done:
+                self.stats["skipped"] += 1
+                continue
+            key = submission_key(submission)
+            if key in groups:
+                groups[key].duplicates.append(submission)
+                self.stats["duplicates"] += 1
+            else:
+                groups[key] = _Group(submission)
+
+        jobs = plan_jobs(list(groups.values()), self.pack)
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = [pool.submit(self._run, job) for job in jobs]
+            for future in as_completed(futures):
+                for row in future.result():
+                    if writer is not None:
+                        writer.write(row)
+                    yield row
+        finally:
+            # Stopping early (or Ctrl-C) drops queued jobs; finished rows are already written
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job: List[_Group]) -> List[dict]:
+        results: Dict[int, object] = {}
+        if len(job) > 1:
+            # Pack-local ids: submission ids may be file paths, and the model only needs to tell them apart
+            local = {f"s{i + 1}": i for i in range(len(job))}
+            try:
+                batch = self.manager.evaluate_code_batch(
+                    self.question, {local_id: job[i].submission.code for local_id, i in local.items()},
+                    job[0].submission.language, self.difficulty)
+                results = {local[local_id]: evaluation for local_id, evaluation in batch.items()}
+            except Exception as e:
+                print(f"Packed request for {len(job)} submissions failed, grading them one by one: {e}")
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["packed"] += len(results)
+        for i, group in enumerate(job):
+            if i in results:
+                continue
+            try:
+                results[i] = self.manager.evaluate_code(self.question, group.submission.code,
+                                                        group.submission.language, self.difficulty)
+            except Exception as e:
+                results[i] = e
+            with self._lock:
+                self.stats["requests"] += 1
+
+        rows = []
+        for i, group in enumerate(job):
+            outcome = results[i]
+            packed = len(job) if len(job) > 1 and not isinstance(outcome, Exception) else 1
+            for submission in [group.submission] + group.duplicates:
+                duplicate_of = group.submission.id if submission is not group.submission else ""
+                rows.append(_row(submission, outcome, duplicate_of, packed))
+        with self._lock:
+            self.stats["errors"] += sum(1 for row in rows if row["error"])
+        return rows
+
+
+def _row(submission: Submission, outcome, duplicate_of: str, packed: int) -> dict:
+    row = {"id": submission.id, "language": submission.language, "is_correct": None, "rating": None,
+           "explanation": None, "tips": [], "duplicate_of": duplicate_of, "packed": packed, "error": ""}
+    if isinstance(outcome, Exception):
+        row["error"] = f"{type(outcome).__name__}: {outcome}"
+    else:
+        row.update(is_correct=outcome.is_correct, rating=outcome.rating, explanation=outcome.explanation,
+                   tips=list(outcome.tips))
+    return row
+
+
+def load_question(path: str) -> CodingQuestion:
+    with open(path) as f:
+        return validate_model(CodingQuestion, json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade a batch of submissions to one coding question.")
+    parser.add_argument("--question", required=True, help="JSON file with the CodingQuestion")
+    parser.add_argument("--submissions", required=True, help="directory of files or a JSONL file")
+    parser.add_argument("--output", required=True, help="results file (.jsonl or .csv); reruns resume it")
+    parser.add_argument("--language", default="Python", help="language for files with an unknown extension")
+    parser.add_argument("--difficulty", default=None)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--no-pack", action="store_true", help="one submission per request")
+    parser.add_argument("--model", default=None, help="model name (defaults to LLMManager's)")
+    parser.add_argument("--fake", action="store_true", help="use fake_model instead of the API")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_model import FakeGenerativeModel
+        manager = LLMManager(api_key=None, model=FakeGenerativeModel())
+    else:
+        from build_question_bank import load_api_key
+        from client_registry import get_llm_manager
+        api_key = load_api_key()
+        if not api_key:
+            print("API Key not found.")
+            return
+        # Shared client: rate limiting, model routing and the evaluation cache all apply
+        manager = get_llm_manager(api_key, args.model) if args.model else get_llm_manager(api_key)
+
+    grader = BatchGrader(manager, load_question(args.question), args.difficulty, args.workers, not args.no_pack)
+    submissions = load_submissions(args.submissions, args.language)
+    writer = ResultWriter(args.output)
+    print(f"Grading {len(submissions)} submissions into {args.output} with {args.workers} workers...")
+    start = time.perf_counter()
+    for count, row in enumerate(grader.grade(submissions, writer), 1):
+        if row["error"]:
+            print(f"  failed {row['id']}: {row['error']}")
+        if count % 25 == 0:
+            print(f"  {count} graded")
+    print(f"Finished in {time.perf_counter() - start:.1f}s: {grader.stats}")
+
+
+if __name__ == "__main__":
+    main()
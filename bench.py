@@ -0,0 +1,380 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_model import FakeGenerativeModel, fake_prefix_cache
+from llm_manager import CodingQuestion, LLMManager, Evaluation
+from prompts import PROMPTS, PrefixCachedModel, estimate_tokens, get_prefix_cache
+from rate_limiter import RateLimitedModel, RateLimiter
+from report_digest import HistoryDigest
+
+# Reproducible benchmarks for the LLM paths, run against fake_model instead of the API.
+#   python bench.py                                # full suite, saved to bench_results/<commit>.json
+#   python bench.py --quick --only parsing pdf     # a subset with fewer iterations
+#   python bench.py --compare 1a2b3c4              # diff against a saved run (sha or path)
+# Model latency is simulated with sleeps, so the latency-bound benchmarks measure our overhead on
+# top of a known distribution; parsing and pdf are pure CPU.
+
+BENCH_DIR = "bench_results"
+REGRESSION_THRESHOLD = 0.2
+GATED_METRICS = ("p50_ms", "wall_ms")
+
+SAMPLE_CODE = "def solve(nums):\n    total = 0\n    for n in nums:\n        total += n\n    return total\n"
+
+
+def percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(fn, iterations: int) -> list:
+    samples = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def fake_manager(config, **overrides) -> LLMManager:
+    options = dict(latency=config.latency, latency_sigma=config.latency_sigma, seed=config.seed,
+                   response_chars=config.response_chars)
+    options.update(overrides)
+    return LLMManager(api_key=None, model=FakeGenerativeModel(**options))
+
+
+def sample_question() -> CodingQuestion:
+    return CodingQuestion(title="Sum of a list", description="Return the sum of a list of integers.",
+                          examples=["Input: [1,2,3]\nOutput: 6"], constraints=["1 <= n <= 10^4"],
+                          starter_code="def solve(nums):\n    pass")
+
+
+def sample_history(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    languages = ["Python", "Java", "JavaScript"]
+    difficulties = ["Easy", "Medium", "Hard (DSA)"]
+    history = []
+    for i in range(count):
+        coding = rng.random() < 0.5
+        history.append({
+            "question": f"Practice question {i} on {rng.choice(['arrays', 'strings', 'graphs', 'recursion'])}",
+            "language": rng.choice(languages),
+            "difficulty": rng.choice(difficulties),
+            "mode": "Coding Challenge (LeetCode)" if coding else "Quiz Mode (MCQ)",
+            "user_answer": SAMPLE_CODE if coding else "Option B",
+            "is_correct": rng.random() < 0.6,
+            "feedback": "Off-by-one at the loop boundary; check the empty-input case." * 2,
+        })
+    return history
+
+
+def sample_report(sections: int) -> str:
+    parts = ["# Progress Report", ""]
+    for i in range(sections):
+        parts += [f"## Topic {i}", "", "**Strengths**: steady on loops, clear naming and small functions.",
+                  "- Practise recursion with memoisation", "- Revisit hash map edge cases", "",
+                  "### Next steps", "Work through two medium problems a day and time each attempt. " * 4, ""]
+    return "\n".join(parts)
+
+
+# Benchmarks: each takes the parsed config and returns a dict of results
+
+def bench_question_generation(config) -> dict:
+    manager = fake_manager(config)
+
+    def run(i):
+        if i % 2:
+            manager.generate_mcq("Python", "Medium", [f"Question {j}" for j in range(i % 5)])
+        else:
+            manager.generate_coding_question("Python", "Medium", [f"Question {j}" for j in range(i % 5)])
+
+    result = percentiles(timed(run, config.iterations))
+    result["model_calls"] = manager.model.calls
+    return result
+
+
+def bench_parsing(config) -> dict:
+    # _get_json_response with no latency: tolerant parse, validation and repair rounds only
+    manager = fake_manager(config, latency=0.0, malformed_rate=config.malformed_rate)
+    prompt = "Evaluate the user's solution to the following problem."
+    failures = 0
+
+    def run(i):
+        nonlocal failures
+        try:
+            manager._get_json_response(prompt, Evaluation, "evaluation")
+        except Exception:
+            failures += 1
+
+    result = percentiles(timed(run, config.iterations * 5))
+    summary = manager.structured_stats.summary().get("Evaluation", {})
+    result.update(malformed=manager.model.malformed, failures=failures, repair_rate=round(summary.get("repair_rate", 0.0), 3))
+    return result
+
+
+def bench_evaluate_code(config) -> dict:
+    manager = fake_manager(config)
+    question = sample_question()
+    # Distinct submissions so nothing could be served from a cache
+    return percentiles(timed(lambda i: manager.evaluate_code(question, SAMPLE_CODE + f"# {i}\n", "Python"),
+                             config.iterations))
+
+
+def bench_report(config) -> dict:
+    manager = fake_manager(config)
+    history = sample_history(config.history_size, config.seed)
+    digests = []
+
+    def render(i):
+        digests.append(HistoryDigest.from_entries(history).render())
+
+    result = {"digest": percentiles(timed(render, config.iterations))}
+    result["generate_report"] = percentiles(timed(lambda i: manager.generate_report(digests[0]), config.iterations))
+    result["prompt_chars"] = len(digests[0])
+    return result
+
+
+def bench_pdf(config) -> dict:
+    from utils import create_pdf_report
+    report = sample_report(config.report_sections)
+    sizes = []
+    result = percentiles(timed(lambda i: sizes.append(len(create_pdf_report(report))), config.iterations))
+    result.update(markdown_chars=len(report), pdf_bytes=sizes[-1])
+    return result
+
+
+def bench_concurrent_sessions(config) -> dict:
+    # `sessions` users sharing one manager (as client_registry does), each alternating
+    # question generation and evaluation; the limiter is set high enough never to throttle
+    limiter = RateLimiter(requests_per_minute=1e6, tokens_per_minute=1e9)
+    model = RateLimitedModel(FakeGenerativeModel(latency=config.latency, latency_sigma=config.latency_sigma,
+                                                 seed=config.seed, response_chars=config.response_chars), limiter)
+    manager = LLMManager(api_key=None, model=model)
+    question = sample_question()
+    samples = {"question": [], "evaluation": []}
+    lock = threading.Lock()
+
+    def session(user):
+        for i in range(config.rounds):
+            start = time.perf_counter()
+            manager.generate_coding_question("Python", "Easy", [f"user {user} question {j}" for j in range(i)])
+            middle = time.perf_counter()
+            manager.evaluate_code(question, SAMPLE_CODE + f"# {user}/{i}\n", "Python")
+            end = time.perf_counter()
+            with lock:
+                samples["question"].append(middle - start)
+                samples["evaluation"].append(end - middle)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config.sessions) as pool:
+        list(pool.map(session, range(config.sessions)))
+    wall = time.perf_counter() - start
+    operations = config.sessions * config.rounds * 2
+    return {
+        "sessions": config.sessions,
+        "question": percentiles(samples["question"]),
+        "evaluation": percentiles(samples["evaluation"]),
+        "wall_ms": round(wall * 1000, 3),
+        "ops_per_second": round(operations / wall, 2),
+    }
+
+
+def bench_prefix_cache(config) -> dict:
+    # Input tokens per call for the high-volume prompts, sent whole vs. with the preamble cached.
+    # The cached side is a fake cache-capable backend with no size threshold: it shows what explicit
+    # caching saves where it applies, not what the default Gemma backends get (they can't cache, and
+    # today's preambles are below the production threshold listed under `preamble_tokens`).
+    question = sample_question()
+    threshold = get_prefix_cache().min_tokens
+    result = {
+        "production_min_tokens": threshold,
+        "preamble_tokens": {name: {"tokens": estimate_tokens(template.preamble),
+                                   "cacheable": estimate_tokens(template.preamble) >= threshold}
+                            for name, template in sorted(PROMPTS.items())},
+    }
+    for label, wrap in (("uncached", lambda m: m), ("cached", lambda m: PrefixCachedModel(m, fake_prefix_cache()))):
+        model = FakeGenerativeModel(seed=config.seed)
+        manager = LLMManager(api_key=None, model=wrap(model))
+
+        def run(i):
+            manager.generate_coding_question("Python", "Medium", [f"Question {j}" for j in range(i % 5)])
+            manager.generate_mcq("Python", "Medium", [f"Question {j}" for j in range(i % 5)])
+            manager.evaluate_code(question, SAMPLE_CODE + f"# {i}\n", "Python")
+
+        result[label] = percentiles(timed(run, config.iterations))
+        result[label]["billed_prompt_tokens_per_call"] = round((model.prompt_tokens - model.cached_tokens) / model.calls, 1)
+    return result
+
+
+def bench_question_batch(config) -> dict:
+    # Amortized cost per question: `batch_size` single-question calls vs one multi-question call.
+    # The fake model's latency grows with output length (token_latency), so the batch still pays
+    # for its longer response; what it saves is the per-call overhead and the repeated preamble.
+    result = {}
+    for kind in ("mcq", "coding_question"):
+        result[kind] = {}
+        for label in ("single", "batch"):
+            model = FakeGenerativeModel(latency=config.latency, latency_sigma=config.latency_sigma, seed=config.seed,
+                                        token_latency=config.token_latency)
+            manager = LLMManager(api_key=None, model=model)
+            generated = 0
+
+            def run(i):
+                nonlocal generated
+                history = [f"Question {j}" for j in range(i % 5)]
+                if label == "single":
+                    for _ in range(config.batch_size):
+                        getattr(manager, f"generate_{kind}")("Python", "Medium", history)
+                    generated += config.batch_size
+                else:
+                    generated += len(getattr(manager, f"generate_{kind}_batch")("Python", "Medium", config.batch_size, history))
+
+            samples = timed(run, config.iterations)
+            result[kind][label] = {
+                "per_question_ms": round(sum(samples) / generated * 1000, 3),
+                "calls_per_question": round(model.calls / generated, 3),
+                "prompt_tokens_per_question": round(model.prompt_tokens / generated, 1),
+                "output_tokens_per_question": round(model.output_tokens / generated, 1),
+            }
+        result[kind]["speedup"] = round(result[kind]["single"]["per_question_ms"] / result[kind]["batch"]["per_question_ms"], 2)
+    return result
+
+
+BENCHMARKS = {
+    "question_generation": bench_question_generation,
+    "parsing": bench_parsing,
+    "evaluate_code": bench_evaluate_code,
+    "report": bench_report,
+    "pdf": bench_pdf,
+    "concurrent_sessions": bench_concurrent_sessions,
+    "prefix_cache": bench_prefix_cache,
+    "question_batch": bench_question_batch,
+}
+
+
+# Result storage and comparison
+
+def git_commit() -> tuple:
+    # (short sha, dirty); ("nogit", False) outside a checkout
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return "nogit", False
+
+
+def save_results(run: dict, directory: str = BENCH_DIR) -> str:
+    os.makedirs(directory, exist_ok=True)
+    name = run["commit"] + ("-dirty" if run["dirty"] else "")
+    path = os.path.join(directory, f"{name}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2, sort_keys=True)
+    return path
+
+
+def load_results(ref: str, directory: str = BENCH_DIR) -> dict:
+    path = ref if os.path.exists(ref) else os.path.join(directory, f"{ref}.json")
+    with open(path) as f:
+        return json.load(f)
+
+
+def _timings(results: dict, prefix: str = ""):
+    # Flattens nested results to (dotted name, value) for every *_ms metric
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _timings(value, name + ".")
+        elif key.endswith("_ms") and isinstance(value, (int, float)):
+            yield name, value
+
+
+def compare(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    # Prints a side-by-side table; returns the metrics that got slower by more than `threshold`
+    old = dict(_timings(baseline["results"]))
+    regressions = []
+    print(f"\nComparing against {baseline['commit']}{'-dirty' if baseline.get('dirty') else ''}:")
+    for name, value in _timings(current["results"]):
+        if name not in old:
+            continue
+        change = (value - old[name]) / old[name] if old[name] else 0.0
+        flag = ""
+        # Only medians and wall time are gated; p95/max of short runs are too noisy
+        if change > threshold and name.rsplit(".", 1)[-1] in GATED_METRICS:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:<45} {old[name]:>10.2f} -> {value:>10.2f} ms  {change:+7.1%}{flag}")
+    if baseline.get("config") != current.get("config"):
+        print("  (configs differ; timings may not be comparable)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM paths against a local fake model.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a fast sanity check")
+    parser.add_argument("--iterations", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=0.02, help="median fake model latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    parser.add_argument("--response-chars", type=int, default=1500, help="pad responses to this many characters")
+    parser.add_argument("--malformed-rate", type=float, default=0.2, help="share of malformed JSON in the parsing benchmark")
+    parser.add_argument("--history-size", type=int, default=500, help="history entries behind the report")
+    parser.add_argument("--report-sections", type=int, default=20, help="sections in the PDF benchmark report")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--rounds", type=int, default=5, help="question+evaluation rounds per user")
+    parser.add_argument("--batch-size", type=int, default=5, help="questions per request in the batch benchmark")
+    parser.add_argument("--token-latency", type=float, default=0.0002, help="extra fake latency per output token (batch benchmark)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", default=None, help="saved run to compare against (commit sha or file path)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="slowdown flagged as a regression")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+    if args.iterations is None:
+        args.iterations = 10 if args.quick else 50
+    if args.quick:
+        args.rounds = min(args.rounds, 2)
+
+    commit, dirty = git_commit()
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("only", "compare", "threshold", "no_save", "quick")}
+    run = {
+        "commit": commit,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": {},
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name}...")
+        random.seed(args.seed)
+        run["results"][name] = BENCHMARKS[name](args)
+        print(json.dumps(run["results"][name], indent=2))
+
+    if not args.no_save:
+        print(f"Saved {save_results(run)}")
+    if args.compare:
+        if compare(load_results(args.compare), run, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dedup_index import DedupIndex, question_text
+from client_registry import get_llm_manager
+from llm_manager import LLMManager
+from question_bank import QuestionBank, validate_question
+
+# Pre-generates questions into the offline bank the app draws from.
+#   python build_question_bank.py --languages Python JavaScript --count 50
+#   python build_question_bank.py --fake --count 5    # dry run without the API
+
+LANGUAGES = ["Python", "Java", "Java (BlueJ)", "JavaScript", "PHP", "HTML5", "CSS", "XHTML"]
+DIFFICULTIES = ["Easy", "Medium", "Hard (DSA)"]
+DEFAULT_TOPICS = ["Arrays", "Strings", "Hashing", "Recursion", "Sorting", "OOP", "Linked Lists", "Trees",
+                  "Graphs", "Dynamic Programming", "Standard Library", "Error Handling"]
+
+
+def load_api_key():
+    # Same lookup as list_models.py: environment first, then .streamlit/secrets.toml
+    api_key = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
+    if api_key:
+        return api_key
+    try:
+        with open(".streamlit/secrets.toml", "r") as f:
+            for line in f:
+                if "GEMINI_API_KEY" in line:
+                    return line.split("=")[1].strip().strip('"')
+    except OSError:
+        pass
+    return None
+
+
+def build_one(manager, bank, dedup, language, difficulty, mode, topic):
+    # Returns (outcome, question); outcome is "added", "duplicate" or "invalid: <reason>"
+    # What's already banked for the selection goes in as history, so the model steers away from it
+    history = bank.recent_titles(language, difficulty, mode, topic)
+    if mode == "coding":
+        question = manager.generate_coding_question(language, difficulty, topic_history=history, topic=topic)
+    else:
+        question = manager.generate_mcq(language, difficulty, topic_history=history, topic=topic)
+    problem = validate_question(question, language)
+    if problem:
+        return f"invalid: {problem}", question
+    if dedup.check_and_add(question_text(question), question.title, f"bank|{language}|{mode}") is not None:
+        return "duplicate", question
+    if not bank.add(question, language, difficulty, mode, topic):
+        return "duplicate", question
+    return "added", question
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate questions into the offline question bank.")
+    parser.add_argument("--bank", default=os.environ.get("COGNITIO_QUESTION_BANK", ".cognitio/question_bank.db"))
+    parser.add_argument("--languages", nargs="+", default=["Python"], choices=LANGUAGES)
+    parser.add_argument("--difficulties", nargs="+", default=DIFFICULTIES, choices=DIFFICULTIES)
+    parser.add_argument("--modes", nargs="+", default=["coding", "quiz"], choices=["coding", "quiz"])
+    parser.add_argument("--topics", nargs="+", default=DEFAULT_TOPICS)
+    parser.add_argument("--count", type=int, default=10, help="questions per (language, difficulty, mode, topic)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", default=None, help="model name (defaults to LLMManager's)")
+    parser.add_argument("--fake", action="store_true", help="use fake_model instead of the API")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_model import FakeGenerativeModel
+        manager = LLMManager(api_key=None, model=FakeGenerativeModel())
+    else:
+        api_key = load_api_key()
+        if not api_key:
+            print("API Key not found.")
+            return
+        # Shared client: rate limiting, model routing and request coalescing all apply
+        manager = get_llm_manager(api_key, args.model) if args.model else get_llm_manager(api_key)
+
+    bank = QuestionBank(args.bank)
+    # Separate from the app's per-user index: only near-duplicates inside the bank are rejected
+    dedup = DedupIndex(capacity=max(5000, len(args.languages) * len(args.modes) * len(args.difficulties)
+                                    * len(args.topics) * args.count * 2))
+
+    jobs = [(language, difficulty, mode, topic)
+            for language in args.languages for difficulty in args.difficulties
+            for mode in args.modes for topic in args.topics for _ in range(args.count)]
+    print(f"Generating {len(jobs)} questions into {args.bank} with {args.workers} workers...")
+    outcomes = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(build_one, manager, bank, dedup, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            job = futures[future]
+            try:
+                outcome, question = future.result()
+                label = outcome.split(":")[0]
+                if outcome != "added":
+                    print(f"  skipped {question.title!r} ({job[0]}/{job[2]}/{job[3]}): {outcome}")
+            except Exception as e:
+                label = "error"
+                print(f"  failed {job}: {e}")
+            outcomes[label] = outcomes.get(label, 0) + 1
+            if done % 25 == 0:
+                print(f"  {done}/{len(jobs)} done")
+
+    print(f"Finished in {time.perf_counter() - start:.1f}s: {outcomes}")
+    for row in bank.counts():
+        print(f"  {row['language']:<14} {row['difficulty']:<11} {row['mode']:<7} {row['topic']:<20} {row['questions']}")
+
+
+if __name__ == "__main__":
+    main()
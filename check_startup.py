@@ -0,0 +1,122 @@
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup budget check for app.py, run in a fresh interpreter so nothing is already imported.
+#   python check_startup.py                                  # exits 1 when over budget
+#   python check_startup.py --import-budget 0.8 --paint-budget 1.5
+# Measures (1) importing the modules app.py imports and (2) the first script run of a new session
+# (first paint) against fake_model, and fails if a deferred module was loaded by then.
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+IMPORT_BUDGET = float(os.environ.get("COGNITIO_IMPORT_BUDGET", 1.0))
+PAINT_BUDGET = float(os.environ.get("COGNITIO_PAINT_BUDGET", 1.5))
+
+# Only needed once the model is called or a report is exported; must stay off the first paint
+DEFERRED_MODULES = ("google.generativeai", "langchain_core", "fpdf")
+
+API_KEY = "startup-check"
+
+_WRAPPER = """
+import runpy
+from client_registry import get_registry
+from fake_model import FakeGenerativeModel
+from llm_manager import LLMManager
+get_registry().register({api_key!r}, LLMManager(api_key=None, model=FakeGenerativeModel()))
+runpy.run_path({app!r}, run_name="__main__")
+"""
+
+
+def app_imports(path: str = APP) -> list:
+    # Top-level modules imported by app.py, in order
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def measure():
+    # Runs in the child interpreter; prints one JSON line
+    import importlib
+    start = time.perf_counter()
+    for module in app_imports():
+        importlib.import_module(module)
+    import_seconds = time.perf_counter() - start
+
+    from streamlit.testing.v1 import AppTest
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
+        f.write(_WRAPPER.format(api_key=API_KEY, app=APP))
+    at = AppTest.from_file(f.name, default_timeout=60)
+    at.secrets["GEMINI_API_KEY"] = API_KEY
+    start = time.perf_counter()
+    at.run()
+    paint_seconds = time.perf_counter() - start
+    os.unlink(f.name)
+
+    result = {
+        "import_seconds": round(import_seconds, 3),
+        "paint_seconds": round(paint_seconds, 3),
+        "exceptions": [str(e.value) for e in at.exception],
+        "loaded_deferred": [m for m in DEFERRED_MODULES if m in sys.modules],
+    }
+    print(json.dumps(result), flush=True)
+    # Prefetch threads may still be running; they are not part of the measurement
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check app.py import time and first-paint time against a budget.")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET, help="seconds")
+    parser.add_argument("--paint-budget", type=float, default=PAINT_BUDGET, help="seconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        measure()
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Throwaway stores so the check never touches .cognitio/
+        env = dict(os.environ,
+                   COGNITIO_HISTORY_DB=os.path.join(data_dir, "history.db"),
+                   COGNITIO_QUESTION_BANK=os.path.join(data_dir, "question_bank.db"),
+                   COGNITIO_DEDUP_INDEX=os.path.join(data_dir, "dedup.npz"),
+                   COGNITIO_REPORT_DIR=os.path.join(data_dir, "reports"))
+        env.pop("COGNITIO_EVAL_CACHE_DB", None)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=os.path.dirname(APP),
+                              env=env, capture_output=True, text=True, timeout=300)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        print(proc.stdout + proc.stderr)
+        sys.exit("Startup measurement failed")
+    result = json.loads(lines[-1])
+
+    failures = []
+    if result["import_seconds"] > args.import_budget:
+        failures.append(f"imports took {result['import_seconds']:.2f}s (budget {args.import_budget:.2f}s)")
+    if result["paint_seconds"] > args.paint_budget:
+        failures.append(f"first paint took {result['paint_seconds']:.2f}s (budget {args.paint_budget:.2f}s)")
+    if result["loaded_deferred"]:
+        failures.append(f"deferred modules loaded before first paint: {', '.join(result['loaded_deferred'])}")
+    if result["exceptions"]:
+        failures.append(f"app raised: {result['exceptions']}")
+
+    print(f"imports {result['import_seconds']:.2f}s / {args.import_budget:.2f}s, "
+          f"first paint {result['paint_seconds']:.2f}s / {args.paint_budget:.2f}s")
+    for failure in failures:
+        print(f"  FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from eval_cache import EvaluationCache
+from llm_manager import DEFAULT_MODEL, LLMManager
+from model_router import DEFAULT_BACKENDS, ModelRouter
+from prompts import PrefixCachedModel, get_prefix_cache
+from rate_limiter import RateLimitedModel, RateLimiter
+
+# Process-wide pool of LLMManager instances keyed by (api_key, model_name).
+# genai.configure builds a new transport each call, so configuring once and reusing the same
+# GenerativeModel keeps the underlying connection alive across reruns and sessions.
+
+
+def _key_fingerprint(api_key: str) -> str:
+    # Never keep raw API keys in dictionary keys that may end up in logs or health reports
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+
+class LazyGenerativeModel:
+    # Stands in for genai.GenerativeModel until the first call, so importing the SDK (the slowest
+    # import in the app) happens off the first paint, usually in the prefetch thread
+    def __init__(self, model_name: str, configure: Callable[[], None]):
+        self.model_name = model_name
+        self._configure = configure
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        return self._get()
+
+    @property
+    def routes_tasks(self) -> bool:
+        # Only asked for when a call is about to be made, so loading here costs nothing extra
+        return getattr(self._get(), "routes_tasks", False)
+
+    def _get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    self._configure()
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, prompt, **kwargs):
+        return self._get().generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return await self._get().generate_content_async(prompt, **kwargs)
+
+    def count_tokens(self, prompt):
+        return self._get().count_tokens(prompt)
+
+
+class ClientRegistry:
+    def __init__(self, transport: Optional[str] = None, eval_cache: Optional[EvaluationCache] = None,
+                 backends: Optional[List[str]] = None):
+        self.transport = transport
+        # Extra model names a client may route to besides its own (see model_router)
+        self.backends = backends or []
+        # One evaluation cache for every client, so identical submissions hit across sessions
+        self.eval_cache = eval_cache
+        self._lock = threading.RLock()
+        self._clients: Dict[Tuple[str, str], LLMManager] = {}
+        self._configured_key: Optional[str] = None
+        self._created_at: Dict[Tuple[str, str], float] = {}
+        self._health: Dict[Tuple[str, str], dict] = {}
+        # One limiter per API key: quota is per key, whichever model or session uses it
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    def get(self, api_key: str, model_name: str = DEFAULT_MODEL) -> LLMManager:
+        key = (_key_fingerprint(api_key), model_name)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            # Re-check under the lock: another session may have created it meanwhile
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(api_key, model_name)
+                self._clients[key] = client
+                self._created_at[key] = time.time()
+            return client
+
+    def _configure(self, api_key: str):
+        # genai keeps its configuration globally, so only reconfigure when the key changes
+        with self._lock:
+            if self._configured_key != api_key:
+                import google.generativeai as genai
+                genai.configure(api_key=api_key, transport=self.transport)
+                self._configured_key = api_key
+
+    def _create(self, api_key: str, model_name: str) -> LLMManager:
+        def factory(name):
+            # Registry prompts go out as body-only requests where the backend caches their preamble
+            return PrefixCachedModel(LazyGenerativeModel(name, lambda: self._configure(api_key)), get_prefix_cache())
+
+        names = [model_name] + [name for name in self.backends if name != model_name]
+        limiter = self._limiters.setdefault(_key_fingerprint(api_key), RateLimiter.from_env())
+        if len(names) == 1:
+            model = factory(model_name)
+        else:
+            # Hedges are extra requests on the same key, so they are charged to the same limiter
+            model = ModelRouter.from_names(names, factory, limiter=limiter)
+        model = RateLimitedModel(model, limiter)
+        return LLMManager(api_key, model=model, model_name=model_name, eval_cache=self.eval_cache)
+
+    def register(self, api_key: str, client, model_name: str = DEFAULT_MODEL):
+        # Lets tests and benchmarks install a manager backed by a fake model
+        with self._lock:
+            key = (_key_fingerprint(api_key), model_name)
+            self._clients[key] = client
+            self._created_at[key] = time.time()
+
+    def health_check(self, api_key: Optional[str] = None, model_name: Optional[str] = None) -> Dict[str, dict]:
+        # count_tokens is the cheapest authenticated round trip the SDK offers
+        with self._lock:
+            targets = [
+                (key, client) for key, client in self._clients.items()
+                if (api_key is None or key[0] == _key_fingerprint(api_key))
+                and (model_name is None or key[1] == model_name)
+            ]
+        report = {}
+        for key, client in targets:
+            start = time.perf_counter()
+            try:
+                if hasattr(client.model, "count_tokens"):
+                    client.model.count_tokens("ping")
+                status = {"ok": True, "error": None}
+            except Exception as e:
+                status = {"ok": False, "error": str(e)}
+            status["latency_seconds"] = time.perf_counter() - start
+            status["checked_at"] = time.time()
+            self._health[key] = status
+            report[f"{key[0]}/{key[1]}"] = status
+        return report
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                f"{key[0]}/{key[1]}": {
+                    "created_at": self._created_at.get(key),
+                    "last_health": self._health.get(key),
+                }
+                for key in self._clients
+            }
+
+    def close(self, api_key: Optional[str] = None, model_name: Optional[str] = None):
+        # Drops matching clients; the next get() pays setup cost again
+        with self._lock:
+            for key in list(self._clients):
+                if (api_key is None or key[0] == _key_fingerprint(api_key)) and (model_name is None or key[1] == model_name):
+                    self._clients.pop(key)
+                    self._created_at.pop(key, None)
+                    self._health.pop(key, None)
+            if not self._clients:
+                self._configured_key = None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ClientRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            # COGNITIO_MODEL_BACKENDS="gemma-3-27b-it" (a single model) turns routing off
+            backends = os.environ.get("COGNITIO_MODEL_BACKENDS", ",".join(DEFAULT_BACKENDS)).split(",")
+            _registry = ClientRegistry(eval_cache=EvaluationCache.from_env(),
+                                       backends=[name.strip() for name in backends if name.strip()])
+        return _registry
+
+
+def get_llm_manager(api_key: str, model_name: str = DEFAULT_MODEL) -> LLMManager:
+    return get_registry().get(api_key, model_name)
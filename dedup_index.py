@@ -0,0 +1,223 @@
+import atexit
+import os
+import re
+import threading
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+# Near-duplicate detection for generated questions. Each question is reduced to a set of word
+# shingles and a MinHash signature; a new question is compared against every stored signature in
+# one vectorized NumPy pass (the estimated Jaccard similarity is the fraction of equal slots).
+# Signatures live in a fixed-size ring buffer, so memory is bounded and the oldest are evicted
+# first, and the buffer is saved to an .npz file so it survives restarts.
+
+NUM_PERM = 64
+DEFAULT_CAPACITY = 5000
+DEFAULT_THRESHOLD = 0.5
+
+_PRIME = np.uint64(4294967291)  # largest prime below 2**32, keeps a * x + b inside uint64
+# Fills removed slots: MinHash values are below _PRIME, so this never matches a real signature
+_REMOVED = np.uint32(0xFFFFFFFF)
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from given has have how in into is it its of on or return returns
+that the their this to which what when where with write you your each all any
+""".split())
+
+
+def question_text(question) -> str:
+    # Title plus the body the model wrote: description for coding questions, options for MCQs
+    parts = [question.title, getattr(question, "description", "")]
+    parts.extend(getattr(question, "options", []) or [])
+    return " ".join(p for p in parts if p)
+
+
+def shingles(text: str) -> set:
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") else w
+             for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+class DedupIndex:
+    def __init__(self, path: Optional[str] = None, capacity: int = DEFAULT_CAPACITY,
+                 threshold: float = DEFAULT_THRESHOLD, num_perm: int = NUM_PERM, seed: int = 1,
+                 save_every: int = 10):
+        self.path = path
+        self.capacity = capacity
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.save_every = save_every
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._signatures = np.zeros((capacity, num_perm), dtype=np.uint32)
+        self._scopes = np.zeros(capacity, dtype=np.uint32)
+        self._titles: List[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._next = 0
+        self._unsaved = 0
+        self.checks = 0
+        self.duplicates = 0
+        if path and os.path.exists(path):
+            self._load()
+
+    # Signatures
+
+    def signature(self, text: str) -> np.ndarray:
+        tokens = shingles(text) or {""}
+        hashes = np.fromiter((zlib.crc32(t.encode()) for t in tokens), dtype=np.uint64, count=len(tokens))
+        # (num_perm, n_shingles) universal hashes, minimum per permutation
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    @staticmethod
+    def scope_id(scope: str) -> int:
+        return zlib.crc32(scope.encode())
+
+    def _best_match(self, signature: np.ndarray, scope: int) -> Tuple[float, Optional[str]]:
+        if not self._size:
+            return 0.0, None
+        rows = self._signatures[:self._size]
+        similarity = (rows == signature).mean(axis=1)
+        similarity[self._scopes[:self._size] != scope] = 0.0
+        best = int(similarity.argmax())
+        return float(similarity[best]), self._titles[best]
+
+    # Queries
+
+    def find_duplicate(self, text: str, scope: str = "") -> Optional[Tuple[str, float]]:
+        # (matched title, estimated similarity) when `text` is a near-duplicate within `scope`
+        signature = self.signature(text)
+        with self._lock:
+            similarity, title = self._best_match(signature, self.scope_id(scope))
+        return (title, similarity) if similarity >= self.threshold else None
+
+    def check_and_add(self, text: str, title: str, scope: str = "") -> Optional[Tuple[str, float]]:
+        # Atomic check + insert so concurrent prefetch workers cannot both admit the same question.
+        # Returns the match for duplicates (nothing is inserted), None when the question was added.
+        signature = self.signature(text)
+        scope_id = self.scope_id(scope)
+        with self._lock:
+            self.checks += 1
+            similarity, match = self._best_match(signature, scope_id)
+            if similarity >= self.threshold:
+                self.duplicates += 1
+                return match, similarity
+            self._insert(signature, scope_id, title)
+        return None
+
+    def add(self, text: str, title: str, scope: str = ""):
+        signature = self.signature(text)
+        with self._lock:
+            self._insert(signature, self.scope_id(scope), title)
+
+    def remove(self, text: str, title: str, scope: str = "") -> bool:
+        # Takes back an entry for a question that was never shown (e.g. a discarded prefetch), so it
+        # doesn't block similar questions later. Only an exact signature + title match is removed.
+        signature = self.signature(text)
+        scope_id = self.scope_id(scope)
+        with self._lock:
+            rows = (self._signatures[:self._size] == signature).all(axis=1) & (self._scopes[:self._size] == scope_id)
+            for i in np.flatnonzero(rows):
+                if self._titles[i] == title:
+                    self._signatures[i] = _REMOVED
+                    self._titles[i] = None
+                    self._unsaved += 1
+                    return True
+        return False
+
+    def _insert(self, signature: np.ndarray, scope_id: int, title: str):
+        # Ring buffer: once full, the oldest signature is overwritten
+        self._signatures[self._next] = signature
+        self._scopes[self._next] = scope_id
+        self._titles[self._next] = title
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._unsaved += 1
+        if self.path and self._unsaved >= self.save_every:
+            self._save_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self._size,
+                "capacity": self.capacity,
+                "checks": self.checks,
+                "duplicates": self.duplicates,
+                "duplicate_rate": self.duplicates / self.checks if self.checks else 0.0,
+                "memory_kb": round((self._signatures.nbytes + self._scopes.nbytes) / 1024, 1),
+            }
+
+    # Persistence
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        if not self.path or not self._unsaved:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Saved oldest first, so loading never needs the ring position; write then rename so a
+        # crash mid-save never leaves a truncated index
+        order = (np.arange(self._size) + (self._next if self._size == self.capacity else 0)) % self.capacity
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, signatures=self._signatures[order], scopes=self._scopes[order],
+                 titles=np.array([self._titles[i] or "" for i in order]), num_perm=np.array(self.num_perm))
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def _load(self):
+        try:
+            with np.load(self.path) as data:
+                if int(data["num_perm"]) != self.num_perm:
+                    print(f"Ignoring dedup index {self.path}: built with a different signature size")
+                    return
+                # Keep the newest rows if capacity shrank
+                signatures = data["signatures"][-self.capacity:]
+                scopes = data["scopes"][-self.capacity:]
+                titles = [str(t) for t in data["titles"][-self.capacity:]]
+        except Exception as e:
+            print(f"Could not load dedup index {self.path}: {e}")
+            return
+        self._size = len(signatures)
+        self._signatures[:self._size] = signatures
+        self._scopes[:self._size] = scopes
+        self._titles[:self._size] = titles
+        self._next = self._size % self.capacity
+
+
+def generate_unique(generate: Callable[[List[str]], object], index: DedupIndex, scope: str,
+                    topic_history: List[str], max_attempts: int = 3):
+    # Regenerates near-duplicates (adding the clashing title to the avoid list) before they reach
+    # the UI. After max_attempts the last candidate is returned rather than failing the request.
+    avoid = list(topic_history)
+    question = None
+    for attempt in range(max_attempts):
+        question = generate(avoid)
+        match = index.check_and_add(question_text(question), question.title, scope)
+        if match is None:
+            return question
+        print(f"Rejected near-duplicate {question.title!r} (~{match[1]:.0%} similar to {match[0]!r})")
+        avoid = avoid + [question.title, match[0]]
+    return question
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> DedupIndex:
+    # COGNITIO_DEDUP_INDEX picks the .npz file
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DedupIndex(os.environ.get("COGNITIO_DEDUP_INDEX", ".cognitio/dedup_index.npz"))
+            atexit.register(_index.save)
+        return _index
@@ -0,0 +1,254 @@
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import tokenize
+from collections import OrderedDict
+from typing import Optional
+
+# Content-addressed cache in front of LLMManager.evaluate_code.
+# Identical submissions (after stripping comments, trailing whitespace and blank lines) to the same
+# problem, model and prompt version share one evaluation, so double-clicks and classroom copies cost
+# a single LLM call. Spacing inside a line is kept: it can be part of a string literal.
+
+_C_STYLE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`)|//[^\n]*|/\*.*?\*/', re.S)
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+# Bumped whenever normalize_code changes, so persisted entries keyed the old way are never matched
+NORMALIZATION_VERSION = 2
+
+
+def _strip_python_comments(code: str) -> str:
+    try:
+        tokens = [t for t in tokenize.generate_tokens(io.StringIO(code).readline) if t.type != tokenize.COMMENT]
+        return tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Unparseable code is still cacheable; fall back to a line-based strip
+        return re.sub(r"#[^\n]*", "", code)
+
+
+def normalize_code(code: str, language: str) -> str:
+    lang = language.lower()
+    if lang.startswith("python"):
+        code = _strip_python_comments(code)
+    elif lang in ("html5", "xhtml"):
+        code = _HTML_COMMENT.sub("", code)
+    else:
+        # Java, JavaScript, PHP, CSS: drop // and /* */ comments but keep string literals
+        code = _C_STYLE.sub(lambda m: m.group(1) or "", code)
+    # Same as batch_grader.normalize_code: line endings and trailing whitespace only
+    return "\n".join(line.rstrip() for line in code.replace("\r\n", "\n").split("\n") if line.strip())
+
+
+def evaluation_cache_key(question, user_code: str, language: str, model_name: str, prompt_version: str) -> str:
+    payload = json.dumps([
+        question.title,
+        getattr(question, "description", "MCQ"),
+        language,
+        normalize_code(user_code, language),
+        NORMALIZATION_VERSION,
+        model_name,
+        prompt_version,
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LRUPolicy:
+    # Evicts the entry that was read or written least recently
+    def __init__(self):
+        self._order = OrderedDict()
+
+    def touch(self, key: str):
+        self._order[key] = None
+        self._order.move_to_end(key)
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+
+class LFUPolicy:
+    # Evicts the least frequently used entry; keeps popular canonical answers resident
+    def __init__(self):
+        self._counts = {}
+
+    def touch(self, key: str):
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def remove(self, key: str):
+        self._counts.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        if not self._counts:
+            return None
+        return min(self._counts, key=self._counts.get)
+
+
+class MemoryTier:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 24 * 3600, policy=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.policy = policy or LRUPolicy()
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = {}  # key -> (value, size, stored_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, _, stored_at = entry
+        if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self.policy.touch(key)
+        return value
+
+    def put(self, key: str, value: str, stored_at: Optional[float] = None):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (value, size, stored_at or time.time())
+        self.bytes += size
+        self.policy.touch(key)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            victim = self.policy.victim()
+            if victim is None:
+                break
+            self._remove(victim)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+        self.policy.remove(key)
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key)
+
+
+class SQLiteTier:
+    def __init__(self, path: str, max_entries: int = 100_000, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS evaluations_accessed ON evaluations (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        row = self._conn.execute("SELECT value, stored_at FROM evaluations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        now = time.time()
+        if self.ttl_seconds is not None and now - stored_at > self.ttl_seconds:
+            self._conn.execute("DELETE FROM evaluations WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute("UPDATE evaluations SET accessed_at = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        return value, stored_at
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO evaluations (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode()), now, now),
+        )
+        # Least recently accessed rows go first once the table is over budget
+        self._conn.execute(
+            "DELETE FROM evaluations WHERE key IN (SELECT key FROM evaluations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def size_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM evaluations").fetchone()[0]
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+
+    def clear(self):
+        self._conn.execute("DELETE FROM evaluations")
+        self._conn.commit()
+
+
+class EvaluationCache:
+    def __init__(self, memory: Optional[MemoryTier] = None, disk: Optional[SQLiteTier] = None):
+        self.memory = memory or MemoryTier()
+        self.disk = disk
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "EvaluationCache":
+        # Set COGNITIO_EVAL_CACHE_DB to a file path to persist evaluations across restarts
+        path = os.environ.get("COGNITIO_EVAL_CACHE_DB")
+        return cls(disk=SQLiteTier(path) if path else None)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return json.loads(value)
+            if self.disk is not None:
+                row = self.disk.get(key)
+                if row is not None:
+                    value, stored_at = row
+                    self.memory.put(key, value, stored_at=stored_at)
+                    self.disk_hits += 1
+                    return json.loads(value)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, evaluation: dict):
+        value = json.dumps(evaluation, separators=(",", ":"))
+        with self._lock:
+            self.memory.put(key, value)
+            if self.disk is not None:
+                self.disk.put(key, value)
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            stats = {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory.bytes,
+                "memory_evictions": self.memory.evictions,
+            }
+            if self.disk is not None:
+                stats["disk_entries"] = len(self.disk)
+                stats["disk_bytes"] = self.disk.size_bytes()
+            return stats
@@ -0,0 +1,272 @@
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+# Local stand-in for genai.GenerativeModel so LLMManager/AsyncLLMManager can run without the API.
+#   manager = LLMManager(api_key=None, model=FakeGenerativeModel(latency=0.2))
+# For benchmarks it can also draw latencies from a log-normal distribution around `latency`
+# (`latency_sigma`), pad responses to `response_chars`, and corrupt a `malformed_rate` share of
+# JSON responses the way real models do. All randomness comes from `seed`.
+# The default responder answers in the shape of the `task` LLMManager passes (see `routes_tasks`);
+# the prompt only supplies how many questions or which submission ids a batch request wants.
+
+# Corruptions applied to JSON responses; the last one is unrecoverable and forces a repair round
+MALFORMATIONS = ("fenced", "single_quotes", "trailing_comma", "truncated")
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt: Optional[str] = None, cached_tokens: int = 0,
+                 finish_reason: str = "STOP"):
+        self.text = text
+        self.candidates = [SimpleNamespace(finish_reason=finish_reason)]
+        if prompt is not None:
+            # Same fields as the SDK's usage_metadata, with ~4 chars/token
+            prompt_tokens = len(prompt) // 4 + 1
+            self.usage_metadata = SimpleNamespace(
+                prompt_token_count=prompt_tokens, candidates_token_count=len(text) // 4 + 1,
+                cached_content_token_count=cached_tokens,
+                total_token_count=prompt_tokens + len(text) // 4 + 1)
+
+
+class FakeModelError(Exception):
+    pass
+
+
+class FakeGenerativeModel:
+    # Receives task=... like a ModelRouter does, so answers follow the task instead of prompt wording
+    routes_tasks = True
+
+    def __init__(self, responder: Optional[Callable[[str, Optional[str]], str]] = None, latency: float = 0.0,
+                 error_rate: float = 0.0, seed: int = 0, model_name: str = "fake-model",
+                 chunk_delay: float = 0.0, latency_sigma: float = 0.0, response_chars: int = 0,
+                 malformed_rate: float = 0.0, token_latency: float = 0.0):
+        # responder(prompt, task) -> response text
+        self.responder = responder or self.default_response
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.chunk_delay = chunk_delay
+        self.response_chars = response_chars
+        self.malformed_rate = malformed_rate
+        # Extra seconds per output token, so long responses take longer like real decoding does
+        self.token_latency = token_latency
+        self.model_name = model_name
+        self.calls = 0
+        self.malformed = 0
+        # Input tokens received, and how many of them came from a cached prefix
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.seed = seed
+        self._rng = random.Random(seed)
+        # Numbers fake questions; per instance, so a seeded model answers the same way every run
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _next_call(self):
+        # Returns (delay, should_fail, malformation) under a lock so seeded runs stay deterministic
+        with self._lock:
+            self.calls += 1
+            delay = self.latency
+            if delay and self.latency_sigma:
+                # Log-normal with median `latency`: mostly near it, with a long slow tail
+                delay *= math.exp(self._rng.gauss(0.0, self.latency_sigma))
+            fail = self._rng.random() < self.error_rate
+            malformation = None
+            if self._rng.random() < self.malformed_rate:
+                malformation = self._rng.choice(MALFORMATIONS)
+            return delay, fail, malformation
+
+    def _respond(self, prompt, task: Optional[str], malformation: Optional[str], generation_config=None) -> tuple:
+        # Returns (text, finish_reason); like the API, text beyond max_output_tokens is cut off
+        text = self.responder(str(prompt), task)
+        if self.response_chars:
+            text = pad_response(text, self.response_chars)
+        if malformation and text.lstrip().startswith("{"):
+            with self._lock:
+                self.malformed += 1
+            text = malform(text, malformation)
+        cap = (generation_config or {}).get("max_output_tokens")
+        finish_reason = "STOP"
+        if cap and len(text) > cap * 4:
+            text, finish_reason = text[:cap * 4], "MAX_TOKENS"
+        with self._lock:
+            self.output_tokens += len(text) // 4 + 1
+        return text, finish_reason
+
+    def default_response(self, prompt: str, task: Optional[str]) -> str:
+        return default_responder(prompt, task, self._counter.__next__, self.seed)
+
+    def generate_content(self, prompt, stream: bool = False, cached_prefix: str = "", task: Optional[str] = None,
+                         **kwargs):
+        delay, fail, malformation = self._next_call()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise FakeModelError("Injected fake model failure")
+        prompt = cached_prefix + str(prompt)
+        cached_tokens = len(cached_prefix) // 4
+        with self._lock:
+            self.prompt_tokens += len(prompt) // 4 + 1
+            self.cached_tokens += cached_tokens
+        text, finish_reason = self._respond(prompt, task, malformation, kwargs.get("generation_config"))
+        if self.token_latency:
+            time.sleep(self.token_latency * (len(text) // 4 + 1))
+        if stream:
+            return self._stream(text, finish_reason)
+        return FakeResponse(text, prompt, cached_tokens, finish_reason)
+
+    def cached_content(self, preamble: str) -> "FakeCachedModel":
+        # Stand-in for genai.GenerativeModel.from_cached_content
+        return FakeCachedModel(self, preamble)
+
+    def _stream(self, text: str, finish_reason: str = "STOP", chunk_size: int = 16):
+        # Mimics a streamed response: an iterable of partial responses, each with .text. As with the
+        # API, only the final chunk carries a finish_reason (MAX_TOKENS when the cap cut the text).
+        for i in range(0, len(text), chunk_size):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            last = i + chunk_size >= len(text)
+            yield FakeResponse(text[i:i + chunk_size], finish_reason=finish_reason if last else None)
+
+    async def generate_content_async(self, prompt, cached_prefix: str = "", task: Optional[str] = None,
+                                     **kwargs) -> FakeResponse:
+        delay, fail, malformation = self._next_call()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise FakeModelError("Injected fake model failure")
+        prompt = cached_prefix + str(prompt)
+        text, finish_reason = self._respond(prompt, task, malformation, kwargs.get("generation_config"))
+        if self.token_latency:
+            await asyncio.sleep(self.token_latency * (len(text) // 4 + 1))
+        return FakeResponse(text, prompt, len(cached_prefix) // 4, finish_reason)
+
+
+class FakeCachedModel:
+    # A FakeGenerativeModel bound to a cached preamble: requests carry only the prompt body
+    routes_tasks = True
+
+    def __init__(self, model: FakeGenerativeModel, preamble: str):
+        self.model = model
+        self.preamble = preamble
+        self.model_name = model.model_name
+
+    def generate_content(self, prompt, **kwargs):
+        return self.model.generate_content(prompt, cached_prefix=self.preamble, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return await self.model.generate_content_async(prompt, cached_prefix=self.preamble, **kwargs)
+
+
+def fake_prefix_cache(min_tokens: int = 0):
+    # prompts.PrefixCache that "uploads" preambles to FakeGenerativeModel.cached_content
+    from prompts import PrefixCache
+    return PrefixCache(lambda model, preamble, ttl: model.cached_content(preamble), lambda name: True,
+                       min_tokens=min_tokens)
+
+
+_FILLER = ("Consider how the input size affects the running time and which edge cases "
+           "(empty input, duplicates, negative numbers) change the answer. ")
+
+
+def pad_response(text: str, size: int) -> str:
+    # Grows the main prose field (or plain text) to about `size` characters
+    if len(text) >= size:
+        return text
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text + "\n\n" + (_FILLER * (size // len(_FILLER) + 1))[:size - len(text)]
+    key = next((k for k in ("explanation", "description") if isinstance(data.get(k), str)), None)
+    if key is None:
+        return text
+    data[key] += " " + (_FILLER * (size // len(_FILLER) + 1))[:size - len(text)]
+    return json.dumps(data)
+
+
+def malform(text: str, kind: str) -> str:
+    if kind == "fenced":
+        return f"Here is the JSON you asked for:\n```json\n{text}\n```"
+    if kind == "single_quotes":
+        return text.replace('"', "'")
+    if kind == "trailing_comma":
+        return text.rstrip().rstrip("}") + ",}"
+    return text[:len(text) // 2]
+
+
+# Per-question filler words so fake questions are not near-duplicates of each other
+_TOPICS = """arrays strings hashing sorting recursion graphs trees heaps stacks queues intervals matrices
+bits greedy windows pointers parsing caching streams scheduling geometry primes dates inventory
+sensors playlists tickets routes orders ledgers votes grades weather elevators parking""".split()
+
+
+def _topic_words(n: int, count: int = 4, seed: int = 0) -> str:
+    return " ".join(random.Random(seed * 1_000_003 + n).sample(_TOPICS, count))
+
+
+def _fake_mcq(n: int, seed: int = 0) -> dict:
+    return {
+        "title": f"Fake MCQ #{n}: which statement about {_topic_words(n, seed=seed)} is true?",
+        "options": [f"Option {c} on {_topic_words(n * 4 + i, 2, seed)}" for i, c in enumerate("ABCD")],
+        "correct_option_index": n % 4,
+        "explanation": "Because the fake model says so.",
+    }
+
+
+def _fake_coding_question(n: int, seed: int = 0) -> dict:
+    return {
+        "title": f"Fake Problem #{n}",
+        "description": f"In a system handling {_topic_words(n, seed=seed)}, return the sum of a list of integers.",
+        "examples": ["Input: nums = [1,2,3]\nOutput: 6"],
+        "constraints": ["1 <= nums.length <= 10^4"],
+        "starter_code": "def solve(nums):\n    pass",
+        "test_cases": [
+            {"input": "[[1, 2, 3]]", "expected_output": "6"},
+            {"input": "[[-5, 5]]", "expected_output": "0"},
+        ],
+    }
+
+
+def _fake_evaluation(submission_id: Optional[str] = None) -> dict:
+    evaluation = {
+        "is_correct": True,
+        "explanation": "Your code correctly implements the required behaviour.",
+        "tips": ["Consider edge cases", "Add type hints"],
+        "rating": 8,
+    }
+    return evaluation if submission_id is None else {"id": submission_id, **evaluation}
+
+
+def default_responder(prompt: str, task: Optional[str], next_number: Callable[[], int], seed: int = 0) -> str:
+    # Answers in the shape `task` asks for; titles are numbered so they never repeat. The prompt only
+    # says how big a batch is: "Count: N" / "### Submission <id>" lines, or in a repair round
+    # (structured_output.repair_prompt) the items of the broken output.
+    kind = (task or "").split(":")[0]
+    repair = "could not be parsed or validated" in prompt
+    if kind == "evaluation":
+        if repair:
+            ids = re.findall(r"""["']id["']\s*:\s*["']([^"']+)""", prompt) if "evaluations" in prompt else []
+        else:
+            ids = re.findall(r"^### Submission (\S+)$", prompt, re.M)
+        if ids:
+            return json.dumps({"evaluations": [_fake_evaluation(i) for i in ids]})
+        return json.dumps(_fake_evaluation())
+    if kind in ("mcq", "coding_question"):
+        make = _fake_mcq if kind == "mcq" else _fake_coding_question
+        if repair:
+            count = max(1, len(re.findall(r"""["']title["']""", prompt))) if "questions" in prompt else 0
+        else:
+            match = re.search(r"^Count: (\d+)$", prompt, re.M)
+            count = int(match.group(1)) if match else 0
+        if count:
+            return json.dumps({"questions": [make(next_number(), seed) for _ in range(count)]})
+        return json.dumps(make(next_number(), seed))
+    return "# Progress Report\n\n## Summary\n\nYou answered every fake question.\n"
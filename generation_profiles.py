@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from telemetry import annotate
+
+# Per-task generation settings (max_output_tokens, temperature, stop sequences, response schema).
+# Output tokens dominate latency, so every task gets a cap. With `adaptive` on, the cap follows
+# what the task actually produces: p95 of recent response lengths times `headroom`, clamped to
+# [min_output_tokens, max_output_tokens_limit]. A response cut off at the cap raises it straight away.
+#   profiles = get_generation_profiles()
+#   model.generate_content(prompt, generation_config=profiles.generation_config("mcq", {"response_mime_type": ...}))
+#   profiles.record("mcq", "Easy", response_tokens=180, seconds=1.4, truncated=False)
+# COGNITIO_GENERATION_PROFILES overrides fields per task, as inline JSON or a path to a JSON file:
+#   {"mcq": {"max_output_tokens": 400, "temperature": 0.7}, "report": {"adaptive": false}}
+
+# Recent observations kept per task (for adaptation) and per task and difficulty (for reporting)
+WINDOW = 200
+# Observations needed before the cap moves away from its configured starting value
+MIN_SAMPLES = 20
+
+
+class GenerationProfile:
+    def __init__(self, task: str, max_output_tokens: int, temperature: Optional[float] = None,
+                 stop_sequences: Optional[List[str]] = None, schema=None, min_output_tokens: int = 128,
+                 max_output_tokens_limit: int = 8192, adaptive: bool = True, headroom: float = 1.5):
+        self.task = task
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.stop_sequences = stop_sequences or []
+        # Pydantic model sent as response_schema, only to models with native JSON mode
+        self.schema = schema
+        self.min_output_tokens = min_output_tokens
+        self.max_output_tokens_limit = max_output_tokens_limit
+        self.adaptive = adaptive
+        self.headroom = headroom
+
+    def clamp(self, tokens: float) -> int:
+        return int(min(self.max_output_tokens_limit, max(self.min_output_tokens, tokens)))
+
+    def as_dict(self) -> dict:
+        return {"max_output_tokens": self.max_output_tokens, "temperature": self.temperature,
+                "stop_sequences": self.stop_sequences, "schema": getattr(self.schema, "__name__", None),
+                "bounds": [self.min_output_tokens, self.max_output_tokens_limit], "adaptive": self.adaptive}
+
+
+def default_profiles() -> Dict[str, GenerationProfile]:
+    # Starting caps are ~2x typical response lengths; adaptation tightens or widens them from there
+    from llm_manager import MCQQuestion
+    return {profile.task: profile for profile in (
+        # No schema: TestCase's free-form (Any) fields have no response_schema equivalent
+        GenerationProfile("coding_question", 1536, temperature=0.9, min_output_tokens=512, max_output_tokens_limit=4096),
+        GenerationProfile("coding_question:hard", 2048, temperature=0.9, min_output_tokens=768, max_output_tokens_limit=4096),
+        GenerationProfile("mcq", 512, temperature=0.8, schema=MCQQuestion,
+                          min_output_tokens=192, max_output_tokens_limit=1024),
+        # Multi-question requests: caps are per question and scaled by the number asked for
+        GenerationProfile("coding_question_batch", 1536, temperature=0.9, min_output_tokens=512, max_output_tokens_limit=8192),
+        GenerationProfile("mcq_batch", 512, temperature=0.8, min_output_tokens=192, max_output_tokens_limit=8192),
+        # Low temperature: the same code should get the same verdict (and the cache relies on it)
+        GenerationProfile("evaluation", 768, temperature=0.2, min_output_tokens=256, max_output_tokens_limit=2048),
+        GenerationProfile("evaluation:hard", 1024, temperature=0.2, min_output_tokens=384, max_output_tokens_limit=2048),
+        # Packed evaluations: the cap is per submission and scaled by the number in the request
+        GenerationProfile("batch_evaluation", 512, temperature=0.2, min_output_tokens=192, max_output_tokens_limit=4096),
+        GenerationProfile("summary", 256, temperature=0.3, min_output_tokens=128, max_output_tokens_limit=512),
+        GenerationProfile("report", 2048, temperature=0.5, min_output_tokens=1024, max_output_tokens_limit=4096),
+    )}
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class GenerationProfiles:
+    def __init__(self, profiles: Optional[Dict[str, GenerationProfile]] = None, window: int = WINDOW,
+                 min_samples: int = MIN_SAMPLES):
+        self.profiles = profiles if profiles is not None else default_profiles()
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, deque] = {}  # task -> recent response tokens (per unit of scale)
+        self._observed: Dict[tuple, deque] = {}  # (task, difficulty) -> recent (tokens, seconds)
+        self._truncated: Dict[tuple, int] = {}
+
+    def profile(self, task: str) -> Optional[GenerationProfile]:
+        # "evaluation:hard" falls back to "evaluation", like model_router routes
+        return self.profiles.get(task) or self.profiles.get(task.split(":")[0])
+
+    def generation_config(self, task: str, overrides: Optional[dict] = None, scale: int = 1) -> dict:
+        # The task's cap and sampling settings under `overrides` (e.g. JSON mode from structured_output).
+        # `scale` multiplies the cap for requests that carry several items (packed evaluations).
+        profile = self.profile(task)
+        config = {}
+        if profile is not None:
+            with self._lock:
+                cap = profile.max_output_tokens
+            config["max_output_tokens"] = profile.clamp(cap * scale) if scale > 1 else cap
+            if profile.temperature is not None:
+                config["temperature"] = profile.temperature
+            if profile.stop_sequences:
+                config["stop_sequences"] = list(profile.stop_sequences)
+        config.update(overrides or {})
+        if profile is not None and profile.schema is not None and config.get("response_mime_type") == "application/json":
+            config["response_schema"] = profile.schema
+        return config
+
+    def record(self, task: str, difficulty: Optional[str], response_tokens: int, seconds: float,
+               truncated: bool = False, scale: int = 1):
+        profile = self.profile(task)
+        key = (task, difficulty or "-")
+        with self._lock:
+            # Lengths are per item, like the caps, so multi-item requests compare with single ones
+            self._observed.setdefault(key, deque(maxlen=self.window)).append((round(response_tokens / scale), seconds))
+            if truncated:
+                self._truncated[key] = self._truncated.get(key, 0) + 1
+            if profile is None or not profile.adaptive:
+                return
+            tokens = self._tokens.setdefault(profile.task, deque(maxlen=self.window))
+            tokens.append(response_tokens / scale)
+            before = profile.max_output_tokens
+            if truncated:
+                # The cap cut a response short (for JSON tasks that costs a repair round): widen now
+                profile.max_output_tokens = profile.clamp(before * profile.headroom)
+            elif len(tokens) >= self.min_samples:
+                profile.max_output_tokens = profile.clamp(_percentile(list(tokens), 0.95) * profile.headroom)
+        if profile.max_output_tokens != before:
+            annotate(output_cap_adjusted=profile.max_output_tokens)
+
+    def summary(self) -> Dict[str, dict]:
+        # Observed output length and latency per task and difficulty, with the cap now in force
+        with self._lock:
+            observed = {key: list(values) for key, values in self._observed.items()}
+            truncated = dict(self._truncated)
+        result = {}
+        for (task, difficulty), values in sorted(observed.items()):
+            tokens = [t for t, _ in values]
+            seconds = [s for _, s in values]
+            profile = self.profile(task)
+            result[f"{task} ({difficulty})"] = {
+                "count": len(values),
+                "tokens_p50": _percentile(tokens, 0.5),
+                "tokens_p95": _percentile(tokens, 0.95),
+                "latency_p50_ms": round(_percentile(seconds, 0.5) * 1000, 1),
+                "latency_p95_ms": round(_percentile(seconds, 0.95) * 1000, 1),
+                "truncated": truncated.get((task, difficulty), 0),
+                "max_output_tokens": profile.max_output_tokens if profile else None,
+            }
+        return result
+
+
+def is_truncated(response) -> bool:
+    # finish_reason MAX_TOKENS on the first candidate (an enum in the SDK, a string in fakes)
+    candidates = getattr(response, "candidates", None)
+    if not candidates:
+        return False
+    reason = getattr(candidates[0], "finish_reason", None)
+    return getattr(reason, "name", reason) == "MAX_TOKENS"
+
+
+def load_overrides(profiles: Dict[str, GenerationProfile], spec: str) -> Dict[str, GenerationProfile]:
+    # `spec` is inline JSON or a path to a JSON file: {task: {field: value}}; unknown tasks are added
+    if not spec.lstrip().startswith("{"):
+        with open(spec) as f:
+            spec = f.read()
+    for task, fields in json.loads(spec).items():
+        profile = profiles.get(task)
+        if profile is None:
+            profile = profiles[task] = GenerationProfile(task, fields.get("max_output_tokens", 1024))
+        for field, value in fields.items():
+            if not hasattr(profile, field) or field in ("task", "schema"):
+                raise ValueError(f"Unknown generation profile field for {task}: {field}")
+            setattr(profile, field, value)
+    return profiles
+
+
+_profiles = None
+_profiles_lock = threading.Lock()
+
+
+def get_generation_profiles() -> GenerationProfiles:
+    global _profiles
+    with _profiles_lock:
+        if _profiles is None:
+            profiles = default_profiles()
+            spec = os.environ.get("COGNITIO_GENERATION_PROFILES")
+            if spec:
+                profiles = load_overrides(profiles, spec)
+            _profiles = GenerationProfiles(profiles)
+        return _profiles
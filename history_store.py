@@ -0,0 +1,272 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+# Persistent practice history. Entries are appended once and never rewritten; late facts about an
+# entry (e.g. the measured complexity that arrives after grading) are appended as annotations and
+# merged on read. Queries filter on indexed columns and page with limit/offset so the app only
+# keeps a small working set in st.session_state.
+
+# Columns promoted out of the JSON payload so they can be indexed and filtered
+INDEXED_FIELDS = ("language", "difficulty", "mode", "is_correct")
+
+
+class HistoryStore:
+    def append(self, user_id: str, entry: dict) -> int:
+        raise NotImplementedError
+
+    def annotate(self, entry_id: int, **fields):
+        raise NotImplementedError
+
+    def query(self, user_id: str, limit: Optional[int] = 50, offset: int = 0, newest_first: bool = True,
+              **filters) -> List[dict]:
+        raise NotImplementedError
+
+    def count(self, user_id: str, **filters) -> int:
+        raise NotImplementedError
+
+    def recent_titles(self, user_id: str, limit: int = 200) -> List[str]:
+        # Oldest first, matching the order of the in-session history list
+        return [e["question"] for e in reversed(self.query(user_id, limit=limit))]
+
+    def score(self, user_id: str) -> int:
+        return self.count(user_id, is_correct=True)
+
+    def topic_stats(self, user_id: str) -> List[dict]:
+        # One row per (language, mode, difficulty): {"language", "mode", "difficulty", "attempts", "correct"}
+        raise NotImplementedError
+
+    def get_summary(self, user_id: str, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def put_summary(self, user_id: str, key: str, text: str):
+        raise NotImplementedError
+
+    def iter_all(self, user_id: str, page_size: int = 200, **filters) -> Iterator[dict]:
+        # Oldest first, one page in memory at a time
+        offset = 0
+        while True:
+            page = self.query(user_id, limit=page_size, offset=offset, newest_first=False, **filters)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def close(self):
+        pass
+
+
+class InMemoryHistoryStore(HistoryStore):
+    # Non-persistent backend for tests and throwaway deployments
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: List[dict] = []
+        self._annotations: Dict[int, dict] = {}
+        self._summaries: Dict[tuple, str] = {}
+
+    def append(self, user_id: str, entry: dict) -> int:
+        with self._lock:
+            entry_id = len(self._rows) + 1
+            row = dict(entry, id=entry_id, user_id=user_id, created_at=time.time())
+            self._rows.append(row)
+            return entry_id
+
+    def annotate(self, entry_id: int, **fields):
+        with self._lock:
+            self._annotations.setdefault(entry_id, {}).update(fields)
+
+    def _matching(self, user_id: str, filters: dict) -> List[dict]:
+        return [
+            row for row in self._rows
+            if row["user_id"] == user_id
+            and all(row.get(k) == v for k, v in filters.items() if v is not None)
+        ]
+
+    def query(self, user_id: str, limit: Optional[int] = 50, offset: int = 0, newest_first: bool = True,
+              **filters) -> List[dict]:
+        with self._lock:
+            rows = self._matching(user_id, filters)
+            if newest_first:
+                rows = rows[::-1]
+            rows = rows[offset:offset + limit if limit is not None else None]
+            return [dict(row, **self._annotations.get(row["id"], {})) for row in rows]
+
+    def count(self, user_id: str, **filters) -> int:
+        with self._lock:
+            return len(self._matching(user_id, filters))
+
+    def topic_stats(self, user_id: str) -> List[dict]:
+        with self._lock:
+            stats = {}
+            for row in self._matching(user_id, {}):
+                key = (row.get("language"), row.get("mode"), row.get("difficulty"))
+                entry = stats.setdefault(key, {"language": key[0], "mode": key[1], "difficulty": key[2],
+                                               "attempts": 0, "correct": 0})
+                entry["attempts"] += 1
+                entry["correct"] += 1 if row.get("is_correct") else 0
+            return list(stats.values())
+
+    def get_summary(self, user_id: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._summaries.get((user_id, key))
+
+    def put_summary(self, user_id: str, key: str, text: str):
+        with self._lock:
+            self._summaries[(user_id, key)] = text
+
+
+class SQLiteHistoryStore(HistoryStore):
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets several Streamlit sessions read while one appends
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                question TEXT NOT NULL,
+                language TEXT,
+                difficulty TEXT,
+                mode TEXT,
+                is_correct INTEGER,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id);
+            CREATE INDEX IF NOT EXISTS history_filters ON history (user_id, language, difficulty, mode, is_correct);
+            CREATE TABLE IF NOT EXISTS history_annotations (
+                entry_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_annotations_entry ON history_annotations (entry_id);
+            CREATE TABLE IF NOT EXISTS history_summaries (
+                user_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                PRIMARY KEY (user_id, key)
+            );
+        """)
+        self._conn.commit()
+
+    def append(self, user_id: str, entry: dict) -> int:
+        payload = {k: v for k, v in entry.items() if k not in INDEXED_FIELDS and k not in ("id", "question")}
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO history (user_id, created_at, question, language, difficulty, mode, is_correct, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, time.time(), entry["question"], entry.get("language"), entry.get("difficulty"),
+                 entry.get("mode"), None if entry.get("is_correct") is None else int(entry["is_correct"]),
+                 json.dumps(payload, separators=(",", ":"), default=str)),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def annotate(self, entry_id: int, **fields):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO history_annotations (entry_id, created_at, payload) VALUES (?, ?, ?)",
+                (entry_id, time.time(), json.dumps(fields, separators=(",", ":"), default=str)),
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _where(user_id: str, filters: dict):
+        clauses, params = ["user_id = ?"], [user_id]
+        for key, value in filters.items():
+            if key not in INDEXED_FIELDS:
+                raise ValueError(f"Cannot filter history on {key!r}")
+            if value is None:
+                continue
+            clauses.append(f"{key} = ?")
+            params.append(int(value) if key == "is_correct" else value)
+        return " AND ".join(clauses), params
+
+    def query(self, user_id: str, limit: Optional[int] = 50, offset: int = 0, newest_first: bool = True,
+              **filters) -> List[dict]:
+        where, params = self._where(user_id, filters)
+        order = "DESC" if newest_first else "ASC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, created_at, question, language, difficulty, mode, is_correct, payload FROM history "
+                f"WHERE {where} ORDER BY id {order} LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+            annotations = {}
+            if rows:
+                ids = [row[0] for row in rows]
+                for entry_id, payload in self._conn.execute(
+                    f"SELECT entry_id, payload FROM history_annotations WHERE entry_id IN ({','.join('?' * len(ids))}) "
+                    "ORDER BY rowid", ids,
+                ):
+                    annotations.setdefault(entry_id, {}).update(json.loads(payload))
+
+        entries = []
+        for entry_id, created_at, question, language, difficulty, mode, is_correct, payload in rows:
+            entry = json.loads(payload)
+            entry.update(id=entry_id, created_at=created_at, question=question, language=language,
+                         difficulty=difficulty, mode=mode,
+                         is_correct=None if is_correct is None else bool(is_correct))
+            entry.update(annotations.get(entry_id, {}))
+            entries.append(entry)
+        return entries
+
+    def count(self, user_id: str, **filters) -> int:
+        where, params = self._where(user_id, filters)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM history WHERE {where}", params).fetchone()[0]
+
+    def topic_stats(self, user_id: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT language, mode, difficulty, COUNT(*), COALESCE(SUM(is_correct), 0) FROM history "
+                "WHERE user_id = ? GROUP BY language, mode, difficulty", (user_id,)
+            ).fetchall()
+        return [{"language": language, "mode": mode, "difficulty": difficulty, "attempts": attempts, "correct": correct}
+                for language, mode, difficulty, attempts, correct in rows]
+
+    def get_summary(self, user_id: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM history_summaries WHERE user_id = ? AND key = ?", (user_id, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, user_id: str, key: str, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO history_summaries (user_id, key, summary) VALUES (?, ?, ?)", (user_id, key, text)
+            )
+            self._conn.commit()
+
+    def recent_titles(self, user_id: str, limit: int = 200) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    # COGNITIO_HISTORY_DB picks the SQLite file; ":memory:" is accepted for ephemeral runs
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteHistoryStore(os.environ.get("COGNITIO_HISTORY_DB", ".cognitio/history.db"))
+        return _store
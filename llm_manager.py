@@ -1,10 +1,18 @@
-import os
-import google.generativeai as genai
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
-from typing import List, Optional
-import json
+from typing import Any, Dict, Iterator, List, Optional
+import time
+from generation_profiles import get_generation_profiles, is_truncated
+from model_router import task_name
+from report_digest import HistoryDigest
+from streaming import JSONFieldStreamer, LastChunk, StreamMetrics, timed_chunks
+from structured_output import StructuredOutputStats, generate_items, generate_structured, supports_native_json, validate_model
+from prompts import get_prompt
+from telemetry import annotate, response_token_counts, span
+
+class TestCase(BaseModel):
+    # Any: models return these either as JSON strings or as inline JSON values; sandbox accepts both
+    input: Any = Field(description="JSON array of the positional arguments passed to the function, e.g. [[2, 7, 11, 15], 9]")
+    expected_output: Any = Field(description="JSON value the function must return for that input, e.g. [0, 1]")
 
 class CodingQuestion(BaseModel):
     title: str = Field(description="The title of the coding problem")
@@ -12,6 +20,7 @@ class CodingQuestion(BaseModel):
     examples: List[str] = Field(description="Examples of input and output")
     constraints: List[str] = Field(description="Constraints for the problem")
     starter_code: str = Field(description="The function signature/boilerplate ONLY. DO NOT include the solution implementation.")
+    test_cases: List[TestCase] = Field(default_factory=list, description="Machine-checkable cases run locally against the user's function")
 
 class MCQQuestion(BaseModel):
     title: str = Field(description="The question text")
@@ -19,227 +28,393 @@ class MCQQuestion(BaseModel):
     correct_option_index: int = Field(description="The index (0-3) of the correct option")
     explanation: str = Field(description="Explanation of why the correct answer is correct")
 
+class ComplexityProfile(BaseModel):
+    time_class: str = Field(description="Best-fitting growth class for runtime, e.g. O(n log n)")
+    memory_class: Optional[str] = Field(None, description="Best-fitting growth class for peak extra memory")
+    sizes: List[int] = Field(default_factory=list, description="Input sizes that were measured")
+    times_ms: List[float] = Field(default_factory=list, description="Best wall time per size in milliseconds")
+    peak_memory_kb: List[float] = Field(default_factory=list, description="Peak traced allocation per size in KiB")
+    max_n: Optional[int] = Field(None, description="Largest input size allowed by the question's constraints")
+    projected_ms_at_max: Optional[float] = Field(None, description="Fitted runtime extrapolated to max_n")
+    too_slow: bool = Field(False, description="Whether the solution would exceed the time budget at max_n")
+
 class Evaluation(BaseModel):
     is_correct: bool = Field(description="Whether the user's answer is correct")
     explanation: str = Field(description="Detailed explanation of why it is correct or incorrect")
     tips: List[str] = Field(description="Tips for improvement or optimization")
     rating: int = Field(description="Rating from 1 to 10 based on code quality and correctness")
+    # Filled in locally by profiler.ComplexityProfiler, never by the model
+    complexity: Optional[ComplexityProfile] = None
+
+class BatchEvaluationItem(Evaluation):
+    id: str = Field(description="Id of the submission this evaluation is for")
+
+class BatchEvaluation(BaseModel):
+    evaluations: List[BatchEvaluationItem] = Field(description="One evaluation per submission")
+
+DEFAULT_MODEL = 'gemma-3-27b-it'
+
+# Part of the evaluation cache key, so cached evaluations from an older prompt are not reused
+EVALUATION_PROMPT_VERSION = get_prompt("evaluation").version
+
 
 class LLMManager:
-    def __init__(self, api_key: str):
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemma-3-27b-it')
+    def __init__(self, api_key: str, model=None, model_name: str = DEFAULT_MODEL, eval_cache=None, profiles=None,
+                 prechecker=None):
+        # `model` lets callers inject any object with generate_content (e.g. fake_model.FakeGenerativeModel)
+        if model is None:
+            # Imported here: the SDK is slow to import and only needed when no model is injected
+            import google.generativeai as genai
+            genai.configure(api_key=api_key)
+            model = genai.GenerativeModel(model_name)
+        self.model = model
+        self.model_name = model_name
+        # Optional eval_cache.EvaluationCache shared between sessions
+        self.eval_cache = eval_cache
+        # Time-to-first-token for the streaming methods
+        self.stream_metrics = StreamMetrics()
+        # Parse latency and repair rate per Pydantic model
+        self.structured_stats = StructuredOutputStats()
+        # Output caps and sampling settings per task, tuned from the response lengths recorded here
+        self.profiles = profiles or get_generation_profiles()
+        # Local checks (syntax, unchanged starter code, missing function) that answer without a model call
+        if prechecker is None:
+            from precheck import get_prechecker  # imported here: precheck imports this module
+            prechecker = get_prechecker()
+        self.prechecker = prechecker
         
-    def _get_json_response(self, prompt_text: str, pydantic_model) -> dict:
-        try:
-             # Add explicit JSON instruction
-            prompt_text += "\n\nIMPORTANT: Output strictly valid JSON. No markdown formatting. Ensure all keys and string values are enclosed in double quotes."
-            
-            response = self.model.generate_content(prompt_text)
-            text = response.text.strip()
-            
-            print(f"DEBUG: Raw LLM Response: {text}")
-
-            # Robust JSON extraction using simple regex first, then raw_decode
-            import re
-            
-            # Find the first opening brace
-            start_idx = text.find("{")
-            if start_idx != -1:
-                # Limit text to start from the first brace
-                json_candidate = text[start_idx:]
-                try:
-                    # raw_decode stops automatically when the valid JSON object ends
-                    json_dict, end_idx = json.JSONDecoder().raw_decode(json_candidate)
-                    
-                    # Helper for Pydantic v1 vs v2 compatibility
-                    if hasattr(pydantic_model, 'model_validate'):
-                        return pydantic_model.model_validate(json_dict)
-                    else:
-                        return pydantic_model.parse_obj(json_dict)
-                except json.JSONDecodeError as e:
-                     # Fallback to AST literal eval if standard JSON fails (handles single quotes)
-                    print(f"Standard JSON parse failed, trying AST: {e}")
-            
-            # Fallback strategy: regex to find { ... }
-            # This is less preferred but can catch single-quoted dicts
-            match = re.search(r"\{.*\}", text, re.DOTALL)
-            if match:
-                json_str = match.group()
-            else:
-                json_str = text
+    def _generate(self, prompt, task: str, difficulty: Optional[str] = None, profile: Optional[str] = None,
+                  scale: int = 1, **kwargs):
+        # `profile` names the generation profile when it differs from the routing task; `scale` is
+        # the number of items in the request
+        profile = profile or task
+        kwargs["generation_config"] = self.profiles.generation_config(profile, kwargs.get("generation_config"), scale)
+        # A model_router.ModelRouter picks a backend per task; plain models never see the task
+        if getattr(self.model, "routes_tasks", False):
+            kwargs["task"] = task
+        # The router and rate limiter annotate this span with the backend, hedging and retries.
+        # For streams it only covers the call that opens the stream.
+        with span("network", task=task, stream=bool(kwargs.get("stream")),
+                  max_output_tokens=kwargs["generation_config"].get("max_output_tokens")):
+            start = time.perf_counter()
+            response = self.model.generate_content(prompt, **kwargs)
+            if not kwargs.get("stream"):
+                counts = response_token_counts(response, prompt)
+                annotate(**counts)
+                self.profiles.record(profile, difficulty, counts.get("response_tokens", 0),
+                                     time.perf_counter() - start, is_truncated(response), scale)
+            return response
 
-            try:
-                # Try loading with ast, which is permissive for Python dict syntax
-                import ast
-                json_dict = ast.literal_eval(json_str)
-                if hasattr(pydantic_model, 'model_validate'):
-                    return pydantic_model.model_validate(json_dict)
+    def _get_json_response(self, prompt_text: str, pydantic_model, task: str, difficulty: Optional[str] = None,
+                           **kwargs):
+        def generate(prompt, generation_config):
+            response = self._generate(prompt, task, difficulty, generation_config=generation_config, **kwargs)
+            return response.text
+
+        # Registry prompts already end their preamble with JSON_INSTRUCTION
+        return generate_structured(generate, prompt_text, pydantic_model, self.structured_stats,
+                                   native_json=supports_native_json(self.model_name))
+
+    def generate_coding_question(self, language: str, difficulty: str, topic_history: List[str] = [],
+                                 topic: Optional[str] = None) -> CodingQuestion:
+        task = task_name("coding_question", difficulty)
+        with span("generate_coding_question", task=task, model=self.model_name, language=language):
+            with span("prompt_build"):
+                formatted_prompt = coding_question_prompt(language, difficulty, topic_history, topic)
+            return self._get_json_response(formatted_prompt, CodingQuestion, task, difficulty)
+
+    def generate_mcq(self, language: str, difficulty: str, topic_history: List[str] = [],
+                     topic: Optional[str] = None) -> MCQQuestion:
+        task = task_name("mcq", difficulty)
+        with span("generate_mcq", task=task, model=self.model_name, language=language):
+            with span("prompt_build"):
+                formatted_prompt = mcq_prompt(language, difficulty, topic_history, topic)
+            return self._get_json_response(formatted_prompt, MCQQuestion, task, difficulty)
+
+    def _get_json_items(self, prompt_text: str, item_model, task: str, difficulty: Optional[str], profile: str,
+                        count: int) -> list:
+        def generate(prompt, generation_config):
+            return self._generate(prompt, task, difficulty, profile=profile, scale=count,
+                                  generation_config=generation_config).text
+
+        return generate_items(generate, prompt_text, item_model, "questions", self.structured_stats,
+                              native_json=supports_native_json(self.model_name))
+
+    def generate_coding_question_batch(self, language: str, difficulty: str, count: int,
+                                       topic_history: List[str] = [], topic: Optional[str] = None) -> List[CodingQuestion]:
+        # Up to `count` distinct questions from one request (one preamble, one round trip). Invalid
+        # or repeated entries are dropped, so callers must handle getting fewer than asked for.
+        task = task_name("coding_question", difficulty)
+        with span("generate_coding_question_batch", task=task, model=self.model_name, language=language,
+                  count=count) as current:
+            with span("prompt_build"):
+                formatted_prompt = coding_question_batch_prompt(language, difficulty, count, topic_history, topic)
+            questions = _distinct(self._get_json_items(formatted_prompt, CodingQuestion, task, difficulty,
+                                                       "coding_question_batch", count), topic_history)[:count]
+            current.set(returned=len(questions))
+            return questions
+
+    def generate_mcq_batch(self, language: str, difficulty: str, count: int, topic_history: List[str] = [],
+                           topic: Optional[str] = None) -> List[MCQQuestion]:
+        task = task_name("mcq", difficulty)
+        with span("generate_mcq_batch", task=task, model=self.model_name, language=language, count=count) as current:
+            with span("prompt_build"):
+                formatted_prompt = mcq_batch_prompt(language, difficulty, count, topic_history, topic)
+            items = self._get_json_items(formatted_prompt, MCQQuestion, task, difficulty, "mcq_batch", count)
+            # The schema can't say "exactly 4 options"; a question the quiz can't render is dropped here
+            questions = [q for q in items if len(q.options) == 4 and 0 <= q.correct_option_index < 4]
+            questions = _distinct(questions, topic_history)[:count]
+            current.set(returned=len(questions), rejected=len(items) - len(questions))
+            return questions
+
+    def _cached_evaluation(self, question, user_code: str, language: str):
+        # Returns (cache_key, cached Evaluation or None); cache_key is None when caching is off
+        if self.eval_cache is None:
+            return None, None
+        from eval_cache import evaluation_cache_key
+        cache_key = evaluation_cache_key(question, user_code, language, self.model_name, EVALUATION_PROMPT_VERSION)
+        cached = self.eval_cache.get(cache_key)
+        return cache_key, validate_model(Evaluation, cached) if cached is not None else None
+
+    def evaluate_code(self, question, user_code: str, language: str, difficulty: Optional[str] = None) -> Evaluation:
+        task = task_name("evaluation", difficulty)
+        with span("evaluate_code", task=task, model=self.model_name, language=language) as current:
+            prechecked = self.prechecker.check(question, user_code, language)
+            current.set(prechecked=prechecked is not None)
+            if prechecked is not None:
+                return prechecked
+            cache_key, cached = self._cached_evaluation(question, user_code, language)
+            current.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+            with span("prompt_build"):
+                formatted_prompt = evaluation_prompt(question, user_code, language)
+            evaluation = self._get_json_response(formatted_prompt, Evaluation, task, difficulty)
+            if cache_key is not None:
+                self.eval_cache.put(cache_key, dump_model(evaluation))
+            return evaluation
+
+    def evaluate_code_batch(self, question, submissions: Dict[str, str], language: str,
+                            difficulty: Optional[str] = None) -> Dict[str, Evaluation]:
+        # Grades several submissions in one request. Returns only the ids the model answered for;
+        # callers grade any missing ones individually.
+        task = task_name("evaluation", difficulty)
+        with span("evaluate_code_batch", task=task, model=self.model_name, language=language,
+                  submissions=len(submissions)) as current:
+            results, pending = {}, {}
+            prechecked = cache_hits = 0
+            for submission_id, user_code in submissions.items():
+                evaluation = self.prechecker.check(question, user_code, language)
+                if evaluation is not None:
+                    results[submission_id] = evaluation
+                    prechecked += 1
+                    continue
+                cache_key, cached = self._cached_evaluation(question, user_code, language)
+                if cached is not None:
+                    results[submission_id] = cached
+                    cache_hits += 1
                 else:
-                    return pydantic_model.parse_obj(json_dict)
+                    pending[submission_id] = (cache_key, user_code)
+            current.set(prechecked=prechecked, cache_hits=cache_hits)
+            if not pending:
+                return results
+
+            with span("prompt_build"):
+                formatted_prompt = batch_evaluation_prompt(question, {k: code for k, (_, code) in pending.items()}, language)
+            batch = self._get_json_response(formatted_prompt, BatchEvaluation, task, difficulty,
+                                            profile="batch_evaluation", scale=len(pending))
+            for item in batch.evaluations:
+                if item.id not in pending or item.id in results:
+                    continue
+                evaluation = validate_model(Evaluation, {k: v for k, v in dump_model(item).items() if k != "id"})
+                results[item.id] = evaluation
+                cache_key = pending[item.id][0]
+                if cache_key is not None:
+                    self.eval_cache.put(cache_key, dump_model(evaluation))
+            current.set(missing=len(submissions) - len(results))
+            return results
+
+    def evaluate_code_stream(self, question, user_code: str, language: str,
+                             difficulty: Optional[str] = None) -> "EvaluationStream":
+        return EvaluationStream(self, question, user_code, language, difficulty)
+
+    def summarize_history(self, lines: List[str]) -> str:
+        # Map/reduce step for HistoryDigest: condenses answer lines or lower-level summaries
+        with span("summarize_history", task="summary", model=self.model_name, lines=len(lines)):
+            with span("prompt_build"):
+                formatted_prompt = summary_prompt(lines)
+            response = self._generate(formatted_prompt, "summary")
+            return response.text.strip()
+
+    def generate_report(self, history) -> str:
+        # `history` is a rendered HistoryDigest (str) or a plain list of history entries
+        with span("generate_report", task="report", model=self.model_name) as current:
+            with span("prompt_build"):
+                formatted_prompt = report_prompt(history)
+
+            try:
+                response = self._generate(formatted_prompt, "report")
+                return response.text
             except Exception as e:
-                print(f"AST Parsing failed: {e}")
-                raise e
-                print(f"JSON Parsing Failed: {e}")
-                # Clean up potential "Expecting property name enclosed in double quotes" if keys are single quoted
-                try:
-                    import ast
-                    # fallback to ast.literal_eval if it's a valid python dict (single quotes)
-                    json_dict = ast.literal_eval(json_str)
-                    if hasattr(pydantic_model, 'model_validate'):
-                        return pydantic_model.model_validate(json_dict)
-                    else:
-                        return pydantic_model.parse_obj(json_dict)
-                except Exception as ast_e:
-                    print(f"AST Parsing failed: {ast_e}")
-                    raise e
-                    
-        except Exception as e:
-            print(f"Error parsing JSON: {e}")
-            if 'response' in locals():
-                print(f"Failed Text: {response.text}")
-            raise e
-
-    def generate_coding_question(self, language: str, difficulty: str, topic_history: List[str] = []) -> CodingQuestion:
-        # Pass the Class directly, not the parser
-        
-        history_context = ""
-        if topic_history:
-            history_context = f"Previously asked topics/questions: {', '.join(topic_history[-5:])}. DO NOT repeat these. Choose a different aspect of {language}."
+                 print(f"Error generating report: {e}")
+                 current.set(failed=f"{type(e).__name__}: {e}")
+                 return "Could not generate report due to an error."
 
-        template = """
-        You are an expert coding interviewer. Generate a {difficulty} coding problem in {language} (LeetCode style).
-        
-        {history_context}
-        
-        Ensure you cover a wide range of aspects of the language. If the history shows recent questions on one topic (e.g., Arrays), switch to another (e.g., Strings, Recursion, OOP, API usage).
-        
-        If the difficulty is "Hard", ensure it is a complex DSA problem.
-        
-        CRITICAL INSTRUCTION:
-        - The `starter_code` field MUST contain ONLY the function signature/boilerplate.
-        - DO NOT IMPLEMENT THE SOLUTION in `starter_code`. Use `pass` or return default value.
-        - Example starter code: `def solve(nums):\n    pass`
-
-        Response format example:
-        {{
-            "title": "Two Sum",
-            "description": "Given array... return indices...",
-            "examples": ["Input: nums = [2,7], target = 9\\nOutput: [0,1]"],
-            "constraints": ["2 <= nums.length <= 10^4"],
-            "starter_code": "def two_sum(nums, target):\\n    pass"
-        }}
-        """
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["language", "difficulty", "history_context"]
-        )
-        
-        formatted_prompt = prompt.format(language=language, difficulty=difficulty, history_context=history_context)
-        return self._get_json_response(formatted_prompt, CodingQuestion)
+    def stream_report(self, history) -> Iterator[str]:
+        # Same report as generate_report, yielded chunk by chunk (e.g. for st.write_stream)
+        with span("stream_report", task="report", model=self.model_name) as current:
+            with span("prompt_build"):
+                formatted_prompt = report_prompt(history)
+            try:
+                start = time.perf_counter()
+                response = LastChunk(self._generate(formatted_prompt, "report", stream=True))
+                chars = 0
+                for chunk in timed_chunks(response, self.stream_metrics, "generate_report", start):
+                    chars += len(chunk)
+                    yield chunk
+                current.set(response_chars=chars, response_tokens=chars // 4 + 1, tokens_estimated=True)
+                self.profiles.record("report", None, chars // 4 + 1, time.perf_counter() - start,
+                                     is_truncated(response.last))
+            except Exception as e:
+                print(f"Error generating report: {e}")
+                current.set(failed=f"{type(e).__name__}: {e}")
+                yield "Could not generate report due to an error."
 
-    def generate_mcq(self, language: str, difficulty: str, topic_history: List[str] = []) -> MCQQuestion:
-        # Pass Class directly
-        
-        history_context = ""
-        if topic_history:
-            history_context = f"Previously asked topics/questions: {', '.join(topic_history[-5:])}. DO NOT repeat these. Choose a different, unvisited aspect of {language}."
 
-        template = """
-        You are a computer science professor. Generate a {difficulty} multiple-choice question (MCQ) about {language}.
-        
-        {history_context}
-        
-        Ensure the questions become progressively diverse. Cover syntax, libraries, memory management, quirks, and best practices.
-        
-        - Provide exactly 4 options.
-        - Indicate the correct option index (0-3).
-        - Provide a clear explanation.
-
-        Response format example:
-        {{
-            "title": "Question text here...",
-            "options": ["Option A", "Option B", "Option C", "Option D"],
-            "correct_option_index": 2,
-            "explanation": "Explanation here..."
-        }}
-        """
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["language", "difficulty", "history_context"]
-        )
-        
-        formatted_prompt = prompt.format(language=language, difficulty=difficulty, history_context=history_context)
-        return self._get_json_response(formatted_prompt, MCQQuestion)
+class EvaluationStream:
+    # Iterating yields the `explanation` field as it streams in; once exhausted, `result` holds
+    # the full Evaluation (parsed from the complete response, or taken from the cache).
+    def __init__(self, manager: LLMManager, question, user_code: str, language: str,
+                 difficulty: Optional[str] = None):
+        self.manager = manager
+        self.question = question
+        self.user_code = user_code
+        self.language = language
+        self.difficulty = difficulty
+        self.task = task_name("evaluation", difficulty)
+        self.result: Optional[Evaluation] = None
 
-    def evaluate_code(self, question, user_code: str, language: str) -> Evaluation:
-        # Pass Class directly
-        
-        template = """
-        You are an expert Senior Engineer Mentor. Evaluate the user's solution to the following problem.
-        
-        Problem: {title}
-        Description: {description}
-        
-        User's Code ({language}):
-        ```
-        {user_code}
-        ```
-        
-        Analyze the code for correctness, efficiency, and style.
-        Explain WHY it is correct or incorrect.
-        Provide constructive feedback and tips.
-        
-        Response format example:
-        {{
-            "is_correct": true,
-            "explanation": "Your code correctly implements...",
-            "tips": ["Consider edge case X", "Use a more descriptive variable name"],
-            "rating": 9
-        }}
-        """
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["title", "description", "user_code", "language"]
-        )
-        
-        formatted_prompt = prompt.format(
-            title=question.title,
-            description=question.description if hasattr(question, 'description') else "MCQ",
-            user_code=user_code,
-            language=language
-        )
-        return self._get_json_response(formatted_prompt, Evaluation)
-
-    def generate_report(self, history: List[dict]) -> str:
-        template = """
-        You are a supportive coding coach. Generate a detailed progress report based on the user's history.
-        
-        History:
-        {history}
-        
-        Focus on:
-        1. Summary of performance (Correct vs Incorrect).
-        2. Detailed analysis of questions they got WRONG. Explain the core concept they missed.
-        3. Provide clear strategies and learning paths to improve on their weak areas.
-        4. Be encouraging but professional.
-        
-        Output the report in clear Markdown format.
-        """
-        
-        prompt = PromptTemplate(
-            template=template,
-            input_variables=["history"]
-        )
-        
-        formatted_prompt = prompt.format(history=str(history))
-        
-        try:
-            response = self.model.generate_content(formatted_prompt)
-            return response.text
-        except Exception as e:
-             print(f"Error generating report: {e}")
-             return "Could not generate report due to an error."
+    def __iter__(self) -> Iterator[str]:
+        manager = self.manager
+        with span("evaluate_code_stream", task=self.task, model=manager.model_name, language=self.language) as current:
+            yield from self._stream(manager, current)
+
+    def _stream(self, manager: LLMManager, current) -> Iterator[str]:
+        prechecked = manager.prechecker.check(self.question, self.user_code, self.language)
+        current.set(prechecked=prechecked is not None)
+        if prechecked is not None:
+            self.result = prechecked
+            yield prechecked.explanation
+            return
+        cache_key, cached = manager._cached_evaluation(self.question, self.user_code, self.language)
+        current.set(cache_hit=cached is not None)
+        if cached is not None:
+            self.result = cached
+            yield cached.explanation
+            return
+
+        with span("prompt_build"):
+            prompt_text = evaluation_prompt(self.question, self.user_code, self.language)
+        start = time.perf_counter()
+        response = LastChunk(manager._generate(prompt_text, self.task, self.difficulty, stream=True))
+        streamer = JSONFieldStreamer("explanation")
+        raw = []
+        for text in timed_chunks(response, manager.stream_metrics, "evaluate_code", start):
+            raw.append(text)
+            delta = streamer.feed(text)
+            if delta:
+                yield delta
+        streamed = "".join(raw)
+        current.set(prompt_tokens=len(prompt_text) // 4 + 1, response_tokens=len(streamed) // 4 + 1,
+                    tokens_estimated=True)
+        manager.profiles.record(self.task, self.difficulty, len(streamed) // 4 + 1, time.perf_counter() - start,
+                                is_truncated(response.last))
+
+        def generate(prompt, generation_config):
+            # The streamed text is the first attempt; only repair rounds make new (non-streamed) calls
+            nonlocal streamed
+            if streamed is not None:
+                text, streamed = streamed, None
+                return text
+            return manager._generate(prompt, self.task, self.difficulty, generation_config=generation_config).text
+
+        self.result = generate_structured(generate, prompt_text, Evaluation, manager.structured_stats)
+        if cache_key is not None:
+            manager.eval_cache.put(cache_key, dump_model(self.result))
+
+
+# Prompt builders shared by LLMManager and AsyncLLMManager
+
+def dump_model(obj) -> dict:
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    return obj.dict()
+
+def _distinct(questions: list, topic_history: List[str]) -> list:
+    # Drops repeated titles within a batch and titles already in the history
+    seen = {title.strip().lower() for title in topic_history}
+    result = []
+    for question in questions:
+        key = question.title.strip().lower()
+        if key not in seen:
+            seen.add(key)
+            result.append(question)
+    return result
+
+def _history_context(language: str, topic_history: List[str], topic: Optional[str], kind: str, aspect: str) -> str:
+    history_context = ""
+    if topic_history:
+        history_context = f"Previously asked topics/questions: {', '.join(topic_history[-5:])}. DO NOT repeat these. Choose a {aspect} aspect of {language}."
+    if topic:
+        history_context += f"\nThe {kind} MUST be about this topic: {topic}."
+    return history_context
+
+def coding_question_prompt(language: str, difficulty: str, topic_history: List[str] = [],
+                           topic: Optional[str] = None) -> str:
+    return get_prompt("coding_question").render(
+        language=language, difficulty=difficulty,
+        history_context=_history_context(language, topic_history, topic, "problem", "different"))
+
+def mcq_prompt(language: str, difficulty: str, topic_history: List[str] = [], topic: Optional[str] = None) -> str:
+    return get_prompt("mcq").render(
+        language=language, difficulty=difficulty,
+        history_context=_history_context(language, topic_history, topic, "question", "different, unvisited"))
+
+def coding_question_batch_prompt(language: str, difficulty: str, count: int, topic_history: List[str] = [],
+                                 topic: Optional[str] = None) -> str:
+    return get_prompt("coding_question_batch").render(
+        count=count, language=language, difficulty=difficulty,
+        history_context=_history_context(language, topic_history, topic, "problems", "different"))
+
+def mcq_batch_prompt(language: str, difficulty: str, count: int, topic_history: List[str] = [],
+                     topic: Optional[str] = None) -> str:
+    return get_prompt("mcq_batch").render(
+        count=count, language=language, difficulty=difficulty,
+        history_context=_history_context(language, topic_history, topic, "questions", "different, unvisited"))
+
+def evaluation_prompt(question, user_code: str, language: str) -> str:
+    return get_prompt("evaluation").render(
+        title=question.title,
+        description=question.description if hasattr(question, 'description') else "MCQ",
+        user_code=user_code,
+        language=language
+    )
+
+def batch_evaluation_prompt(question, submissions: Dict[str, str], language: str) -> str:
+    blocks = [f"### Submission {submission_id}\n```\n{user_code}\n```" for submission_id, user_code in submissions.items()]
+    return get_prompt("batch_evaluation").render(
+        title=question.title,
+        description=question.description if hasattr(question, 'description') else "MCQ",
+        language=language,
+        submissions="\n\n".join(blocks)
+    )
+
+def summary_prompt(lines: List[str]) -> str:
+    return get_prompt("summary").render(lines="\n".join(lines))
+
+def report_prompt(history) -> str:
+    if not isinstance(history, str):
+        # Plain entry lists are condensed too, so user code never reaches the prompt
+        history = HistoryDigest.from_entries(history).render()
+    return get_prompt("report").render(history=history)
@@ -0,0 +1,392 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional
+
+from rate_limiter import estimate_tokens, expected_output_tokens
+from telemetry import annotate
+
+# Routes each LLM call to one of several backends (GenerativeModel-like objects). Every task type
+# has an ordered list of acceptable backends; the first one that is healthy (circuit closed,
+# rolling p95 within the task's latency budget, error rate acceptable) wins. Non-streaming calls
+# are hedged: if the chosen backend has not answered within the task's hedge delay, the next
+# backend is fired too and whichever succeeds first is returned. Failed calls fall back to the
+# next backend. Works with fake_model.FakeGenerativeModel backends for tests and benchmarks.
+# The hedge delay is the task's recent p95 (so only the slowest ~5% of calls get a second
+# request), capped by its latency budget; `hedge_after` is used until there are enough samples.
+# A hedge spends a request of quota that an outer RateLimitedModel never sees, so with a
+# `limiter` the router only hedges when the limiter has that quota spare right now.
+
+# Gemma variants share the API key and quota; the small ones are much faster for short outputs
+DEFAULT_BACKENDS = ["gemma-3-27b-it", "gemma-3-12b-it", "gemma-3-4b-it"]
+
+DEFAULT_ROUTES = {
+    "coding_question": ["gemma-3-27b-it", "gemma-3-12b-it"],
+    "mcq": ["gemma-3-12b-it", "gemma-3-27b-it", "gemma-3-4b-it"],
+    "evaluation": ["gemma-3-27b-it", "gemma-3-12b-it"],
+    "evaluation:hard": ["gemma-3-27b-it", "gemma-3-12b-it"],
+    "report": ["gemma-3-12b-it", "gemma-3-27b-it"],
+    "summary": ["gemma-3-4b-it", "gemma-3-12b-it"],
+}
+
+# Seconds; p95 above this marks a backend as slow for the task
+DEFAULT_LATENCY_BUDGETS = {"mcq": 8.0, "summary": 8.0, "report": 30.0}
+DEFAULT_LATENCY_BUDGET = 20.0
+
+# Successful calls per task needed before its hedge delay follows the observed p95
+MIN_HEDGE_SAMPLES = 10
+# Seconds; a task that is always fast shouldn't hedge on every small hiccup
+MIN_HEDGE_DELAY = 0.25
+
+
+def task_name(kind: str, difficulty: Optional[str] = None) -> str:
+    # Hard (DSA) work gets its own route so it can be pinned to the largest model
+    return f"{kind}:hard" if difficulty and "Hard" in difficulty else kind
+
+
+class RouterUnavailable(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` consecutive failures; after `cooldown` seconds one
+    # trial call is let through (half-open) and its result closes or re-opens the circuit
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_inflight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.clock() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_inflight:
+            self._trial_inflight = True
+            return True
+        return False
+
+    def record(self, ok: bool):
+        self._trial_inflight = False
+        if ok:
+            self.state, self.failures = "closed", 0
+            return
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state, self.opened_at = "open", self.clock()
+
+
+class Backend:
+    # Latencies and outcomes expire after `stats_ttl` seconds, so a backend that was routed around
+    # for being slow or flaky gets tried again once its bad samples age out
+    def __init__(self, name: str, model, window: int = 100, failure_threshold: int = 3, cooldown: float = 30.0,
+                 stats_ttl: float = 300.0, clock=time.monotonic):
+        self.name = name
+        self.model = model
+        self.breaker = CircuitBreaker(failure_threshold, cooldown, clock)
+        self.stats_ttl = stats_ttl
+        self.clock = clock
+        self.latencies = deque(maxlen=window)  # (timestamp, seconds)
+        self.outcomes = deque(maxlen=window)   # (timestamp, ok)
+        self.calls = 0
+
+    def record(self, seconds: float, ok: bool):
+        now = self.clock()
+        self.outcomes.append((now, ok))
+        if ok:
+            self.latencies.append((now, seconds))
+        self.breaker.record(ok)
+
+    def _recent(self, samples) -> list:
+        cutoff = self.clock() - self.stats_ttl
+        return [value for t, value in samples if t >= cutoff]
+
+    def percentile(self, q: float) -> Optional[float]:
+        ordered = sorted(self._recent(self.latencies))
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        outcomes = self._recent(self.outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "calls": self.calls,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "error_rate": self.error_rate(),
+            "circuit": self.breaker.state,
+        }
+
+
+class ModelRouter:
+    # LLMManager passes task=... to routers (see `routes_tasks`); plain models never see it
+    routes_tasks = True
+
+    def __init__(self, backends: Dict[str, object], routes: Optional[Dict[str, List[str]]] = None,
+                 latency_budgets: Optional[Dict[str, float]] = None, hedge_after: Optional[float] = 6.0,
+                 max_error_rate: float = 0.5, failure_threshold: int = 3, cooldown: float = 30.0,
+                 max_workers: int = 8, limiter=None, window: int = 100):
+        if not backends:
+            raise ValueError("ModelRouter needs at least one backend")
+        self.backends = {name: Backend(name, model, failure_threshold=failure_threshold, cooldown=cooldown)
+                         for name, model in backends.items()}
+        self.routes = {task: [n for n in names if n in self.backends]
+                       for task, names in (routes or {}).items()}
+        self.latency_budgets = DEFAULT_LATENCY_BUDGETS if latency_budgets is None else latency_budgets
+        # None disables hedging
+        self.hedge_after = hedge_after
+        self.max_error_rate = max_error_rate
+        # rate_limiter.RateLimiter that hedged calls are charged to
+        self.limiter = limiter
+        self.window = window
+        self.model_name = next(iter(backends))
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        self.fallbacks = 0
+        self._task_latencies: Dict[str, deque] = {}  # task -> recent successful call seconds
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+
+    @classmethod
+    def from_names(cls, names: List[str], factory: Callable[[str], object], **kwargs) -> "ModelRouter":
+        routes = kwargs.pop("routes", DEFAULT_ROUTES)
+        return cls({name: factory(name) for name in names}, routes=routes, **kwargs)
+
+    # Selection
+
+    def candidates(self, task: Optional[str]) -> List[Backend]:
+        # Backends for the task in preference order, healthiest first. "evaluation:hard" falls
+        # back to the "evaluation" route, unknown tasks use every backend in registration order.
+        names = self.routes.get(task) or self.routes.get((task or "").split(":")[0]) or list(self.backends)
+        budget = self._budget(task)
+        with self._lock:
+            healthy, degraded = [], []
+            for name in names:
+                backend = self.backends[name]
+                p95 = backend.percentile(0.95)
+                if backend.error_rate() > self.max_error_rate or (p95 is not None and p95 > budget):
+                    degraded.append(backend)
+                else:
+                    healthy.append(backend)
+            # Slow or flaky backends are still usable, fastest median first
+            degraded.sort(key=lambda b: b.percentile(0.5) or 0.0)
+            return healthy + degraded
+
+    def _budget(self, task: Optional[str]) -> float:
+        return self.latency_budgets.get((task or "").split(":")[0], DEFAULT_LATENCY_BUDGET)
+
+    def hedge_delay(self, task: Optional[str]) -> Optional[float]:
+        # Seconds to wait on the first backend before hedging, or None to never hedge
+        if self.hedge_after is None:
+            return None
+        with self._lock:
+            samples = sorted(self._task_latencies.get(task or "", ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            delay = self.hedge_after
+        else:
+            delay = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        return min(max(delay, MIN_HEDGE_DELAY), self._budget(task))
+
+    def _may_hedge(self, prompt, kwargs) -> bool:
+        # Takes the hedge's quota from the limiter, as a background call so it never eats into the
+        # interactive reserve; no spare quota means no hedge
+        if self.limiter is None:
+            return True
+        if self.limiter.try_acquire(estimate_tokens(prompt) + expected_output_tokens(kwargs)):
+            return True
+        with self._lock:
+            self.hedges_skipped += 1
+        return False
+
+    def _hedge_backend(self, candidates: List[Backend], tried: List[Backend], prompt, kwargs) -> Optional[Backend]:
+        if len(tried) >= len(candidates) or not self._may_hedge(prompt, kwargs):
+            return None
+        return self._acquire(candidates, tried)
+
+    def _acquire(self, candidates: List[Backend], exclude=()) -> Optional[Backend]:
+        with self._lock:
+            for backend in candidates:
+                if backend not in exclude and backend.breaker.allow():
+                    backend.calls += 1
+                    return backend
+        return None
+
+    def _record(self, backend: Backend, seconds: float, ok: bool, task: Optional[str] = None):
+        with self._lock:
+            backend.record(seconds, ok)
+            if ok and task is not None:
+                self._task_latencies.setdefault(task, deque(maxlen=self.window)).append(seconds)
+
+    @staticmethod
+    def _backend_kwargs(backend: Backend, task: Optional[str], kwargs) -> dict:
+        # Backends that take a task themselves (e.g. fake_model) get it passed on
+        if task is not None and getattr(backend.model, "routes_tasks", False):
+            return dict(kwargs, task=task)
+        return kwargs
+
+    def _call(self, backend: Backend, task: Optional[str], prompt, kwargs):
+        start = time.perf_counter()
+        try:
+            response = backend.model.generate_content(prompt, **self._backend_kwargs(backend, task, kwargs))
+        except Exception:
+            self._record(backend, time.perf_counter() - start, False)
+            raise
+        self._record(backend, time.perf_counter() - start, True, task)
+        return response
+
+    # GenerativeModel interface
+
+    def generate_content(self, prompt, stream: bool = False, task: Optional[str] = None, **kwargs):
+        candidates = self.candidates(task)
+        if stream:
+            return self._generate_stream(candidates, task, prompt, kwargs)
+
+        tried, errors, hedged = [], [], set()
+        pending = {}
+        hedge_delay = self.hedge_delay(task)
+        while True:
+            if not pending:
+                backend = self._acquire(candidates, tried)
+                if backend is None:
+                    break
+                if tried:
+                    with self._lock:
+                        self.fallbacks += 1
+                tried.append(backend)
+                pending[self._executor.submit(self._call, backend, task, prompt, kwargs)] = backend
+
+            hedge_timeout = hedge_delay if len(pending) == 1 else None
+            done, _ = wait(list(pending), timeout=hedge_timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # The call is slower than this task's p95: fire the next backend alongside it
+                backend = self._hedge_backend(candidates, tried, prompt, kwargs)
+                if backend is not None:
+                    with self._lock:
+                        self.hedges += 1
+                    tried.append(backend)
+                    hedged.add(backend)
+                    pending[self._executor.submit(self._call, backend, task, prompt, kwargs)] = backend
+                    continue
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+                    continue
+                if backend in hedged:
+                    with self._lock:
+                        self.hedge_wins += 1
+                # Path taken, recorded on the caller's telemetry span (e.g. "27b -> 12b")
+                annotate(backend=backend.name, route=" -> ".join(b.name for b in tried),
+                         hedged=bool(hedged), hedge_won=backend in hedged)
+                # A losing call keeps running in the pool; its latency still feeds the stats
+                return response
+        raise RouterUnavailable("All backends failed or are open: " + "; ".join(errors or ["no backend available"]))
+
+    def _generate_stream(self, candidates: List[Backend], task: Optional[str], prompt, kwargs) -> Iterator:
+        # Streams are not hedged (chunks are consumed as they arrive); a backend that fails before
+        # its first chunk falls back to the next one
+        errors, tried = [], []
+        while True:
+            backend = self._acquire(candidates, tried)
+            if backend is None:
+                raise RouterUnavailable("All backends failed or are open: " + "; ".join(errors or ["no backend available"]))
+            tried.append(backend)
+            start = time.perf_counter()
+            try:
+                chunks = iter(backend.model.generate_content(prompt, stream=True, **self._backend_kwargs(backend, task, kwargs)))
+                first = next(chunks, None)
+            except Exception as e:
+                self._record(backend, time.perf_counter() - start, False)
+                errors.append(f"{backend.name}: {e}")
+                with self._lock:
+                    self.fallbacks += 1
+                continue
+            annotate(backend=backend.name, route=" -> ".join(b.name for b in tried), hedged=False)
+            return self._relay(backend, start, first, chunks)
+
+    def _relay(self, backend: Backend, start: float, first, chunks) -> Iterator:
+        ok = False
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+            ok = True
+        finally:
+            self._record(backend, time.perf_counter() - start, ok)
+
+    async def generate_content_async(self, prompt, task: Optional[str] = None, **kwargs):
+        # Same routing, fallback and hedging on the event loop
+        candidates = self.candidates(task)
+        tried, errors, pending = [], [], {}
+
+        async def call(backend):
+            start = time.perf_counter()
+            backend_kwargs = self._backend_kwargs(backend, task, kwargs)
+            try:
+                if hasattr(backend.model, "generate_content_async"):
+                    response = await backend.model.generate_content_async(prompt, **backend_kwargs)
+                else:
+                    response = await asyncio.to_thread(backend.model.generate_content, prompt, **backend_kwargs)
+            except Exception:
+                self._record(backend, time.perf_counter() - start, False)
+                raise
+            self._record(backend, time.perf_counter() - start, True, task)
+            return response
+
+        hedge_delay = self.hedge_delay(task)
+        while True:
+            if not pending:
+                backend = self._acquire(candidates, tried)
+                if backend is None:
+                    break
+                if tried:
+                    with self._lock:
+                        self.fallbacks += 1
+                tried.append(backend)
+                pending[asyncio.ensure_future(call(backend))] = backend
+            timeout = hedge_delay if len(pending) == 1 else None
+            done, _ = await asyncio.wait(list(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                backend = self._hedge_backend(candidates, tried, prompt, kwargs)
+                if backend is not None:
+                    with self._lock:
+                        self.hedges += 1
+                    tried.append(backend)
+                    pending[asyncio.ensure_future(call(backend))] = backend
+                    continue
+                done, _ = await asyncio.wait(list(pending), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    errors.append(f"{backend.name}: {e}")
+        raise RouterUnavailable("All backends failed or are open: " + "; ".join(errors or ["no backend available"]))
+
+    def count_tokens(self, prompt):
+        # Health checks go to the primary backend
+        model = self.backends[self.model_name].model
+        return model.count_tokens(prompt) if hasattr(model, "count_tokens") else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backends": {name: backend.summary() for name, backend in self.backends.items()},
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedges_skipped": self.hedges_skipped,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import List, Optional
+
+from telemetry import span
+
+# Markdown -> PDF for the progress report.
+# The Markdown is parsed once into a flat list of blocks (headings, paragraphs, lists, code, tables)
+# and drawn block by block, instead of restyling and re-sanitizing per line.
+# Rendered files are cached on disk by content hash, so downloading the same report twice is free.
+
+# Bump when the layout changes so cached PDFs from the old renderer are not served
+RENDERER_VERSION = "1"
+
+HEADING_SIZES = {1: 16, 2: 14, 3: 12}
+BODY_SIZE = 11
+CODE_SIZE = 9
+LINE_HEIGHT = 6
+MAX_WORD = 45
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET = re.compile(r"^(\s*)[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^(\s*)(\d+)[.)]\s+(.*)$")
+_TABLE_RULE = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+_RULE = re.compile(r"^(\*{3,}|-{3,}|_{3,})$")
+_LONG_WORD = re.compile(r"\S{%d,}" % (MAX_WORD + 1))
+
+# Core PDF fonts are latin-1 only; common typographic characters get ASCII stand-ins first
+_PUNCTUATION = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "—": "-",
+                              "–": "-", "…": "...", "•": "-", " ": " "})
+
+
+class Block:
+    # kind: heading (level, text), paragraph (text), bullets/numbered (items), code (text), table (rows), rule
+    def __init__(self, kind: str, text: str = "", level: int = 0, items: Optional[List[str]] = None,
+                 rows: Optional[List[List[str]]] = None):
+        self.kind = kind
+        self.text = text
+        self.level = level
+        self.items = items or []
+        self.rows = rows or []
+
+    def __repr__(self):
+        return f"Block({self.kind!r}, {self.text or self.items or self.rows!r})"
+
+
+def sanitize(text: str) -> str:
+    text = text.translate(_PUNCTUATION).encode("latin-1", "replace").decode("latin-1")
+    # Very long tokens (URLs, hashes) cannot be wrapped by fpdf; split them
+    return _LONG_WORD.sub(lambda m: " ".join(m.group(0)[i:i + MAX_WORD] for i in range(0, len(m.group(0)), MAX_WORD)), text)
+
+
+def _table_cells(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_markdown(markdown_text: str) -> List[Block]:
+    # Single pass over the lines; consecutive lines of the same kind are merged into one block
+    blocks: List[Block] = []
+    lines = sanitize(markdown_text).split("\n")
+    paragraph: List[str] = []
+
+    def end_paragraph():
+        if paragraph:
+            blocks.append(Block("paragraph", " ".join(paragraph)))
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i].rstrip()
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            end_paragraph()
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith("```"):
+                code.append(lines[i].rstrip())
+                i += 1
+            blocks.append(Block("code", "\n".join(code)))
+        elif not stripped:
+            end_paragraph()
+        elif _HEADING.match(stripped):
+            end_paragraph()
+            marks, text = _HEADING.match(stripped).groups()
+            blocks.append(Block("heading", text.strip("# "), level=min(len(marks), 3)))
+        elif _RULE.match(stripped):
+            end_paragraph()
+            blocks.append(Block("rule"))
+        elif stripped.startswith("|") and i + 1 < len(lines) and _TABLE_RULE.match(lines[i + 1].strip()):
+            end_paragraph()
+            rows = [_table_cells(stripped)]
+            i += 2
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                rows.append(_table_cells(lines[i]))
+                i += 1
+            blocks.append(Block("table", rows=rows))
+            continue
+        elif _BULLET.match(line) or _NUMBERED.match(line):
+            end_paragraph()
+            kind = "bullets" if _BULLET.match(line) else "numbered"
+            if not blocks or blocks[-1].kind != kind:
+                blocks.append(Block(kind))
+            text = _BULLET.match(line).group(2) if kind == "bullets" else _NUMBERED.match(line).group(3)
+            blocks[-1].items.append(text)
+        elif blocks and blocks[-1].kind in ("bullets", "numbered") and not paragraph and line.startswith(" "):
+            # Wrapped continuation of the previous list item
+            blocks[-1].items[-1] += " " + stripped
+        else:
+            paragraph.append(stripped)
+        i += 1
+    end_paragraph()
+    return blocks
+
+
+def _inline(text: str) -> str:
+    # fpdf's markdown mode handles **bold** and __underline__; inline code just loses its backticks
+    return text.replace("`", "")
+
+
+def _wrap(pdf, text: str, width: float) -> List[str]:
+    # Greedy word wrap in one pass over the words. fpdf's own multi_cell re-measures the whole
+    # line for every character added, which dominated rendering time for long paragraphs.
+    space = pdf.get_string_width(" ")
+    lines, current, current_width = [], [], 0.0
+    for word in text.split():
+        word_width = pdf.get_string_width(word)
+        if current and current_width + space + word_width > width:
+            lines.append(" ".join(current))
+            current, current_width = [], 0.0
+        current_width += word_width + (space if current else 0.0)
+        current.append(word)
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def _text(pdf, text: str, line_height: float = LINE_HEIGHT):
+    # Plain text goes through _wrap and one cell per line; inline bold needs fpdf's markdown mode
+    text = _inline(text)
+    if "**" in text or "__" in text:
+        pdf.multi_cell(0, line_height, text, markdown=True, new_x="LMARGIN", new_y="NEXT")
+        return
+    left = pdf.get_x()
+    for line in _wrap(pdf, text, pdf.w - pdf.r_margin - left):
+        pdf.set_x(left)
+        pdf.cell(0, line_height, line, new_x="LMARGIN", new_y="NEXT")
+
+
+def render_pdf(blocks: List[Block], output):
+    # `output` is a path or a binary file object
+    from fpdf import FPDF  # only loaded once a report is actually exported
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_margins(10, 10, 10)
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.set_font("Helvetica", size=BODY_SIZE)
+
+    for block in blocks:
+        if block.kind == "heading":
+            pdf.ln(2)
+            pdf.set_font("Helvetica", "B", HEADING_SIZES[block.level])
+            _text(pdf, block.text.replace("**", ""), LINE_HEIGHT + 2)
+            pdf.set_font("Helvetica", size=BODY_SIZE)
+        elif block.kind == "paragraph":
+            _text(pdf, block.text)
+            pdf.ln(2)
+        elif block.kind in ("bullets", "numbered"):
+            for number, item in enumerate(block.items, 1):
+                marker = "-" if block.kind == "bullets" else f"{number}."
+                pdf.set_x(pdf.l_margin + 4)
+                pdf.cell(6, LINE_HEIGHT, marker)
+                _text(pdf, item)
+            pdf.ln(2)
+        elif block.kind == "code":
+            pdf.set_font("Courier", size=CODE_SIZE)
+            pdf.set_fill_color(240, 240, 240)
+            pdf.multi_cell(0, LINE_HEIGHT - 1, block.text or " ", fill=True, new_x="LMARGIN", new_y="NEXT")
+            pdf.set_font("Helvetica", size=BODY_SIZE)
+            pdf.ln(2)
+        elif block.kind == "table":
+            width = max(len(row) for row in block.rows)
+            with pdf.table(markdown=True, line_height=LINE_HEIGHT) as table:
+                for row in block.rows:
+                    cells = table.row()
+                    for cell in row + [""] * (width - len(row)):
+                        cells.cell(_inline(cell))
+            pdf.ln(2)
+        elif block.kind == "rule":
+            y = pdf.get_y() + 2
+            pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+            pdf.ln(5)
+    pdf.output(output)
+
+
+def report_hash(markdown_text: str) -> str:
+    return hashlib.sha256(f"{RENDERER_VERSION}\0{markdown_text}".encode()).hexdigest()
+
+
+class PDFReportCache:
+    # Rendered reports on disk, keyed by report_hash; oldest files are dropped beyond `max_files`
+    def __init__(self, directory: str, max_files: int = 200):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, markdown_text: str) -> str:
+        return os.path.join(self.directory, report_hash(markdown_text) + ".pdf")
+
+    def get_or_render(self, markdown_text: str) -> str:
+        # Returns the path of the rendered PDF, rendering it only on a cache miss
+        path = self.path_for(markdown_text)
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            return path
+        with span("render_pdf", markdown_chars=len(markdown_text)):
+            blocks = parse_markdown(markdown_text)
+            # Render to a temp file and rename, so a concurrent reader never sees a half-written PDF
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    render_pdf(blocks, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        with self._lock:
+            self.misses += 1
+        self._evict()
+        return path
+
+    def _evict(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".pdf")]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> PDFReportCache:
+    global _report_cache
+    with _report_cache_lock:
+        if _report_cache is None:
+            _report_cache = PDFReportCache(os.environ.get("COGNITIO_REPORT_DIR", ".cognitio/reports"))
+        return _report_cache
@@ -0,0 +1,293 @@
+import ast
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from llm_manager import Evaluation
+from sandbox import _python_starter_entry_point
+from telemetry import annotate, span
+
+# Cheap local checks run before a submission is sent for an LLM evaluation. Submissions that are
+# empty, identical to the starter code, don't parse, don't define the function the question asks
+# for, or leave that function as a stub get an instant Evaluation and never reach the model.
+#   evaluation = get_prechecker().check(question, user_code, language)   # None -> needs a real review
+# Checkers are per language and pluggable (Prechecker.register); the JavaScript and Java checkers
+# only run when node / javac are on PATH.
+
+EMPTY = "empty"
+UNCHANGED = "unchanged_starter"
+SYNTAX = "syntax_error"
+MISSING_SIGNATURE = "missing_signature"
+STUB = "not_implemented"
+
+
+class SyntaxChecker:
+    # Base checker: text comparison only. Subclasses add a parser and know how functions look.
+    def canonical(self, code: str) -> str:
+        # Form used to compare a submission with the starter code
+        return "\n".join(line.strip() for line in code.strip().splitlines() if line.strip())
+
+    def syntax_error(self, code: str) -> Optional[str]:
+        # A short description of the first syntax error, or None (parses, or can't tell)
+        return None
+
+    def entry_point(self, starter_code: str) -> Optional[str]:
+        return None
+
+    def defines(self, code: str, name: str) -> bool:
+        # A call-like `name(`, or an assignment / object property (`name = (a) => ...`, `name: function`)
+        return re.search(rf"\b{re.escape(name)}\s*(?:\(|=(?!=)|:)", code) is not None
+
+    def is_stub(self, code: str, name: str) -> bool:
+        return False
+
+
+class PythonChecker(SyntaxChecker):
+    def canonical(self, code: str) -> str:
+        # The AST ignores comments and formatting, so a re-indented starter still counts as unchanged
+        try:
+            return ast.dump(ast.parse(code))
+        except SyntaxError:
+            return super().canonical(code)
+
+    def syntax_error(self, code: str) -> Optional[str]:
+        try:
+            ast.parse(code)
+        except SyntaxError as e:
+            return f"line {e.lineno}: {e.msg}"
+        return None
+
+    def entry_point(self, starter_code: str) -> Optional[str]:
+        return _python_starter_entry_point(starter_code)
+
+    def _function(self, code: str, name: str):
+        for node in ast.walk(ast.parse(code)):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+                return node
+        return None
+
+    def defines(self, code: str, name: str) -> bool:
+        return self._function(code, name) is not None
+
+    def is_stub(self, code: str, name: str) -> bool:
+        # Body is only pass / ... / a docstring / raise NotImplementedError
+        for statement in self._function(code, name).body:
+            if isinstance(statement, ast.Pass):
+                continue
+            if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant):
+                continue
+            if isinstance(statement, ast.Raise) and "NotImplementedError" in ast.dump(statement):
+                continue
+            return False
+        return True
+
+
+_C_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+
+
+class _BraceChecker(SyntaxChecker):
+    # Shared by the C-like languages: comments dropped, whitespace collapsed, `name(...) {}` is a stub
+    timeout_seconds = 10.0
+
+    def canonical(self, code: str) -> str:
+        return " ".join(_C_COMMENTS.sub(" ", code).split())
+
+    def is_stub(self, code: str, name: str) -> bool:
+        return re.search(rf"\b{re.escape(name)}\s*\([^)]*\)\s*(?:throws\s+[\w.,\s]+)?\{{\s*\}}",
+                         self.canonical(code)) is not None
+
+    def _run(self, command, workdir: str) -> Optional[subprocess.CompletedProcess]:
+        try:
+            return subprocess.run(command, capture_output=True, text=True, cwd=workdir,
+                                  timeout=self.timeout_seconds)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"Pre-check skipped, {command[0]} failed: {e}")
+            return None
+
+
+_JS_ENTRY = re.compile(r"\bfunction\s+([A-Za-z_$][\w$]*)\s*\(|\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function\b|\()")
+
+
+class NodeChecker(_BraceChecker):
+    # `node --check` parses without running anything
+    def __init__(self, node_path: str):
+        self.node_path = node_path
+
+    def syntax_error(self, code: str) -> Optional[str]:
+        with tempfile.TemporaryDirectory(prefix="cognitio-precheck-") as workdir:
+            with open(os.path.join(workdir, "solution.js"), "w") as f:
+                f.write(code)
+            proc = self._run([self.node_path, "--check", "solution.js"], workdir)
+        if proc is None or proc.returncode == 0:
+            return None
+        # stderr: "<path>/solution.js:3", the offending line, a caret line, then "SyntaxError: ..."
+        location = re.search(r"solution\.js:(\d+)", proc.stderr)
+        error = re.search(r"^\w*Error: .*$", proc.stderr, re.M)
+        message = error.group(0) if error else "SyntaxError"
+        return f"line {location.group(1)}: {message}" if location else message
+
+    def entry_point(self, starter_code: str) -> Optional[str]:
+        match = _JS_ENTRY.search(starter_code)
+        return (match.group(1) or match.group(2)) if match else None
+
+
+# javac also reports type errors (e.g. a missing import) that a reviewer would let slide; only
+# parser errors count as syntax errors here
+_JAVAC_ERROR = re.compile(r"\.java:(\d+): error: (.*)")
+_JAVA_PARSE_ERRORS = re.compile(r"expected|illegal start of|reached end of file while parsing|unclosed|"
+                                r"not a statement|orphaned|else without if|malformed", re.I)
+_JAVA_METHOD = re.compile(r"\b(?:public|private|protected|static)\s+(?:static\s+|final\s+)*[\w<>\[\],\s]+?\s+(\w+)\s*\(")
+_JAVA_CLASS = re.compile(r"\bpublic\s+(?:final\s+|abstract\s+)*class\s+(\w+)")
+
+
+class JavacChecker(_BraceChecker):
+    def __init__(self, javac_path: str):
+        self.javac_path = javac_path
+
+    def syntax_error(self, code: str) -> Optional[str]:
+        # The file must be named after its public class
+        match = _JAVA_CLASS.search(code)
+        name = (match.group(1) if match else "Solution") + ".java"
+        with tempfile.TemporaryDirectory(prefix="cognitio-precheck-") as workdir:
+            with open(os.path.join(workdir, name), "w") as f:
+                f.write(code)
+            proc = self._run([self.javac_path, "-proc:none", "-nowarn", "-d", workdir, name], workdir)
+        if proc is None or proc.returncode == 0:
+            return None
+        for line_number, message in _JAVAC_ERROR.findall(proc.stderr):
+            if _JAVA_PARSE_ERRORS.search(message):
+                return f"line {line_number}: {message}"
+        return None
+
+    def entry_point(self, starter_code: str) -> Optional[str]:
+        names = [name for name in _JAVA_METHOD.findall(starter_code) if name != "main"]
+        return names[0] if names else None
+
+
+def default_checkers() -> Dict[str, SyntaxChecker]:
+    checkers: Dict[str, SyntaxChecker] = {"python": PythonChecker()}
+    node_path = shutil.which("node")
+    if node_path:
+        checkers["javascript"] = NodeChecker(node_path)
+    javac_path = shutil.which("javac")
+    if javac_path:
+        checkers["java"] = checkers["java (bluej)"] = JavacChecker(javac_path)
+    return checkers
+
+
+class PrecheckStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.hits: Dict[str, int] = {}
+        # Repeat submissions answered from the memo (same broken code submitted again)
+        self.repeat_hits = 0
+        self.total_check_seconds = 0.0
+
+    def record(self, reason: Optional[str], seconds: float):
+        with self._lock:
+            self.checks += 1
+            self.total_check_seconds += seconds
+            if reason is not None:
+                self.hits[reason] = self.hits.get(reason, 0) + 1
+
+    def record_repeat(self):
+        with self._lock:
+            self.repeat_hits += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            hits = sum(self.hits.values())
+            return {
+                "checks": self.checks,
+                "hits": dict(self.hits),
+                "hit_rate": hits / self.checks if self.checks else 0.0,
+                "saved_calls": hits + self.repeat_hits,
+                "avg_check_ms": self.total_check_seconds / self.checks * 1000 if self.checks else 0.0,
+            }
+
+
+class Prechecker:
+    def __init__(self, checkers: Optional[Dict[str, SyntaxChecker]] = None, memo_size: int = 256):
+        self.checkers = checkers if checkers is not None else default_checkers()
+        self.stats = PrecheckStats()
+        self.memo_size = memo_size
+        # The app checks before the sandbox and evaluate_code checks again on a miss; the memo
+        # keeps that (and resubmissions) from re-running node/javac
+        self._memo: "OrderedDict[str, Optional[Tuple[str, str, str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, language: str, checker: SyntaxChecker):
+        self.checkers[language.lower()] = checker
+
+    def check(self, question, user_code: str, language: str) -> Optional[Evaluation]:
+        # Returns an Evaluation when the submission can be judged without a model, otherwise None
+        starter_code = getattr(question, "starter_code", "") or ""
+        key = hashlib.sha256(f"{language.lower()}\0{starter_code}\0{user_code}".encode()).hexdigest()
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                verdict = self._memo[key]
+                if verdict is not None:
+                    self.stats.record_repeat()
+                return _evaluation(verdict)
+
+        with span("precheck", language=language):
+            start = time.perf_counter()
+            verdict = self._verdict(starter_code, user_code, language)
+            self.stats.record(verdict[0] if verdict else None, time.perf_counter() - start)
+            annotate(reason=verdict[0] if verdict else None)
+        with self._lock:
+            self._memo[key] = verdict
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return _evaluation(verdict)
+
+    def _verdict(self, starter_code: str, user_code: str, language: str) -> Optional[Tuple[str, str, str, int]]:
+        # (reason, explanation, tip, rating) or None
+        if not user_code.strip():
+            return (EMPTY, "No code was submitted.", "Write your solution in the editor, then submit.", 1)
+        checker = self.checkers.get(language.lower(), SyntaxChecker())
+        if starter_code.strip() and checker.canonical(user_code) == checker.canonical(starter_code):
+            return (UNCHANGED, "This is the starter code, unchanged - there is no solution to review yet.",
+                    "Implement the function body, then submit.", 1)
+        error = checker.syntax_error(user_code)
+        if error is not None:
+            return (SYNTAX, f"Your code does not compile ({error}), so it cannot be run or reviewed.",
+                    "Fix the syntax error above and resubmit.", 1)
+        entry = checker.entry_point(starter_code) if starter_code else None
+        if entry is None:
+            return None
+        if not checker.defines(user_code, entry):
+            return (MISSING_SIGNATURE, f"Your code does not define `{entry}`, the function the question asks for.",
+                    f"Keep the signature from the starter code and implement `{entry}`.", 1)
+        if checker.is_stub(user_code, entry):
+            return (STUB, f"`{entry}` has no implementation yet.", f"Implement the body of `{entry}`, then submit.", 1)
+        return None
+
+
+def _evaluation(verdict: Optional[Tuple[str, str, str, int]]) -> Optional[Evaluation]:
+    # A fresh object per call: callers may attach results (e.g. a complexity profile) to it
+    if verdict is None:
+        return None
+    _, explanation, tip, rating = verdict
+    return Evaluation(is_correct=False, explanation=explanation, tips=[tip], rating=rating)
+
+
+_prechecker = None
+_prechecker_lock = threading.Lock()
+
+
+def get_prechecker() -> Prechecker:
+    global _prechecker
+    with _prechecker_lock:
+        if _prechecker is None:
+            _prechecker = Prechecker()
+        return _prechecker
@@ -0,0 +1,257 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from rate_limiter import background_priority
+
+# A queue is keyed by what the sidebar selects: (language, difficulty, practice_mode)
+PrefetchKey = Tuple[str, str, str]
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+def get_shared_executor(max_workers: int = 4) -> ThreadPoolExecutor:
+    # One worker pool per process, shared by every session's prefetcher
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        return _shared_executor
+
+
+class PrefetchStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.discarded = 0
+        self.total_refill_seconds = 0.0
+        self.last_refill_seconds = 0.0
+
+    def record_refill(self, seconds: float):
+        self.refills += 1
+        self.total_refill_seconds += seconds
+        self.last_refill_seconds = seconds
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "discarded": self.discarded,
+            "avg_refill_seconds": self.total_refill_seconds / self.refills if self.refills else 0.0,
+            "last_refill_seconds": self.last_refill_seconds,
+        }
+
+
+class QuestionPrefetcher:
+    # generate_fn(language, difficulty, practice_mode, topic_history) -> question
+    # on_serve(key, question) runs when a question is handed to the user (get, or mark_served after a
+    # miss); on_discard(key, question) when a generated question is dropped without being shown
+    # (cancelled, stale or surplus), so whatever generation reserved for it can be given back.
+    def __init__(self, generate_fn: Callable[[str, str, str, List[str]], object],
+                 max_depth: int = 3, low_watermark: int = 1,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 on_serve: Optional[Callable[[PrefetchKey, object], None]] = None,
+                 on_discard: Optional[Callable[[PrefetchKey, object], None]] = None):
+        if low_watermark > max_depth:
+            raise ValueError("low_watermark must not exceed max_depth")
+        self.generate_fn = generate_fn
+        self.max_depth = max_depth
+        self.low_watermark = low_watermark
+        self.executor = executor or get_shared_executor()
+        self.on_serve = on_serve
+        self.on_discard = on_discard
+        self.stats = PrefetchStats()
+
+        self._lock = threading.Lock()
+        self._queues: Dict[PrefetchKey, Deque] = {}
+        self._inflight: Dict[PrefetchKey, list] = {}
+        # Bumped on cancel so results from stale workers are dropped
+        self._epochs: Dict[PrefetchKey, int] = {}
+        # Titles already handed out, so a queued copy is never served twice
+        self._served: Dict[PrefetchKey, set] = {}
+        self.active_key: Optional[PrefetchKey] = None
+
+    def set_active(self, key: PrefetchKey, topic_history: List[str] = []):
+        # Called on every rerun; switching mode/language/difficulty cancels the old queue
+        with self._lock:
+            previous = self.active_key
+            self.active_key = key
+        if previous is not None and previous != key:
+            self.cancel(previous)
+        self._maybe_refill(key, topic_history)
+
+    def get(self, key: PrefetchKey, topic_history: List[str] = []):
+        question = None
+        with self._lock:
+            queue = self._queues.get(key)
+            seen = set(topic_history) | self._served.setdefault(key, set())
+            while queue:
+                candidate = queue.popleft()
+                if candidate.title in seen:
+                    self.stats.discarded += 1
+                    continue
+                question = candidate
+                break
+            if question is not None:
+                self.stats.hits += 1
+                self._served[key].add(question.title)
+            else:
+                self.stats.misses += 1
+        if question is not None:
+            self._notify(self.on_serve, key, question)
+        self._maybe_refill(key, topic_history)
+        return question
+
+    def mark_served(self, key: PrefetchKey, question):
+        # Questions generated synchronously on a miss must also block queued duplicates
+        with self._lock:
+            self._served.setdefault(key, set()).add(question.title)
+        self._notify(self.on_serve, key, question)
+
+    def depth(self, key: PrefetchKey) -> int:
+        with self._lock:
+            return len(self._queues.get(key, ()))
+
+    def cancel(self, key: Optional[PrefetchKey] = None):
+        dropped = []
+        with self._lock:
+            keys = [key] if key is not None else list(self._queues.keys() | self._inflight.keys())
+            for k in keys:
+                self._epochs[k] = self._epochs.get(k, 0) + 1
+                queue = self._queues.pop(k, ())
+                self.stats.discarded += len(queue)
+                dropped.extend((k, question) for question in queue)
+                for future in self._inflight.pop(k, []):
+                    future.cancel()
+        for k, question in dropped:
+            self._notify(self.on_discard, k, question)
+
+    def _notify(self, hook, key: PrefetchKey, question):
+        # Bookkeeping hooks must never cost the user their question
+        if hook is None:
+            return
+        try:
+            hook(key, question)
+        except Exception as e:
+            print(f"Prefetch hook failed for {key}: {e}")
+
+    def _maybe_refill(self, key: PrefetchKey, topic_history: List[str]):
+        with self._lock:
+            if key != self.active_key:
+                return
+            queue = self._queues.setdefault(key, deque())
+            inflight = [f for f in self._inflight.get(key, []) if not f.done()]
+            self._inflight[key] = inflight
+            # Top up to max_depth only once the queue (plus pending work) drops to the low watermark
+            available = len(queue) + len(inflight)
+            if available > self.low_watermark:
+                return
+            epoch = self._epochs.get(key, 0)
+            # Workers see everything already used or queued so they pick new topics
+            avoid = list(topic_history) + sorted(self._served.get(key, ())) + [q.title for q in queue]
+            for _ in range(self.max_depth - available):
+                future = self.executor.submit(self._refill_one, key, epoch, avoid)
+                inflight.append(future)
+
+    def _refill_one(self, key: PrefetchKey, epoch: int, topic_history: List[str]):
+        language, difficulty, practice_mode = key
+        start = time.perf_counter()
+        try:
+            # Queued behind interactive calls on the shared API key
+            with background_priority():
+                question = self.generate_fn(language, difficulty, practice_mode, topic_history)
+        except Exception as e:
+            with self._lock:
+                self.stats.refill_failures += 1
+            print(f"Prefetch failed for {key}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.stats.record_refill(elapsed)
+            queue = self._queues.get(key, ())
+            titles = {q.title for q in queue} | self._served.get(key, set()) | set(topic_history)
+            if question.title in titles:
+                # A copy of a question that is queued or was served: nothing of its own to give back
+                self.stats.discarded += 1
+                return
+            stale = self._epochs.get(key, 0) != epoch or key != self.active_key
+            if not stale and len(queue) < self.max_depth:
+                self._queues.setdefault(key, deque()).append(question)
+                return
+            self.stats.discarded += 1
+        self._notify(self.on_discard, key, question)
+
+
+class QuestionBatcher:
+    # Hands out single questions from multi-question generations, so one model call feeds several
+    # questions. generate_batch_fn(language, difficulty, practice_mode, topic_history, count) -> list.
+    # Callers for the same key wait for an in-flight batch instead of starting their own, so the
+    # prefetcher's parallel refills share one request.
+    def __init__(self, generate_batch_fn: Callable[[str, str, str, List[str], int], list], batch_size: int = 5):
+        self.generate_batch_fn = generate_batch_fn
+        self.batch_size = batch_size
+        self.batches = 0
+        self.generated = 0
+        self.served = 0
+        self.discarded = 0
+        self.total_batch_seconds = 0.0
+        self._lock = threading.Lock()
+        self._buffers: Dict[PrefetchKey, Deque] = {}
+        self._key_locks: Dict[PrefetchKey, threading.Lock] = {}
+
+    def next(self, language: str, difficulty: str, practice_mode: str, topic_history: List[str]):
+        key = (language, difficulty, practice_mode)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+            buffer = self._buffers.setdefault(key, deque())
+        seen = set(topic_history)
+        with key_lock:
+            question = self._pop_unseen(buffer, seen)
+            if question is not None:
+                return question
+            start = time.perf_counter()
+            batch = self.generate_batch_fn(language, difficulty, practice_mode, list(topic_history), self.batch_size)
+            with self._lock:
+                self.batches += 1
+                self.generated += len(batch)
+                self.total_batch_seconds += time.perf_counter() - start
+            buffer.extend(batch)
+            question = self._pop_unseen(buffer, seen)
+        if question is None:
+            raise ValueError("Batch generation returned no new questions")
+        return question
+
+    def _pop_unseen(self, buffer: Deque, seen: set):
+        while buffer:
+            question = buffer.popleft()
+            if question.title in seen:
+                with self._lock:
+                    self.discarded += 1
+                continue
+            with self._lock:
+                self.served += 1
+            return question
+        return None
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "batch_size": self.batch_size,
+                "batches": self.batches,
+                "generated": self.generated,
+                "served": self.served,
+                "discarded": self.discarded,
+                "buffered": sum(len(buffer) for buffer in self._buffers.values()),
+                "questions_per_call": self.generated / self.batches if self.batches else 0.0,
+                "avg_batch_seconds": self.total_batch_seconds / self.batches if self.batches else 0.0,
+            }
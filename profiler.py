@@ -0,0 +1,246 @@
+import copy
+import math
+import random
+import re
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+from llm_manager import ComplexityProfile
+from sandbox import ExecutionEngine, _load_value, get_engine, python_solution_entry
+
+# Empirical complexity check for Python solutions: runs the user's function on inputs of growing
+# size (scaled up from the question's first test case), measures best wall time and peak traced
+# memory per size, and fits the curve to the usual growth classes. It runs user code through the
+# same ExecutionEngine as grading, so it is off unless local execution is enabled (see sandbox).
+
+DEFAULT_SIZES = [100, 300, 1_000, 3_000, 10_000, 30_000, 100_000]
+
+GROWTH_CLASSES = [
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: float(n)),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n^2)", lambda n: float(n) ** 2),
+    ("O(n^3)", lambda n: float(n) ** 3),
+]
+
+_PROFILE_HARNESS = r'''
+import contextlib, copy, gc, io, json, math, sys, time, tracemalloc
+spec = json.loads(sys.stdin.read())
+namespace = {"__name__": "solution"}
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        exec(compile(open("solution.py").read(), "solution.py", "exec"), namespace)
+    target = namespace.get(ENTRY_NAME)
+    if target is None and "Solution" in namespace:
+        target = getattr(namespace["Solution"](), ENTRY_NAME)
+    if target is None:
+        raise NameError("function %r is not defined" % ENTRY_NAME)
+except BaseException as e:
+    print(MARKER + json.dumps({"error": "%s: %s" % (type(e).__name__, e)}))
+    sys.exit(0)
+
+def call(args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return target(**args) if isinstance(args, dict) else target(*args)
+
+points = []
+for n, args in zip(spec["sizes"], spec["inputs"]):
+    best, total, runs = float("inf"), 0.0, 0
+    try:
+        # Best of at least 3 runs (more for fast sizes); fresh copies because solutions may mutate input
+        while runs < 3 or (total < spec["min_total_ms"] and runs < 50):
+            fresh = copy.deepcopy(args)
+            gc.collect()
+            start = time.perf_counter()
+            call(fresh)
+            elapsed = (time.perf_counter() - start) * 1000
+            best, total, runs = min(best, elapsed), total + elapsed, runs + 1
+            if elapsed > spec["budget_ms"]:
+                break
+        fresh = copy.deepcopy(args)
+        tracemalloc.start()
+        call(fresh)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    except BaseException as e:
+        print(MARKER + json.dumps({"points": points, "stopped": "%s: %s" % (type(e).__name__, e)}))
+        sys.exit(0)
+    points.append({"n": n, "time_ms": best, "peak_kb": peak / 1024})
+    if best > spec["budget_ms"]:
+        print(MARKER + json.dumps({"points": points, "stopped": "budget"}))
+        sys.exit(0)
+    if len(points) >= 2 and len(points) < len(spec["sizes"]):
+        # Extrapolate the observed growth to the next size and stop before it blows the time limit
+        (n1, t1), (n2, t2) = [(p["n"], max(p["time_ms"], 1e-6)) for p in points[-2:]]
+        exponent = max(math.log(t2 / t1) / math.log(n2 / n1), 0.0)
+        if t2 * (spec["sizes"][len(points)] / n2) ** exponent > 5 * spec["budget_ms"]:
+            print(MARKER + json.dumps({"points": points, "stopped": "budget"}))
+            sys.exit(0)
+print(MARKER + json.dumps({"points": points}))
+'''
+
+_POWER = re.compile(r"(\d+)\s*(?:\^|\*\*)\s*(\d+)")
+_NUMBER = re.compile(r"\d[\d,_]*")
+_SIZE_HINT = re.compile(r"length|size|len\(|\bn\b|number of", re.I)
+
+
+def max_input_size(constraints: List[str]) -> Optional[int]:
+    # "1 <= nums.length <= 10^4" -> 10000; only constraints that talk about a size are considered
+    best = None
+    for constraint in constraints:
+        if not _SIZE_HINT.search(constraint):
+            continue
+        text = _POWER.sub(lambda m: str(int(m.group(1)) ** min(int(m.group(2)), 18)), constraint)
+        upper = re.split(r"<=|≤|<", text)[-1]
+        numbers = [int(x.replace(",", "").replace("_", "")) for x in _NUMBER.findall(upper)]
+        if numbers:
+            best = max(best or 0, max(numbers))
+    return best
+
+
+def _scale(value, n: int, rng: random.Random):
+    # Grows list/str arguments to length n, drawing elements that look like the original ones
+    if isinstance(value, str) and value:
+        alphabet = sorted(set(value))
+        return "".join(rng.choice(alphabet) for _ in range(n))
+    if isinstance(value, list):
+        if not value or all(isinstance(x, int) and not isinstance(x, bool) for x in value):
+            lo = min(value, default=0)
+            hi = max(max(value, default=0), lo + n)
+            return [rng.randint(lo, hi) for _ in range(n)]
+        if all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in value):
+            lo, hi = min(value), max(value)
+            return [rng.uniform(lo, hi) for _ in range(n)]
+        return [copy.deepcopy(rng.choice(value)) for _ in range(n)]
+    return value
+
+
+def scale_arguments(args, n: int, rng: random.Random):
+    # Returns None when no argument can grow with n (e.g. a single integer)
+    values = list(args.values()) if isinstance(args, dict) else args
+    if not isinstance(values, list) or not any(isinstance(v, (list, str)) for v in values):
+        return None
+    if isinstance(args, dict):
+        return {k: _scale(v, n, rng) for k, v in args.items()}
+    return [_scale(v, n, rng) for v in args]
+
+
+# Calls faster than this are dominated by timer and call overhead, so their curve carries no signal
+TIME_NOISE_FLOOR_MS = 0.05
+
+
+def fit_growth_class(sizes: List[int], values: List[float], noise_floor: float = 0.0):
+    # Least-squares fit of values ~ a * f(n) + b (a >= 0) for every class; smallest relative error wins.
+    # A simpler class is kept unless a more complex one is clearly (>10%) better.
+    best_name, best_error, best_coeffs = None, float("inf"), None
+    if max(values) < 1.5 * max(min(values), 1e-9) or max(values) < noise_floor:
+        # Flat across a 1000x size range (or too fast to measure): treat any slope as noise
+        classes = GROWTH_CLASSES[:1]
+    else:
+        classes = GROWTH_CLASSES
+    for name, f in classes:
+        xs = [f(n) for n in sizes]
+        mean_x, mean_y = sum(xs) / len(xs), sum(values) / len(values)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        a = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, values)) / var_x if var_x else 0.0
+        a = max(a, 0.0)
+        b = mean_y - a * mean_x
+        error = sum(((a * x + b - y) / max(abs(y), 1e-9)) ** 2 for x, y in zip(xs, values))
+        if error < best_error * 0.9:
+            best_name, best_error, best_coeffs = name, error, (a, b, f)
+    return best_name, best_coeffs
+
+
+class ComplexityProfiler:
+    def __init__(self, engine: Optional[ExecutionEngine] = None, sizes: List[int] = DEFAULT_SIZES,
+                 budget_ms: float = 1000.0, time_limit_seconds: float = 20.0, seed: int = 0):
+        self.engine = engine or get_engine()
+        self.sizes = sizes
+        self.budget_ms = budget_ms
+        self.time_limit_seconds = time_limit_seconds
+        self.seed = seed
+        # A single worker: concurrent profiles would compete for CPU and skew each other's timings
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler")
+
+    def supports(self, question, language: str) -> bool:
+        return (self.engine.enabled and language.lower() == "python"
+                and bool(getattr(question, "test_cases", None)))
+
+    def submit(self, question, user_code: str, language: str) -> Future:
+        return self._executor.submit(self.profile, question, user_code, language)
+
+    def profile(self, question, user_code: str, language: str) -> Optional[ComplexityProfile]:
+        if not self.supports(question, language):
+            return None
+        entry = python_solution_entry(question, user_code)
+        if entry is None:
+            return None
+        try:
+            template = _load_value(question.test_cases[0].input)
+        except (ValueError, SyntaxError):
+            return None
+
+        max_n = max_input_size(question.constraints)
+        sizes = [n for n in self.sizes if max_n is None or n <= max_n] or self.sizes[:3]
+        rng = random.Random(self.seed)
+        inputs = []
+        for n in sizes:
+            scaled = scale_arguments(template, n, rng)
+            if scaled is None:
+                return None
+            inputs.append(scaled)
+
+        harness = _PROFILE_HARNESS.replace("ENTRY_NAME", repr(entry)).replace("MARKER", repr("__COGNITIO_RESULT__"))
+        payload, error, _ = self.engine.run_harness(
+            [sys.executable, "-I", "-S", "harness.py"],
+            {"solution.py": user_code, "harness.py": harness},
+            {"sizes": sizes, "inputs": inputs, "budget_ms": self.budget_ms, "min_total_ms": 50},
+            self.engine.memory_limit_mb * 1024 * 1024,
+            time_limit_seconds=self.time_limit_seconds,
+        )
+        if error is not None:
+            print(f"Profiling failed: {error}")
+            return None
+        points = payload["points"]
+        if len(points) < 3:
+            # Too few sizes finished to fit a curve; if the budget stopped it, it is too slow anyway
+            if payload.get("stopped") == "budget" and points:
+                return ComplexityProfile(time_class="unknown", sizes=[p["n"] for p in points],
+                                         times_ms=[p["time_ms"] for p in points],
+                                         peak_memory_kb=[p["peak_kb"] for p in points],
+                                         max_n=max_n, too_slow=True)
+            return None
+
+        measured = [p["n"] for p in points]
+        times = [p["time_ms"] for p in points]
+        peaks = [p["peak_kb"] for p in points]
+        time_class, (a, b, f) = fit_growth_class(measured, times, TIME_NOISE_FLOOR_MS)
+        memory_class, _ = fit_growth_class(measured, peaks, 1.0)
+
+        target_n = max_n or measured[-1]
+        projected = a * f(target_n) + b
+        return ComplexityProfile(
+            time_class=time_class,
+            memory_class=memory_class,
+            sizes=measured,
+            times_ms=[round(t, 4) for t in times],
+            peak_memory_kb=[round(p, 2) for p in peaks],
+            max_n=max_n,
+            projected_ms_at_max=round(projected, 2),
+            too_slow=payload.get("stopped") == "budget" or projected > self.budget_ms,
+        )
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> ComplexityProfiler:
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = ComplexityProfiler()
+        return _profiler
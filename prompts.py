@@ -0,0 +1,344 @@
+import hashlib
+import os
+import string
+import threading
+import time
+from typing import Callable, Dict
+
+from telemetry import annotate
+
+# Versioned prompt registry. Every prompt is split into a static preamble (role, rules, response
+# format, JSON instruction) and a short body with the per-request values, and is always sent
+# preamble first. Identical leading text lets backends with prefix caching reuse it: implicitly
+# on models that cache common prefixes, or explicitly through PrefixCache, which uploads the
+# preamble once and afterwards sends only the body. Explicit caching only kicks in for gemini-*
+# models and preambles of at least `min_tokens` (1024 by default); today's preambles are a few
+# hundred tokens, so with the default Gemma backends every request is sent whole.
+#   prompt = get_prompt("mcq").render(language="Python", difficulty="Easy", history_context="")
+#   prompt.preamble, prompt.body, str(prompt) == prompt.preamble + prompt.body
+
+JSON_INSTRUCTION = "IMPORTANT: Output strictly valid JSON. No markdown formatting. Ensure all keys and string values are enclosed in double quotes."
+
+_formatter = string.Formatter()
+
+
+class RenderedPrompt(str):
+    # A plain string (preamble + body) to everything downstream; PrefixCachedModel reads the parts
+    def __new__(cls, preamble: str, body: str, name: str, version: str, fingerprint: str):
+        rendered = super().__new__(cls, preamble + body)
+        rendered.preamble = preamble
+        rendered.body = body
+        rendered.name = name
+        rendered.version = version
+        rendered.fingerprint = fingerprint
+        return rendered
+
+
+class PromptTemplate:
+    def __init__(self, name: str, version: str, preamble: str, body: str):
+        self.name = name
+        self.version = version
+        self.preamble = preamble
+        self.body = body
+        # Compiled once: (literal, field) pairs, so rendering is a single join
+        self._parts = [(literal, field) for literal, field, _, _ in _formatter.parse(body)]
+        self.fields = [field for _, field in self._parts if field]
+        self.fingerprint = hashlib.sha256(f"{name}\0{version}\0{preamble}".encode()).hexdigest()[:16]
+
+    def render(self, **values) -> RenderedPrompt:
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise KeyError(f"Prompt {self.name!r} needs {missing}")
+        body = "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+        return RenderedPrompt(self.preamble, body, self.name, self.version, self.fingerprint)
+
+
+PROMPTS: Dict[str, PromptTemplate] = {}
+
+
+def register(template: PromptTemplate) -> PromptTemplate:
+    PROMPTS[template.name] = template
+    return template
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    return PROMPTS[name]
+
+
+# Templates. Preambles are literal text (JSON braces need no escaping); bodies use {field}.
+# Bump a template's version whenever its text changes.
+
+register(PromptTemplate("coding_question", "2", preamble="""You are an expert coding interviewer. Generate one coding problem (LeetCode style) in the language and at the difficulty given at the end.
+
+Ensure you cover a wide range of aspects of the language. If the history shows recent questions on one topic (e.g., Arrays), switch to another (e.g., Strings, Recursion, OOP, API usage).
+
+If the difficulty is "Hard", ensure it is a complex DSA problem.
+
+CRITICAL INSTRUCTION:
+- The `starter_code` field MUST contain ONLY the function signature/boilerplate.
+- DO NOT IMPLEMENT THE SOLUTION in `starter_code`. Use `pass` or return default value.
+- Example starter code: `def solve(nums):\\n    pass`
+- Provide 4-8 `test_cases` covering the examples and edge cases. `input` is a JSON array of the
+  function's positional arguments and `expected_output` is the exact JSON return value.
+
+Response format example:
+{
+    "title": "Two Sum",
+    "description": "Given array... return indices...",
+    "examples": ["Input: nums = [2,7], target = 9\\nOutput: [0,1]"],
+    "constraints": ["2 <= nums.length <= 10^4"],
+    "starter_code": "def two_sum(nums, target):\\n    pass",
+    "test_cases": [
+        {"input": "[[2, 7, 11, 15], 9]", "expected_output": "[0, 1]"},
+        {"input": "[[3, 3], 6]", "expected_output": "[0, 1]"}
+    ]
+}
+
+""" + JSON_INSTRUCTION + "\n\n", body="""Difficulty: {difficulty}
+Language: {language}
+{history_context}"""))
+
+register(PromptTemplate("mcq", "2", preamble="""You are a computer science professor. Generate one multiple-choice question (MCQ) about the language and at the difficulty given at the end.
+
+Ensure the questions become progressively diverse. Cover syntax, libraries, memory management, quirks, and best practices.
+
+- Provide exactly 4 options.
+- Indicate the correct option index (0-3).
+- Provide a clear explanation.
+
+Response format example:
+{
+    "title": "Question text here...",
+    "options": ["Option A", "Option B", "Option C", "Option D"],
+    "correct_option_index": 2,
+    "explanation": "Explanation here..."
+}
+
+""" + JSON_INSTRUCTION + "\n\n", body="""Difficulty: {difficulty}
+Language: {language}
+{history_context}"""))
+
+register(PromptTemplate("mcq_batch", "1", preamble="""You are a computer science professor. Generate several multiple-choice questions (MCQs) about the language and at the difficulty given at the end; the number of questions is given as Count.
+
+Every question must test a different concept. Spread them across syntax, libraries, memory management, quirks, and best practices; never ask two questions about the same topic.
+
+- Provide exactly 4 options per question.
+- Indicate the correct option index (0-3).
+- Provide a clear explanation.
+
+Response format example:
+{
+    "questions": [
+        {"title": "Question text here...", "options": ["Option A", "Option B", "Option C", "Option D"], "correct_option_index": 2, "explanation": "Explanation here..."},
+        {"title": "Another question...", "options": ["Option A", "Option B", "Option C", "Option D"], "correct_option_index": 0, "explanation": "Explanation here..."}
+    ]
+}
+
+""" + JSON_INSTRUCTION + "\n\n", body="""Count: {count}
+Difficulty: {difficulty}
+Language: {language}
+{history_context}"""))
+
+register(PromptTemplate("coding_question_batch", "1", preamble="""You are an expert coding interviewer. Generate several coding problems (LeetCode style) in the language and at the difficulty given at the end; the number of problems is given as Count.
+
+Every problem must cover a different aspect of the language (e.g., Arrays, Strings, Recursion, OOP, API usage); never give two problems on the same topic.
+
+If the difficulty is "Hard", ensure each is a complex DSA problem.
+
+CRITICAL INSTRUCTION:
+- Each `starter_code` field MUST contain ONLY the function signature/boilerplate.
+- DO NOT IMPLEMENT THE SOLUTION in `starter_code`. Use `pass` or return default value.
+- Provide 4-8 `test_cases` per problem covering the examples and edge cases. `input` is a JSON array
+  of the function's positional arguments and `expected_output` is the exact JSON return value.
+
+Response format example:
+{
+    "questions": [
+        {
+            "title": "Two Sum",
+            "description": "Given array... return indices...",
+            "examples": ["Input: nums = [2,7], target = 9\\nOutput: [0,1]"],
+            "constraints": ["2 <= nums.length <= 10^4"],
+            "starter_code": "def two_sum(nums, target):\\n    pass",
+            "test_cases": [{"input": "[[2, 7, 11, 15], 9]", "expected_output": "[0, 1]"}]
+        }
+    ]
+}
+
+""" + JSON_INSTRUCTION + "\n\n", body="""Count: {count}
+Difficulty: {difficulty}
+Language: {language}
+{history_context}"""))
+
+register(PromptTemplate("evaluation", "2", preamble="""You are an expert Senior Engineer Mentor. Evaluate the user's solution to the problem given at the end.
+
+Analyze the code for correctness, efficiency, and style.
+Explain WHY it is correct or incorrect.
+Provide constructive feedback and tips.
+
+Response format example:
+{
+    "is_correct": true,
+    "explanation": "Your code correctly implements...",
+    "tips": ["Consider edge case X", "Use a more descriptive variable name"],
+    "rating": 9
+}
+
+""" + JSON_INSTRUCTION + "\n\n", body="""Problem: {title}
+Description: {description}
+
+User's Code ({language}):
+```
+{user_code}
+```"""))
+
+register(PromptTemplate("batch_evaluation", "1", preamble="""You are an expert Senior Engineer Mentor grading several independent submissions to the same problem, given at the end. Grade every submission on its own merits; never compare submissions or let one influence another's grade.
+
+For each submission, analyze the code for correctness, efficiency, and style, explain WHY it is correct or incorrect, and give constructive tips. Return exactly one evaluation per submission, using the submission's id.
+
+Response format example:
+{
+    "evaluations": [
+        {"id": "s1", "is_correct": true, "explanation": "Your code correctly implements...", "tips": ["Consider edge case X"], "rating": 9},
+        {"id": "s2", "is_correct": false, "explanation": "The loop skips the last element...", "tips": ["Check the loop bounds"], "rating": 4}
+    ]
+}
+
+""" + JSON_INSTRUCTION + "\n\n", body="""Problem: {title}
+Description: {description}
+Language: {language}
+
+{submissions}"""))
+
+register(PromptTemplate("summary", "1", preamble=(
+    "You are a coding coach keeping notes on a student's practice. Summarize the following "
+    "answers (or earlier summaries) in at most 80 words: topics and difficulty covered, accuracy, "
+    "and the concepts behind any mistakes. Plain text, no headings.\n\n"), body="{lines}"))
+
+register(PromptTemplate("report", "2", preamble="""You are a supportive coding coach. Generate a detailed progress report based on the user's history, given at the end.
+
+Focus on:
+1. Summary of performance (Correct vs Incorrect).
+2. Detailed analysis of questions they got WRONG. Explain the core concept they missed.
+3. Provide clear strategies and learning paths to improve on their weak areas.
+4. Be encouraging but professional.
+
+Output the report in clear Markdown format.
+
+""", body="""History (aggregated, older answers summarized):
+{history}"""))
+
+
+# Explicit prefix caching
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class PrefixCache:
+    # Maps (model, preamble fingerprint) to a model bound to a server-side cache of that preamble.
+    # `create(model, preamble, ttl)` makes one (or returns None when the backend cannot); failures
+    # are remembered so an unsupported model is only probed once per preamble.
+    def __init__(self, create: Callable, supports: Callable[[str], bool], min_tokens: int = 1024,
+                 ttl: float = 3600.0, clock=time.monotonic):
+        self.create = create
+        self.supports = supports
+        self.min_tokens = min_tokens
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: Dict[tuple, tuple] = {}  # key -> (cached model or None, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.created = 0
+        self.skipped = 0
+
+    def model_for(self, model, prompt: RenderedPrompt):
+        name = getattr(model, "model_name", None) or ""
+        if not self.supports(name) or estimate_tokens(prompt.preamble) < self.min_tokens:
+            with self._lock:
+                self.skipped += 1
+            return None
+        key = (name, prompt.fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            # Refreshed a little before the server-side TTL runs out
+            if entry is not None and self.clock() < entry[1]:
+                if entry[0] is not None:
+                    self.hits += 1
+                return entry[0]
+            try:
+                cached = self.create(model, prompt.preamble, self.ttl)
+            except Exception as e:
+                print(f"Prefix cache unavailable for {name}/{prompt.name}: {e}")
+                cached = None
+            self._entries[key] = (cached, self.clock() + self.ttl * 0.9)
+            if cached is not None:
+                self.created += 1
+            return cached
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": sum(1 for cached, _ in self._entries.values() if cached is not None),
+                    "hits": self.hits, "created": self.created, "skipped": self.skipped}
+
+
+class PrefixCachedModel:
+    # GenerativeModel-compatible leaf wrapper: registry prompts whose preamble is cached are sent
+    # as body-only requests to the cache-bound model; everything else passes through unchanged
+    def __init__(self, model, cache: PrefixCache):
+        self.model = model
+        self.cache = cache
+        self.model_name = getattr(model, "model_name", None)
+
+    @property
+    def routes_tasks(self) -> bool:
+        # task=... is passed through only to models that take it (fake_model does, the SDK doesn't)
+        return getattr(self.model, "routes_tasks", False)
+
+    def generate_content(self, prompt, **kwargs):
+        if isinstance(prompt, RenderedPrompt):
+            cached = self.cache.model_for(self.model, prompt)
+            annotate(prefix_cached=cached is not None)
+            if cached is not None:
+                return cached.generate_content(prompt.body, **kwargs)
+        return self.model.generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        if isinstance(prompt, RenderedPrompt):
+            cached = self.cache.model_for(self.model, prompt)
+            if cached is not None:
+                return await cached.generate_content_async(prompt.body, **kwargs)
+        return await self.model.generate_content_async(prompt, **kwargs)
+
+    def count_tokens(self, prompt):
+        return self.model.count_tokens(prompt)
+
+
+def supports_gemini_cache(model_name: str) -> bool:
+    # Explicit context caching is a Gemini API feature; Gemma models do not offer it
+    return model_name.startswith("gemini-") or model_name.startswith("models/gemini-")
+
+
+def create_gemini_cached_model(model, preamble: str, ttl: float):
+    import datetime
+    import google.generativeai as genai
+    if hasattr(model, "load"):
+        model.load()  # client_registry.LazyGenerativeModel: configures the SDK with the right key
+    name = model.model_name if model.model_name.startswith("models/") else f"models/{model.model_name}"
+    content = genai.caching.CachedContent.create(model=name, contents=[preamble],
+                                                 ttl=datetime.timedelta(seconds=ttl))
+    return genai.GenerativeModel.from_cached_content(content)
+
+
+_prefix_cache = None
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache() -> PrefixCache:
+    # COGNITIO_PREFIX_CACHE_MIN_TOKENS: backends reject caches below their minimum size
+    global _prefix_cache
+    with _prefix_cache_lock:
+        if _prefix_cache is None:
+            _prefix_cache = PrefixCache(create_gemini_cached_model, supports_gemini_cache,
+                                        min_tokens=int(os.environ.get("COGNITIO_PREFIX_CACHE_MIN_TOKENS", 1024)))
+        return _prefix_cache
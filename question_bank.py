@@ -0,0 +1,198 @@
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+from llm_manager import CodingQuestion, MCQQuestion, dump_model
+from structured_output import validate_model
+
+# Pre-generated questions on disk (filled by build_question_bank.py). Serving a question is an
+# indexed SQLite lookup filtered by what this user has already been served; the app only falls
+# back to live generation when the bank has nothing left for the selection. A drawn question is
+# only reserved (in memory) until mark_served: prefetched questions that are never shown go back.
+
+MODES = {"coding": CodingQuestion, "quiz": MCQQuestion}
+
+
+def mode_name(practice_mode: str) -> str:
+    # Sidebar label -> bank mode
+    return "coding" if "Coding" in practice_mode else "quiz"
+
+
+def _fingerprint(title: str) -> str:
+    return hashlib.sha256(" ".join(title.lower().split()).encode()).hexdigest()[:16]
+
+
+def validate_question(question, language: str) -> Optional[str]:
+    # Returns why a generated question is unfit for the bank, or None if it is usable
+    if not question.title.strip():
+        return "empty title"
+    if isinstance(question, MCQQuestion):
+        if len(question.options) != 4 or len(set(question.options)) != 4:
+            return "MCQ needs 4 distinct options"
+        if not 0 <= question.correct_option_index < 4:
+            return "correct_option_index out of range"
+        return None
+    if not question.description.strip() or not question.starter_code.strip():
+        return "missing description or starter code"
+    if not question.test_cases:
+        return "no test cases"
+    if language.lower() == "python":
+        try:
+            ast.parse(question.starter_code)
+        except SyntaxError as e:
+            return f"starter code does not parse: {e}"
+    return None
+
+
+class QuestionBank:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                language TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                topic TEXT NOT NULL DEFAULT '',
+                title TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (language, mode, fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS questions_selection ON questions (language, difficulty, mode, topic);
+            CREATE TABLE IF NOT EXISTS served (
+                user_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                served_at REAL NOT NULL,
+                PRIMARY KEY (user_id, question_id)
+            ) WITHOUT ROWID;
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        # user_id -> ids drawn but not yet served, so concurrent draws don't hand out the same one
+        self._reserved: Dict[str, set] = {}
+
+    def add(self, question, language: str, difficulty: str, mode: str, topic: str = "") -> bool:
+        # Payload is zlib-compressed compact JSON; returns False when the title is already banked
+        payload = zlib.compress(json.dumps(dump_model(question), separators=(",", ":")).encode())
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO questions (language, difficulty, mode, topic, title, fingerprint, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (language, difficulty, mode, topic or "", question.title, _fingerprint(question.title), payload, time.time()),
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def draw(self, user_id: str, language: str, difficulty: str, mode: str, topic: Optional[str] = None,
+             exclude_titles: Iterable[str] = ()):
+        # Random question for the selection that this user was never served and that isn't reserved
+        # by another draw; reserves it until mark_served or release. Returns None when the bank is
+        # exhausted for the selection.
+        where = "language = ? AND difficulty = ? AND mode = ?"
+        params: List = [language, difficulty, mode]
+        if topic:
+            where += " AND topic = ?"
+            params.append(topic)
+        exclude = {_fingerprint(t) for t in exclude_titles}
+        with self._lock:
+            reserved = self._reserved.setdefault(user_id, set())
+            for _ in range(5):
+                row = self._conn.execute(
+                    f"SELECT id, fingerprint, payload FROM questions q WHERE {where} AND NOT EXISTS "
+                    "(SELECT 1 FROM served s WHERE s.user_id = ? AND s.question_id = q.id) "
+                    f"AND id NOT IN ({','.join('?' * len(reserved))}) ORDER BY random() LIMIT 1",
+                    params + [user_id] + sorted(reserved),
+                ).fetchone()
+                if row is None:
+                    break
+                question_id, fingerprint, payload = row
+                if fingerprint in exclude:
+                    # Seen through live generation before the bank had it; never offer it again
+                    self._mark_served_locked(user_id, question_id)
+                    continue
+                reserved.add(question_id)
+                self.hits += 1
+                return validate_model(MODES[mode], json.loads(zlib.decompress(payload)))
+            self.misses += 1
+            return None
+
+    def mark_served(self, user_id: str, language: str, mode: str, title: str):
+        # Called when the question is actually shown; titles that aren't banked are ignored
+        with self._lock:
+            question_id = self._question_id(language, mode, title)
+            if question_id is not None:
+                self._reserved.get(user_id, set()).discard(question_id)
+                self._mark_served_locked(user_id, question_id)
+
+    def release(self, user_id: str, language: str, mode: str, title: str):
+        # A drawn question that was never shown (e.g. dropped from the prefetch queue) can be drawn again
+        with self._lock:
+            question_id = self._question_id(language, mode, title)
+            if question_id is not None:
+                self._reserved.get(user_id, set()).discard(question_id)
+
+    def recent_titles(self, language: str, difficulty: str, mode: str, topic: str = "", limit: int = 10) -> List[str]:
+        # Newest last, the order generation prompts expect their topic history in
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title FROM questions WHERE language = ? AND difficulty = ? AND mode = ? AND topic = ? "
+                "ORDER BY id DESC LIMIT ?", (language, difficulty, mode, topic or "", limit),
+            ).fetchall()
+        return [title for (title,) in reversed(rows)]
+
+    def _question_id(self, language: str, mode: str, title: str) -> Optional[int]:
+        row = self._conn.execute("SELECT id FROM questions WHERE language = ? AND mode = ? AND fingerprint = ?",
+                                 (language, mode, _fingerprint(title))).fetchone()
+        return row[0] if row else None
+
+    def _mark_served_locked(self, user_id: str, question_id: int):
+        self._conn.execute("INSERT OR IGNORE INTO served (user_id, question_id, served_at) VALUES (?, ?, ?)",
+                           (user_id, question_id, time.time()))
+        self._conn.commit()
+
+    def counts(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT language, difficulty, mode, topic, COUNT(*) FROM questions "
+                "GROUP BY language, difficulty, mode, topic ORDER BY language, difficulty, mode, topic"
+            ).fetchall()
+        return [{"language": l, "difficulty": d, "mode": m, "topic": t, "questions": n} for l, d, m, t, n in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {"questions": size, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+
+def get_question_bank() -> QuestionBank:
+    # COGNITIO_QUESTION_BANK picks the SQLite file written by build_question_bank.py
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            _bank = QuestionBank(os.environ.get("COGNITIO_QUESTION_BANK", ".cognitio/question_bank.db"))
+        return _bank
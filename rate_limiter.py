@@ -0,0 +1,364 @@
+import asyncio
+import contextlib
+import hashlib
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from telemetry import annotate
+
+# Client-side limits for one shared API key, in front of every LLMManager that uses it:
+#   - token buckets for requests/minute and tokens/minute (tokens estimated from prompt length,
+#     corrected with usage_metadata when the response has it)
+#   - priority classes: waiting interactive calls always go first, and background calls (prefetch,
+#     history summaries) may not dip into the last `background_reserve` of either bucket
+#   - single-flight: identical in-flight prompts for deterministic tasks share one call
+#   - 429/quota errors pause the whole key for the server's retry-after (or exponential backoff)
+#     and the call is retried
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Tasks whose identical prompts should return identical answers; question generation is excluded
+# because concurrent identical prompts there are meant to yield different questions
+COALESCE_TASKS = frozenset({"evaluation", "evaluation:hard", "report", "summary"})
+
+# Rough output allowance added to the prompt estimate when reserving tokens/minute, for calls
+# without a max_output_tokens cap (see generation_profiles)
+EXPECTED_OUTPUT_TOKENS = 600
+
+_priority = threading.local()
+
+
+@contextlib.contextmanager
+def background_priority():
+    # Calls made by this thread inside the block queue behind interactive ones
+    previous = getattr(_priority, "value", INTERACTIVE)
+    _priority.value = BACKGROUND
+    try:
+        yield
+    finally:
+        _priority.value = previous
+
+
+def current_priority() -> int:
+    return getattr(_priority, "value", INTERACTIVE)
+
+
+def estimate_tokens(prompt) -> int:
+    return len(str(prompt)) // 4 + 1
+
+
+def expected_output_tokens(kwargs) -> int:
+    # A capped call can't produce more than its cap, so reserve that instead of the rough default
+    config = kwargs.get("generation_config") or {}
+    cap = config.get("max_output_tokens") if isinstance(config, dict) else getattr(config, "max_output_tokens", None)
+    return cap or EXPECTED_OUTPUT_TOKENS
+
+
+_RETRY_IN = re.compile(r"retry (?:in|after) ([\d.]+)\s*s", re.I)
+_RETRY_DELAY = re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.I)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    if getattr(error, "code", None) == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    text = str(error).lower()
+    return "429" in text or "quota" in text or "rate limit" in text
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    # Server-suggested delay from RetryInfo details, a Retry-After header, or the error message
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    for pattern in (_RETRY_IN, _RETRY_DELAY):
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.clock = clock
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        # Seconds until `amount` can be taken while leaving `floor` in the bucket
+        amount = min(amount, self.capacity - floor)
+        missing = amount + floor - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 15000,
+                 background_reserve: float = 0.2, max_retries: int = 4, base_backoff: float = 1.0,
+                 max_backoff: float = 60.0, clock=time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.background_reserve = background_reserve
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.paused_until = 0.0
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._inflight: Dict[str, Future] = {}
+        self._waits = {p: deque(maxlen=500) for p in PRIORITY_NAMES}
+        self.granted = {p: 0 for p in PRIORITY_NAMES}
+        self.coalesced = 0
+        self.throttled = 0
+        self.retries = 0
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        # Defaults match the Gemma free tier; raise them for paid keys
+        return cls(requests_per_minute=float(os.environ.get("COGNITIO_RPM", 30)),
+                   tokens_per_minute=float(os.environ.get("COGNITIO_TPM", 15000)))
+
+    # Admission
+
+    def acquire(self, tokens: int, priority: Optional[int] = None) -> float:
+        # Blocks until this call may go out; returns the seconds spent waiting
+        priority = current_priority() if priority is None else priority
+        ticket = (priority, next(self._seq))
+        start = self.clock()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self._admission_delay(ticket, tokens)
+                    if delay == 0.0:
+                        break
+                    self._cond.wait(timeout=delay)
+                heapq.heappop(self._waiting)
+                self.requests.take(1)
+                self.tokens.take(tokens)
+                self.granted[priority] += 1
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                raise
+            finally:
+                self._cond.notify_all()
+        waited = self.clock() - start
+        self._waits[priority].append(waited)
+        return waited
+
+    def try_acquire(self, tokens: int, priority: int = BACKGROUND) -> bool:
+        # Non-blocking acquire for optional calls (e.g. a router's hedge): takes the quota only if
+        # nobody is queued and it is there right now, leaving the reserve for `priority`
+        with self._cond:
+            if self._waiting or self.clock() < self.paused_until:
+                return False
+            self.requests.refill()
+            self.tokens.refill()
+            reserve = self.background_reserve if priority >= BACKGROUND else 0.0
+            if (self.requests.wait_time(1, reserve * self.requests.capacity) > 0
+                    or self.tokens.wait_time(tokens, reserve * self.tokens.capacity) > 0):
+                return False
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.granted[priority] += 1
+            return True
+
+    def _admission_delay(self, ticket, tokens: int) -> Optional[float]:
+        # 0.0 when `ticket` may go now, otherwise how long to wait (None: until notified)
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self._waiting[0] != ticket:
+            return None
+        self.requests.refill()
+        self.tokens.refill()
+        reserve = self.background_reserve if ticket[0] >= BACKGROUND else 0.0
+        return max(self.requests.wait_time(1, reserve * self.requests.capacity),
+                   self.tokens.wait_time(tokens, reserve * self.tokens.capacity))
+
+    def settle(self, reserved: int, response):
+        # Replaces the token estimate with the real usage when the SDK reports it
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None)
+        if actual:
+            with self._cond:
+                self.tokens.take(actual - reserved)
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        # Called before a retry. A 429 pauses every caller on this key, not just the one that hit it
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.8, 1.2)
+        with self._cond:
+            self.throttled += 1
+            self.retries += 1
+            self.paused_until = max(self.paused_until, self.clock() + delay)
+            self._cond.notify_all()
+        return delay
+
+    # Single-flight
+
+    def coalesce(self, key: str):
+        # Returns (future, leader): the leader makes the call and must finish(); followers wait
+        with self._cond:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def finish(self, key: str, future: Future, response=None, error: Optional[BaseException] = None):
+        with self._cond:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(response)
+
+    # Metrics
+
+    def stats(self) -> dict:
+        with self._cond:
+            self.requests.refill()
+            self.tokens.refill()
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                depth[PRIORITY_NAMES.get(priority, "background")] += 1
+            waits = {}
+            for priority, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[PRIORITY_NAMES[priority]] = {
+                    "granted": self.granted[priority],
+                    "wait_p50": ordered[len(ordered) // 2] if ordered else None,
+                    "wait_p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else None,
+                }
+            return {
+                "queue_depth": depth,
+                "waits": waits,
+                "requests_available": round(self.requests.level, 2),
+                "tokens_available": round(self.tokens.level),
+                "paused_for": max(0.0, self.paused_until - self.clock()),
+                "coalesced": self.coalesced,
+                "throttled": self.throttled,
+                "retries": self.retries,
+            }
+
+
+class RateLimitedModel:
+    # GenerativeModel-compatible wrapper; put it outside a ModelRouter so routed calls are admitted
+    # once in the caller's thread. A hedge is a second request, so give the router the same limiter
+    # (ModelRouter(limiter=...)) and it only hedges when try_acquire finds spare quota.
+    routes_tasks = True
+
+    def __init__(self, model, limiter: RateLimiter):
+        self.model = model
+        self.limiter = limiter
+        self.model_name = getattr(model, "model_name", None)
+
+    def _inner_kwargs(self, task, kwargs) -> dict:
+        if task is not None and getattr(self.model, "routes_tasks", False):
+            return dict(kwargs, task=task)
+        return kwargs
+
+    def generate_content(self, prompt, stream: bool = False, task: Optional[str] = None, **kwargs):
+        inner_kwargs = self._inner_kwargs(task, kwargs)
+        if stream:
+            return self._call(prompt, dict(inner_kwargs, stream=True))
+        if task not in COALESCE_TASKS:
+            return self._call(prompt, inner_kwargs)
+
+        key = hashlib.sha256(f"{task}\0{prompt}\0{sorted(kwargs.items())!r}".encode()).hexdigest()
+        future, leader = self.limiter.coalesce(key)
+        if not leader:
+            annotate(coalesced=True)
+            return future.result()
+        try:
+            response = self._call(prompt, inner_kwargs)
+        except BaseException as e:
+            self.limiter.finish(key, future, error=e)
+            raise
+        self.limiter.finish(key, future, response)
+        return response
+
+    def _call(self, prompt, kwargs):
+        reserved = estimate_tokens(prompt) + expected_output_tokens(kwargs)
+        attempt = 0
+        waited = 0.0
+        while True:
+            waited += self.limiter.acquire(reserved)
+            annotate(rate_limit_wait_ms=round(waited * 1000, 2), rate_limit_retries=attempt)
+            try:
+                response = self.model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.limiter.max_retries:
+                    raise
+                delay = self.limiter.backoff(attempt, e)
+                print(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}): {e}")
+                attempt += 1
+                continue
+            if not kwargs.get("stream"):
+                self.limiter.settle(reserved, response)
+            return response
+
+    async def generate_content_async(self, prompt, task: Optional[str] = None, **kwargs):
+        # Admission runs in a worker thread so the event loop keeps serving other calls
+        kwargs = self._inner_kwargs(task, kwargs)
+        reserved = estimate_tokens(prompt) + expected_output_tokens(kwargs)
+        priority = current_priority()
+        attempt = 0
+        while True:
+            await asyncio.to_thread(self.limiter.acquire, reserved, priority)
+            try:
+                if hasattr(self.model, "generate_content_async"):
+                    response = await self.model.generate_content_async(prompt, **kwargs)
+                else:
+                    response = await asyncio.to_thread(self.model.generate_content, prompt, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.limiter.max_retries:
+                    raise
+                self.limiter.backoff(attempt, e)
+                attempt += 1
+                continue
+            self.limiter.settle(reserved, response)
+            return response
+
+    def count_tokens(self, prompt):
+        return self.model.count_tokens(prompt) if hasattr(self.model, "count_tokens") else None
+
+    def stats(self) -> dict:
+        result = {"rate_limiter": self.limiter.stats()}
+        if hasattr(self.model, "stats"):
+            result.update(self.model.stats())
+        return result
@@ -0,0 +1,209 @@
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+from rate_limiter import background_priority
+
+# Bounded input for the progress report. Instead of str(history) (every answer, every code blob),
+# the report gets a digest built from three parts that all stay small as a session grows:
+#   - rolling per-topic aggregates, updated as each answer lands
+#   - map-reduce summaries of older answers: fixed chunks are summarized once, groups of chunk
+#     summaries are summarized again, and every summary is cached in the history store
+#   - the most recent answers, one compact line each
+# The rendered digest is trimmed to a token budget before it reaches the report prompt.
+
+CHUNK_SIZE = 20
+REDUCE_FANOUT = 5
+RECENT_ENTRIES = 10
+MISTAKES_PER_TOPIC = 3
+DEFAULT_TOKEN_BUDGET = 2500
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting and needs no API call
+    return len(text) // 4 + 1
+
+
+def _snippet(text, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def compact_entry(entry: dict) -> str:
+    # One line per answer; user code is deliberately left out
+    line = (f"[{'correct' if entry.get('is_correct') else 'wrong'}] {entry.get('language')} "
+            f"{entry.get('mode')} {entry.get('difficulty')}: {entry.get('question')}")
+    if entry.get("tests_passed"):
+        line += f" (tests {entry['tests_passed']})"
+    measured = entry.get("measured_complexity")
+    if measured:
+        line += f" (measured {measured.get('time')} time{', too slow' if measured.get('too_slow') else ''})"
+    if not entry.get("is_correct"):
+        line += f" - {_snippet(entry.get('explanation'), 160)}"
+    return line
+
+
+class TopicAggregate:
+    def __init__(self, language, mode):
+        self.language = language
+        self.mode = mode
+        self.attempts = 0
+        self.correct = 0
+        self.by_difficulty: Dict[str, List[int]] = {}
+        self.mistakes = deque(maxlen=MISTAKES_PER_TOPIC)
+
+    def add_counts(self, difficulty, attempts: int, correct: int):
+        self.attempts += attempts
+        self.correct += correct
+        counts = self.by_difficulty.setdefault(difficulty, [0, 0])
+        counts[0] += attempts
+        counts[1] += correct
+
+    def add_mistake(self, entry: dict):
+        self.mistakes.append(f"{entry.get('question')}: {_snippet(entry.get('explanation'), 120)}")
+
+    def render(self) -> str:
+        accuracy = self.correct / self.attempts * 100 if self.attempts else 0
+        levels = ", ".join(f"{level} {c}/{a}" for level, (a, c) in self.by_difficulty.items())
+        line = f"- {self.language} {self.mode}: {self.correct}/{self.attempts} correct ({accuracy:.0f}%; {levels})"
+        if self.mistakes:
+            line += "\n  Recent mistakes: " + " | ".join(self.mistakes)
+        return line
+
+
+class HistoryDigest:
+    def __init__(self, user_id: Optional[str] = None, store=None,
+                 summarizer: Optional[Callable[[List[str]], str]] = None,
+                 chunk_size: int = CHUNK_SIZE, fanout: int = REDUCE_FANOUT,
+                 recent_entries: int = RECENT_ENTRIES, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.user_id = user_id
+        self.store = store
+        self.summarizer = summarizer
+        self.chunk_size = chunk_size
+        self.fanout = fanout
+        self.token_budget = token_budget
+        self.total = 0
+        self.topics: Dict[tuple, TopicAggregate] = {}
+        self.recent = deque(maxlen=recent_entries)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store, user_id: str, **kwargs) -> "HistoryDigest":
+        # Seeds the aggregates with GROUP BY counts and a handful of rows, not a full history scan
+        digest = cls(user_id=user_id, store=store, **kwargs)
+        for row in store.topic_stats(user_id):
+            digest._topic(row).add_counts(row["difficulty"], row["attempts"], row["correct"])
+            digest.total += row["attempts"]
+        for entry in reversed(store.query(user_id, limit=MISTAKES_PER_TOPIC * 5, is_correct=False)):
+            digest._topic(entry).add_mistake(entry)
+        digest.recent.extend(reversed(store.query(user_id, limit=digest.recent.maxlen)))
+        return digest
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[dict], **kwargs) -> "HistoryDigest":
+        # Store-less digest for callers that still hold a plain history list (no summaries)
+        digest = cls(**kwargs)
+        for entry in entries:
+            digest.add(entry)
+        return digest
+
+    def _topic(self, entry: dict) -> TopicAggregate:
+        key = (entry.get("language"), entry.get("mode"))
+        if key not in self.topics:
+            self.topics[key] = TopicAggregate(*key)
+        return self.topics[key]
+
+    def add(self, entry: dict) -> bool:
+        # Returns True when this answer completed a chunk that can now be summarized
+        with self._lock:
+            topic = self._topic(entry)
+            topic.add_counts(entry.get("difficulty"), 1, 1 if entry.get("is_correct") else 0)
+            if not entry.get("is_correct"):
+                topic.add_mistake(entry)
+            self.recent.append(entry)
+            self.total += 1
+            older = self.total - self.recent.maxlen
+            return self.store is not None and older > 0 and older % self.chunk_size == 0
+
+    # Map-reduce over the entries older than the recent window
+
+    def _summarizable_chunks(self) -> int:
+        return max(0, self.total - self.recent.maxlen) // self.chunk_size
+
+    def _summary(self, level: int, index: int) -> Optional[str]:
+        # Level 0 summarizes one chunk of entries; level L summarizes `fanout` level L-1 summaries.
+        # Entries are append-only, so a chunk's summary never goes stale and is cached forever.
+        key = f"c{self.chunk_size}f{self.fanout}:L{level}:{index}"
+        cached = self.store.get_summary(self.user_id, key)
+        if cached is not None:
+            return cached
+        if level == 0:
+            entries = self.store.query(self.user_id, limit=self.chunk_size, offset=index * self.chunk_size,
+                                       newest_first=False)
+            lines = [compact_entry(e) for e in entries]
+        else:
+            lines = [self._summary(level - 1, index * self.fanout + j) for j in range(self.fanout)]
+            if any(line is None for line in lines):
+                return None
+        try:
+            text = self.summarizer(lines)
+        except Exception as e:
+            print(f"History summary failed for {key}: {e}")
+            return None
+        self.store.put_summary(self.user_id, key, text)
+        return text
+
+    def summaries(self) -> List[str]:
+        # Covers the summarizable chunks with the largest cached blocks: at most fanout-1 blocks
+        # per level, so the count grows with log(history length)
+        if self.store is None or self.summarizer is None:
+            return []
+        chunks = self._summarizable_chunks()
+        levels = 0
+        while self.fanout ** (levels + 1) <= chunks:
+            levels += 1
+        pieces, start = [], 0
+        for level in range(levels, -1, -1):
+            size = self.fanout ** level
+            while start + size <= chunks:
+                text = self._summary(level, start // size)
+                if text:
+                    pieces.append(text)
+                start += size
+        return pieces
+
+    def summarize_pending(self):
+        # Warms the summary cache; meant to run in the background as chunks complete
+        with background_priority():
+            self.summaries()
+
+    def render(self, token_budget: Optional[int] = None) -> str:
+        budget = token_budget or self.token_budget
+        with self._lock:
+            header = f"Total answered: {self.total}"
+            topics = "Per-topic results:\n" + "\n".join(t.render() for t in self.topics.values())
+            recent = list(self.recent)
+        used = estimate_tokens(header) + estimate_tokens(topics)
+
+        # Recent answers first (newest kept when trimming), then older summaries with what is left
+        recent_lines = []
+        for entry in reversed(recent):
+            line = compact_entry(entry)
+            if used + estimate_tokens(line) > budget:
+                break
+            recent_lines.append(line)
+            used += estimate_tokens(line)
+        summary_lines = []
+        for text in reversed(self.summaries()):
+            line = f"- {_snippet(text, 800)}"
+            if used + estimate_tokens(line) > budget:
+                break
+            summary_lines.append(line)
+            used += estimate_tokens(line)
+
+        sections = [header, topics]
+        if summary_lines:
+            sections.append("Earlier answers (summarized, oldest first):\n" + "\n".join(reversed(summary_lines)))
+        if recent_lines:
+            sections.append("Most recent answers (oldest first):\n" + "\n".join(reversed(recent_lines)))
+        return "\n\n".join(sections)
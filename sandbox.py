@@ -0,0 +1,377 @@
+import ast
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from pydantic import BaseModel, Field
+
+from llm_manager import Evaluation
+
+# Runs a user's solution against CodingQuestion.test_cases in a resource-limited subprocess,
+# so a passing/failing verdict is available without an LLM round trip.
+# This is a best-effort sandbox (isolated interpreter, scratch cwd, empty env, rlimits); it is not
+# a security boundary against hostile code: submissions can still read files the server can read
+# (including .streamlit/secrets.toml) and open network connections. Local execution is therefore
+# off unless COGNITIO_LOCAL_EXECUTION=1; turn it on only where the app itself runs isolated (a
+# container with no secrets on disk and no outbound network). While off, run() returns None and
+# callers grade with the LLM.
+
+RESULT_MARKER = "__COGNITIO_RESULT__"
+
+
+class CaseResult(BaseModel):
+    input: Any = None
+    expected: Any = None
+    actual: Any = None
+    passed: bool = False
+    error: Optional[str] = None
+    runtime_ms: float = 0.0
+
+
+class ExecutionResult(BaseModel):
+    passed: int = 0
+    total: int = 0
+    runtime_ms: float = Field(0.0, description="Sum of per-case function runtime, excluding interpreter startup")
+    wall_ms: float = 0.0
+    cases: List[CaseResult] = Field(default_factory=list)
+    error: Optional[str] = Field(None, description="Set when the harness could not run (compile error, timeout, memory limit)")
+
+    @property
+    def all_passed(self) -> bool:
+        return self.error is None and self.total > 0 and self.passed == self.total
+
+
+_PYTHON_HARNESS = r'''
+import contextlib, io, json, math, sys, time
+cases = json.loads(sys.stdin.read())
+namespace = {"__name__": "solution"}
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        exec(compile(open("solution.py").read(), "solution.py", "exec"), namespace)
+    target = namespace.get(ENTRY_NAME)
+    if target is None and "Solution" in namespace:
+        target = getattr(namespace["Solution"](), ENTRY_NAME)
+    if target is None:
+        raise NameError("function %r is not defined" % ENTRY_NAME)
+except BaseException as e:
+    print(MARKER + json.dumps({"error": "%s: %s" % (type(e).__name__, e)}))
+    sys.exit(0)
+
+def normalize(value):
+    return json.loads(json.dumps(value, default=lambda o: list(o) if isinstance(o, (set, tuple, frozenset)) else repr(o)))
+
+def equal(a, b):
+    if isinstance(a, bool) or isinstance(b, bool):
+        return a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-9)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(equal(a[k], b[k]) for k in a)
+    return a == b
+
+results = []
+for case in cases:
+    args = case["input"]
+    entry = {"input": args, "expected": case["expected"]}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            actual = target(**args) if isinstance(args, dict) else target(*args)
+        entry["runtime_ms"] = (time.perf_counter() - start) * 1000
+        entry["actual"] = normalize(actual)
+        entry["passed"] = equal(entry["actual"], case["expected"])
+    except BaseException as e:
+        entry["runtime_ms"] = (time.perf_counter() - start) * 1000
+        entry["error"] = "%s: %s" % (type(e).__name__, e)
+        entry["passed"] = False
+    results.append(entry)
+print(MARKER + json.dumps({"cases": results}))
+'''
+
+_JS_HARNESS = r'''
+;(function () {
+  const MARKER = __MARKER__;
+  const cases = JSON.parse(require("fs").readFileSync(0, "utf8"));
+  let target;
+  try {
+    target = typeof __ENTRY__ === "function" ? __ENTRY__ : null;
+  } catch (e) {
+    target = null;
+  }
+  if (!target) {
+    console.log(MARKER + JSON.stringify({ error: "ReferenceError: function __ENTRY__ is not defined" }));
+    return;
+  }
+  const equal = (a, b) => {
+    if (typeof a === "number" && typeof b === "number") return Math.abs(a - b) <= 1e-9 + 1e-6 * Math.abs(b);
+    if (Array.isArray(a) && Array.isArray(b)) return a.length === b.length && a.every((x, i) => equal(x, b[i]));
+    if (a && b && typeof a === "object" && typeof b === "object") {
+      const ka = Object.keys(a), kb = Object.keys(b);
+      return ka.length === kb.length && ka.every((k) => equal(a[k], b[k]));
+    }
+    return a === b;
+  };
+  const log = console.log;
+  const results = [];
+  for (const c of cases) {
+    const entry = { input: c.input, expected: c.expected };
+    const start = process.hrtime.bigint();
+    try {
+      console.log = () => {};
+      const actual = Array.isArray(c.input) ? target(...c.input) : target(c.input);
+      entry.runtime_ms = Number(process.hrtime.bigint() - start) / 1e6;
+      entry.actual = actual === undefined ? null : JSON.parse(JSON.stringify(actual));
+      entry.passed = equal(entry.actual, c.expected);
+    } catch (e) {
+      entry.runtime_ms = Number(process.hrtime.bigint() - start) / 1e6;
+      entry.error = String(e);
+      entry.passed = false;
+    } finally {
+      console.log = log;
+    }
+    results.push(entry);
+  }
+  console.log(MARKER + JSON.stringify({ cases: results }));
+})();
+'''
+
+
+def _load_value(value):
+    # Test case fields arrive as JSON strings (or Python-literal strings) or as already-decoded values
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+
+def _python_entry_point(source: str) -> Optional[str]:
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            return node.name
+        if isinstance(node, ast.ClassDef):
+            # LeetCode style: class Solution: def twoSum(self, ...)
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and not item.name.startswith("_"):
+                    return item.name
+    return None
+
+
+def _python_starter_entry_point(starter_code: str) -> Optional[str]:
+    entry = _python_entry_point(starter_code)
+    if entry is None:
+        # Starters often end in a bare signature ("def twoSum(nums, target):"), which doesn't parse
+        match = re.search(r"^\s*def\s+(\w+)\s*\(", starter_code or "", re.M)
+        entry = match.group(1) if match else None
+    return entry
+
+
+def python_solution_entry(question, user_code: str) -> Optional[str]:
+    # The function the question asks for, named by its starter code; solutions may define helpers
+    # first, so the user's first function is only a fallback for questions without a starter
+    return _python_starter_entry_point(getattr(question, "starter_code", "")) or _python_entry_point(user_code)
+
+
+_JS_FUNCTION = re.compile(r"\bfunction\s+([A-Za-z_$][\w$]*)\s*\(|\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)")
+
+
+def _js_entry_point(source: str) -> Optional[str]:
+    match = _JS_FUNCTION.search(source)
+    if match is None:
+        return None
+    return match.group(1) or match.group(2)
+
+
+def _limit_resources(cpu_seconds: int, memory_bytes: Optional[int]):
+    def apply():
+        import resource
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        if memory_bytes:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        # No core dumps and no large files from user code
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+    return apply if os.name == "posix" else None
+
+
+class ExecutionEngine:
+    def __init__(self, max_workers: int = 4, time_limit_seconds: float = 5.0, memory_limit_mb: int = 256,
+                 enabled: bool = False):
+        # Nothing is executed unless the deployment opted in (see the module comment)
+        self.enabled = enabled
+        self.time_limit_seconds = time_limit_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.node_path = shutil.which("node")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sandbox")
+
+    def supports(self, language: str) -> bool:
+        # Java is not supported: the harness would need the method's parameter types to decode JSON
+        # arguments, which the question schema does not carry. Java submissions keep using the LLM.
+        if not self.enabled:
+            return False
+        lang = language.lower()
+        if lang == "python":
+            return True
+        if lang == "javascript":
+            return self.node_path is not None
+        return False
+
+    def can_grade(self, question, language: str) -> bool:
+        return self.supports(language) and bool(getattr(question, "test_cases", None))
+
+    def submit(self, question, user_code: str, language: str) -> Future:
+        return self._executor.submit(self.run, question, user_code, language)
+
+    def run(self, question, user_code: str, language: str) -> Optional[ExecutionResult]:
+        # Returns None when the question cannot be graded locally (caller should fall back to the LLM);
+        # an ExecutionResult with `error` set means the user's code itself failed to run.
+        lang = language.lower()
+        if not self.can_grade(question, language):
+            return None
+        try:
+            cases = [
+                {"input": _load_value(tc.input), "expected": _load_value(tc.expected_output)}
+                for tc in question.test_cases
+            ]
+        except (ValueError, SyntaxError) as e:
+            print(f"Skipping local grading, malformed test case: {e}")
+            return None
+
+        if lang == "python":
+            try:
+                ast.parse(user_code)
+            except SyntaxError as e:
+                return ExecutionResult(total=len(cases), error=f"SyntaxError: {e}")
+            entry = python_solution_entry(question, user_code)
+            if entry is None:
+                return None
+            files = {"solution.py": user_code, "harness.py": _PYTHON_HARNESS
+                     .replace("ENTRY_NAME", repr(entry)).replace("MARKER", repr(RESULT_MARKER))}
+            command = [sys.executable, "-I", "-S", "harness.py"]
+            memory_bytes = self.memory_limit_mb * 1024 * 1024
+        elif lang == "javascript" and self.node_path:
+            entry = _js_entry_point(question.starter_code or "") or _js_entry_point(user_code)
+            if entry is None:
+                return None
+            harness = _JS_HARNESS.replace("__MARKER__", json.dumps(RESULT_MARKER)).replace("__ENTRY__", entry)
+            files = {"solution.js": user_code + "\n" + harness}
+            command = [self.node_path, f"--max-old-space-size={self.memory_limit_mb}", "solution.js"]
+            # V8 reserves far more address space than it uses, so node is capped by its own heap flag
+            memory_bytes = None
+        else:
+            return None
+
+        return self._execute(command, files, cases, memory_bytes)
+
+    def run_harness(self, command: List[str], files: dict, stdin_payload, memory_bytes: Optional[int],
+                    time_limit_seconds: Optional[float] = None):
+        # Runs `command` in a scratch directory holding `files`; returns (payload, error, wall_ms)
+        # where payload is the JSON the harness printed after RESULT_MARKER.
+        if not self.enabled:
+            raise RuntimeError("Local execution is disabled (set COGNITIO_LOCAL_EXECUTION=1 to enable it)")
+        time_limit = time_limit_seconds or self.time_limit_seconds
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="cognitio-sandbox-") as workdir:
+            for name, content in files.items():
+                with open(os.path.join(workdir, name), "w") as f:
+                    f.write(content)
+            try:
+                proc = subprocess.run(
+                    command,
+                    input=json.dumps(stdin_payload),
+                    capture_output=True,
+                    text=True,
+                    cwd=workdir,
+                    env={"PATH": os.environ.get("PATH", ""), "PYTHONHASHSEED": "0"},
+                    timeout=time_limit,
+                    preexec_fn=_limit_resources(int(time_limit) + 1, memory_bytes),
+                )
+            except subprocess.TimeoutExpired:
+                return None, f"Time limit exceeded ({time_limit:g}s)", (time.perf_counter() - start) * 1000
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        payload = None
+        for line in proc.stdout.splitlines():
+            if line.startswith(RESULT_MARKER):
+                payload = json.loads(line[len(RESULT_MARKER):])
+        if payload is None:
+            stderr = proc.stderr.strip().splitlines()
+            errors = [line for line in stderr if re.match(r"^\w*Error\b", line)]
+            if "MemoryError" in proc.stderr or "heap out of memory" in proc.stderr or proc.returncode in (-9, 137):
+                reason = f"Memory limit exceeded ({self.memory_limit_mb} MB)"
+            elif errors or stderr:
+                # Prefer the interpreter's "XxxError: message" line over trailing version banners
+                reason = (errors or stderr)[-1]
+            else:
+                reason = f"Process exited with code {proc.returncode}"
+            return None, reason, wall_ms
+        if "error" in payload:
+            return None, payload["error"], wall_ms
+        return payload, None, wall_ms
+
+    def _execute(self, command: List[str], files: dict, cases: list, memory_bytes: Optional[int]) -> ExecutionResult:
+        payload, error, wall_ms = self.run_harness(command, files, cases, memory_bytes)
+        if error is not None:
+            return ExecutionResult(total=len(cases), wall_ms=wall_ms, error=error)
+
+        results = [CaseResult(**case) for case in payload["cases"]]
+        return ExecutionResult(
+            passed=sum(1 for r in results if r.passed),
+            total=len(results),
+            runtime_ms=sum(r.runtime_ms for r in results),
+            wall_ms=wall_ms,
+            cases=results,
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> ExecutionEngine:
+    # One subprocess pool per server process
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ExecutionEngine(enabled=os.environ.get("COGNITIO_LOCAL_EXECUTION", "0").lower() in ("1", "true", "on"))
+        return _engine
+
+
+def evaluation_from_result(result: ExecutionResult) -> Evaluation:
+    # Instant, deterministic verdict built from the local run; the LLM mentor pass can refine it later
+    if result.error:
+        return Evaluation(is_correct=False, explanation=f"Your code could not be run against the tests: {result.error}",
+                          tips=["Fix the error above and resubmit."], rating=1)
+    if result.all_passed:
+        return Evaluation(
+            is_correct=True,
+            explanation=f"Passed all {result.total} test cases in {result.runtime_ms:.2f} ms.",
+            tips=[],
+            rating=10,
+        )
+    failed = next(case for case in result.cases if not case.passed)
+    detail = failed.error or f"expected {json.dumps(failed.expected)}, got {json.dumps(failed.actual)}"
+    return Evaluation(
+        is_correct=False,
+        explanation=f"Passed {result.passed}/{result.total} test cases. Failed on input {json.dumps(failed.input)}: {detail}",
+        tips=["Trace your code by hand on the failing input."],
+        rating=max(1, round(10 * result.passed / result.total)),
+    )
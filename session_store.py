@@ -0,0 +1,297 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+from llm_manager import CodingQuestion, ComplexityProfile, Evaluation, MCQQuestion
+from structured_output import validate_model
+
+# Externalized session state, so any replica can serve any request for a session (no sticky sessions).
+# The app's durable keys (see utils.SESSION_KEYS) are serialized to one compact blob per session id and
+# written with optimistic concurrency: every save names the version it was based on, and a save based
+# on an outdated version fails with SessionConflict instead of silently overwriting the newer copy.
+#   COGNITIO_SESSION_STORE=memory            in-process (default; survives reconnects, not restarts)
+#   COGNITIO_SESSION_STORE=redis://host:6379/0   shared by every replica (needs the redis package)
+#   COGNITIO_SESSION_STORE=local-redis       RedisSessionStore against LocalRedis, the in-process stand-in
+
+# Pydantic values are tagged with their class so they come back as models, not dicts
+MODEL_TYPES = {cls.__name__: cls for cls in (CodingQuestion, MCQQuestion, Evaluation, ComplexityProfile)}
+
+# Payloads above this many bytes are zlib-compressed (history working sets are mostly repetitive text)
+COMPRESS_THRESHOLD = 512
+
+SESSION_TTL = 7 * 24 * 3600
+
+
+class SessionConflict(Exception):
+    # The stored session changed since the version the caller loaded
+    def __init__(self, session_id: str, expected: int, actual: int):
+        super().__init__(f"Session {session_id} is at version {actual}, not {expected}")
+        self.session_id = session_id
+        self.expected = expected
+        self.actual = actual
+
+
+def _encode_value(value):
+    if isinstance(value, BaseModel):
+        data = value.model_dump(exclude_defaults=True) if hasattr(value, "model_dump") else value.dict(exclude_defaults=True)
+        return {"$m": type(value).__name__, "v": data}
+    raise TypeError(f"Cannot store {type(value).__name__} in the session store")
+
+
+def _decode_object(obj: dict):
+    if "$m" in obj and obj["$m"] in MODEL_TYPES:
+        return validate_model(MODEL_TYPES[obj["$m"]], obj["v"])
+    return obj
+
+
+def encode_state(state: dict) -> bytes:
+    # Compact JSON (no whitespace, model defaults omitted), compressed when large. The first byte
+    # says which: b"j" plain, b"z" zlib.
+    data = json.dumps(state, separators=(",", ":"), default=_encode_value).encode()
+    if len(data) > COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data, 6)
+    return b"j" + data
+
+
+def decode_state(payload: bytes) -> dict:
+    data = zlib.decompress(payload[1:]) if payload[:1] == b"z" else payload[1:]
+    return json.loads(data, object_hook=_decode_object)
+
+
+def payload_digest(payload: bytes) -> str:
+    return hashlib.sha1(payload).hexdigest()
+
+
+class SessionStore:
+    # Stores opaque payloads (see encode_state) per session id. Versions start at 1 and grow by one
+    # per save; 0 means "no stored session".
+    def load(self, session_id: str) -> Tuple[Optional[bytes], int]:
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> int:
+        # Cheap check used on every rerun; only a changed version triggers a full load
+        return self.load(session_id)[1]
+
+    def save(self, session_id: str, payload: bytes, expected_version: int) -> int:
+        # Returns the new version, or raises SessionConflict
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+
+class InProcessSessionStore(SessionStore):
+    # Default backend: one process, oldest sessions dropped beyond `max_sessions` or after `ttl`
+    def __init__(self, max_sessions: int = 10000, ttl: float = SESSION_TTL, clock=time.time):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (payload, version, expires_at)
+
+    def _get(self, session_id: str):
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry[2] < self.clock():
+            del self._sessions[session_id]
+            return None
+        return entry
+
+    def load(self, session_id: str) -> Tuple[Optional[bytes], int]:
+        with self._lock:
+            entry = self._get(session_id)
+            return (entry[0], entry[1]) if entry is not None else (None, 0)
+
+    def save(self, session_id: str, payload: bytes, expected_version: int) -> int:
+        with self._lock:
+            entry = self._get(session_id)
+            current = entry[1] if entry is not None else 0
+            if current != expected_version:
+                raise SessionConflict(session_id, expected_version, current)
+            self._sessions[session_id] = (payload, current + 1, self.clock() + self.ttl)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return current + 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class WatchConflict(Exception):
+    # LocalRedis's stand-in for redis.exceptions.WatchError
+    pass
+
+
+def _watch_errors() -> tuple:
+    try:
+        from redis.exceptions import WatchError
+        return (WatchConflict, WatchError)
+    except ImportError:
+        return (WatchConflict,)
+
+
+class RedisSessionStore(SessionStore):
+    # One hash per session: v (version) and d (payload). Saves use WATCH/MULTI, so a concurrent save
+    # from another replica between our version check and our write aborts the transaction.
+    def __init__(self, client, prefix: str = "cognitio:session:", ttl: int = SESSION_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = int(ttl)
+        self._watch_errors = _watch_errors()
+
+    def _key(self, session_id: str) -> str:
+        return self.prefix + session_id
+
+    def load(self, session_id: str) -> Tuple[Optional[bytes], int]:
+        version, payload = self.client.hmget(self._key(session_id), ["v", "d"])
+        if version is None:
+            return None, 0
+        return payload, int(version)
+
+    def version(self, session_id: str) -> int:
+        version = self.client.hget(self._key(session_id), "v")
+        return int(version) if version is not None else 0
+
+    def save(self, session_id: str, payload: bytes, expected_version: int) -> int:
+        key = self._key(session_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                current = pipe.hget(key, "v")
+                current = int(current) if current is not None else 0
+                if current != expected_version:
+                    raise SessionConflict(session_id, expected_version, current)
+                pipe.multi()
+                pipe.hset(key, mapping={"v": current + 1, "d": payload})
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except self._watch_errors:
+                raise SessionConflict(session_id, expected_version, self.version(session_id))
+        return current + 1
+
+    def delete(self, session_id: str):
+        self.client.delete(self._key(session_id))
+
+
+class LocalRedis:
+    # In-process stand-in for the subset of the redis-py client RedisSessionStore uses (hashes,
+    # expire, delete and WATCH/MULTI/EXEC pipelines), for development and tests without a server.
+    # Values come back as bytes, like redis-py without decode_responses.
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._hashes: Dict[str, Dict[str, bytes]] = {}
+        self._expires: Dict[str, float] = {}
+        self._revisions: Dict[str, int] = {}  # bumped on every write; what WATCH compares
+
+    def _live(self, key: str) -> Optional[Dict[str, bytes]]:
+        if key in self._expires and self._expires[key] < self.clock():
+            self._drop(key)
+        return self._hashes.get(key)
+
+    def _drop(self, key: str):
+        self._hashes.pop(key, None)
+        self._expires.pop(key, None)
+        self._revisions[key] = self._revisions.get(key, 0) + 1
+
+    @staticmethod
+    def _bytes(value) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode()
+
+    def hget(self, key: str, field: str) -> Optional[bytes]:
+        with self._lock:
+            return (self._live(key) or {}).get(field)
+
+    def hmget(self, key: str, fields) -> list:
+        with self._lock:
+            hash_ = self._live(key) or {}
+            return [hash_.get(field) for field in fields]
+
+    def hset(self, key: str, mapping: dict):
+        with self._lock:
+            self._live(key)
+            self._hashes.setdefault(key, {}).update({k: self._bytes(v) for k, v in mapping.items()})
+            self._revisions[key] = self._revisions.get(key, 0) + 1
+
+    def expire(self, key: str, seconds: int):
+        with self._lock:
+            if self._live(key) is not None:
+                self._expires[key] = self.clock() + seconds
+
+    def delete(self, key: str):
+        with self._lock:
+            self._drop(key)
+
+    def pipeline(self) -> "_LocalPipeline":
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    def __init__(self, redis: LocalRedis):
+        self.redis = redis
+        self._watched: Dict[str, int] = {}
+        self._queued = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+    def watch(self, key: str):
+        with self.redis._lock:
+            self._watched[key] = self.redis._revisions.get(key, 0)
+
+    def multi(self):
+        self._queued = []
+
+    def __getattr__(self, name):
+        # Before multi() commands run immediately; after it they are queued for execute()
+        command = getattr(self.redis, name)
+
+        def call(*args, **kwargs):
+            if self._queued is None:
+                return command(*args, **kwargs)
+            self._queued.append((command, args, kwargs))
+        return call
+
+    def execute(self) -> list:
+        with self.redis._lock:
+            if any(self.redis._revisions.get(key, 0) != revision for key, revision in self._watched.items()):
+                self.reset()
+                raise WatchConflict("Watched key changed")
+            results = [command(*args, **kwargs) for command, args, kwargs in self._queued or []]
+        self.reset()
+        return results
+
+    def reset(self):
+        self._watched = {}
+        self._queued = None
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            url = os.environ.get("COGNITIO_SESSION_STORE", "memory")
+            ttl = int(os.environ.get("COGNITIO_SESSION_TTL", SESSION_TTL))
+            if url == "memory":
+                _session_store = InProcessSessionStore(ttl=ttl)
+            elif url == "local-redis":
+                _session_store = RedisSessionStore(LocalRedis(), ttl=ttl)
+            else:
+                import redis  # optional dependency, only needed for a shared store
+                _session_store = RedisSessionStore(redis.Redis.from_url(url), ttl=ttl)
+        return _session_store
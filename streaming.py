@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+# Helpers for generate_content(stream=True): time-to-first-token metrics and an incremental
+# JSON reader that surfaces one string field (e.g. Evaluation.explanation) while the rest of
+# the object is still arriving.
+
+_ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StreamMetrics:
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._ttft = {}
+        self._total = {}
+        self.window = window
+
+    def record(self, operation: str, ttft_seconds: Optional[float], total_seconds: float):
+        with self._lock:
+            if ttft_seconds is not None:
+                self._ttft.setdefault(operation, deque(maxlen=self.window)).append(ttft_seconds)
+            self._total.setdefault(operation, deque(maxlen=self.window)).append(total_seconds)
+
+    @staticmethod
+    def _percentile(values, q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                operation: {
+                    "count": len(self._total[operation]),
+                    "ttft_p50": self._percentile(self._ttft.get(operation, ()), 0.5),
+                    "ttft_p95": self._percentile(self._ttft.get(operation, ()), 0.95),
+                    "total_p50": self._percentile(self._total[operation], 0.5),
+                }
+                for operation in self._total
+            }
+
+
+class LastChunk:
+    # Wraps a streamed response and keeps its final chunk, which carries the finish_reason
+    def __init__(self, chunks: Iterable):
+        self.chunks = chunks
+        self.last = None
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.last = chunk
+            yield chunk
+
+
+def timed_chunks(chunks: Iterable, metrics: StreamMetrics, operation: str,
+                 start: Optional[float] = None) -> Iterator[str]:
+    # Yields chunk texts and records time-to-first-token and total stream time once exhausted.
+    # Pass `start` (time.perf_counter()) taken before the request so TTFT includes the network wait.
+    start = time.perf_counter() if start is None else start
+    ttft = None
+    try:
+        for chunk in chunks:
+            text = chunk.text
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            yield text
+    finally:
+        metrics.record(operation, ttft, time.perf_counter() - start)
+
+
+class JSONFieldStreamer:
+    # Feed raw JSON text as it arrives; feed() returns the newly decoded characters of the
+    # top-level string field `field_name`. Only that field is decoded; everything else is skipped.
+    def __init__(self, field_name: str):
+        self.field_name = field_name
+        self._depth = 0
+        self._quote = None         # quote char of the string currently being scanned
+        self._escape = None        # pending escape sequence ("" after a backslash, "uXXX" while reading)
+        self._buffer = []          # characters of the current string
+        self._last_key = None      # last completed top-level string, candidate key
+        self._expect_value = False # saw `"field_name":`, the next string is the value we want
+        self._emitting = False
+        self.done = False
+
+    def feed(self, text: str) -> str:
+        out = []
+        for ch in text:
+            if self._quote is not None:
+                decoded = self._string_char(ch)
+                if decoded is None:
+                    continue
+                if decoded is _END:
+                    finished = "".join(self._buffer)
+                    self._buffer = []
+                    self._quote = None
+                    if self._emitting:
+                        self._emitting = False
+                        self.done = True
+                    elif self._depth == 1:
+                        self._last_key = finished
+                    continue
+                if self._emitting:
+                    out.append(decoded)
+                else:
+                    self._buffer.append(decoded)
+                continue
+
+            if ch in "\"'" and self._depth >= 1:
+                # Quotes in prose before the opening brace are not JSON strings
+                self._quote = ch
+                self._emitting = self._expect_value and self._depth == 1 and not self.done
+                self._expect_value = False
+            elif ch in "{[":
+                self._depth += 1
+                self._expect_value = False
+            elif ch in "}]":
+                self._depth -= 1
+            elif ch == ":" and self._depth == 1:
+                self._expect_value = self._last_key == self.field_name
+                self._last_key = None
+            elif ch == ",":
+                self._expect_value = False
+                self._last_key = None
+        return "".join(out)
+
+    def _string_char(self, ch: str):
+        if self._escape is not None:
+            if self._escape == "":
+                if ch == "u":
+                    self._escape = "u"
+                    return None
+                self._escape = None
+                return _ESCAPES.get(ch, ch)
+            self._escape += ch
+            if len(self._escape) == 5:
+                code, self._escape = self._escape[1:], None
+                try:
+                    return chr(int(code, 16))
+                except ValueError:
+                    return ""
+            return None
+        if ch == "\\":
+            self._escape = ""
+            return None
+        if ch == self._quote:
+            return _END
+        return ch
+
+
+_END = object()
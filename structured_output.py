@@ -0,0 +1,355 @@
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from telemetry import annotate, span
+
+# Structured-output layer for LLMManager: a single-pass tolerant JSON parser, Pydantic validation,
+# native JSON mode where the model supports it, and a bounded repair loop that sends back only the
+# broken output plus the error instead of regenerating from the original prompt.
+
+# Gemini models accept response_mime_type="application/json"; Gemma models reject it
+NATIVE_JSON_PREFIXES = ("gemini-",)
+
+REPAIR_OUTPUT_LIMIT = 6000
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+def supports_native_json(model_name: Optional[str]) -> bool:
+    return bool(model_name) and model_name.startswith(NATIVE_JSON_PREFIXES)
+
+
+class _TolerantParser:
+    # Recursive-descent JSON reader that also accepts single-quoted strings, trailing commas,
+    # bare keys, raw newlines in strings and Python literals (True/False/None). It starts at the
+    # first { or [ (skipping prose and ``` fences) and stops at the matching close bracket.
+    _LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def parse(self):
+        starts = [i for i in (self.text.find("{"), self.text.find("[")) if i != -1]
+        if not starts:
+            raise StructuredOutputError("No JSON object found in response")
+        self.pos = min(starts)
+        return self._value()
+
+    def partial_array(self) -> list:
+        # Elements of the first array that were complete before the text broke off (a response
+        # cut at max_output_tokens, or a malformed element); stops at the first unreadable element
+        start = self.text.find("[")
+        if start == -1:
+            return []
+        self.pos = start + 1
+        result = []
+        while True:
+            self._skip_ws()
+            if self.pos >= len(self.text) or self.text[self.pos] == "]":
+                return result
+            try:
+                result.append(self._value())
+            except StructuredOutputError:
+                return result
+            self._skip_ws()
+            if self.pos < len(self.text) and self.text[self.pos] == ",":
+                self.pos += 1
+
+    def _error(self, message: str):
+        snippet = self.text[max(0, self.pos - 20):self.pos + 20].replace("\n", " ")
+        raise StructuredOutputError(f"{message} at position {self.pos} near {snippet!r}")
+
+    def _skip_ws(self):
+        text, n = self.text, len(self.text)
+        while self.pos < n and text[self.pos] in " \t\r\n":
+            self.pos += 1
+
+    def _value(self):
+        self._skip_ws()
+        if self.pos >= len(self.text):
+            self._error("Unexpected end of input")
+        ch = self.text[self.pos]
+        if ch == "{":
+            return self._object()
+        if ch == "[":
+            return self._array()
+        if ch in "\"'":
+            return self._string()
+        if ch in "-+.0123456789":
+            return self._number()
+        word = self._word()
+        if word in self._LITERALS:
+            return self._LITERALS[word]
+        self._error(f"Unexpected token {word or ch!r}")
+
+    def _word(self) -> str:
+        start = self.pos
+        while self.pos < len(self.text) and (self.text[self.pos].isalnum() or self.text[self.pos] in "_$"):
+            self.pos += 1
+        return self.text[start:self.pos]
+
+    def _object(self) -> dict:
+        self.pos += 1
+        result = {}
+        while True:
+            self._skip_ws()
+            if self.pos >= len(self.text):
+                self._error("Unterminated object")
+            ch = self.text[self.pos]
+            if ch == "}":
+                self.pos += 1
+                return result
+            key = self._string() if ch in "\"'" else self._word()
+            if not key:
+                self._error("Expected a key")
+            self._skip_ws()
+            if self.pos >= len(self.text) or self.text[self.pos] != ":":
+                self._error(f"Expected ':' after key {key!r}")
+            self.pos += 1
+            result[key] = self._value()
+            self._skip_ws()
+            if self.pos < len(self.text) and self.text[self.pos] == ",":
+                self.pos += 1
+            elif self.pos < len(self.text) and self.text[self.pos] != "}":
+                self._error("Expected ',' or '}'")
+
+    def _array(self) -> list:
+        self.pos += 1
+        result = []
+        while True:
+            self._skip_ws()
+            if self.pos >= len(self.text):
+                self._error("Unterminated array")
+            if self.text[self.pos] == "]":
+                self.pos += 1
+                return result
+            result.append(self._value())
+            self._skip_ws()
+            if self.pos < len(self.text) and self.text[self.pos] == ",":
+                self.pos += 1
+            elif self.pos < len(self.text) and self.text[self.pos] != "]":
+                self._error("Expected ',' or ']'")
+
+    _ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def _string(self) -> str:
+        quote = self.text[self.pos]
+        self.pos += 1
+        out = []
+        text, n = self.text, len(self.text)
+        while self.pos < n:
+            ch = text[self.pos]
+            if ch == quote:
+                self.pos += 1
+                return "".join(out)
+            if ch == "\\" and self.pos + 1 < n:
+                esc = text[self.pos + 1]
+                if esc == "u" and self.pos + 6 <= n:
+                    try:
+                        out.append(chr(int(text[self.pos + 2:self.pos + 6], 16)))
+                        self.pos += 6
+                        continue
+                    except ValueError:
+                        pass
+                out.append(self._ESCAPES.get(esc, "\\" + esc))
+                self.pos += 2
+                continue
+            out.append(ch)
+            self.pos += 1
+        self._error("Unterminated string")
+
+    def _number(self):
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] in "+-.0123456789eE":
+            self.pos += 1
+        raw = self.text[start:self.pos]
+        try:
+            return float(raw) if any(c in raw for c in ".eE") else int(raw)
+        except ValueError:
+            self._error(f"Invalid number {raw!r}")
+
+
+def tolerant_loads(text: str):
+    return _TolerantParser(text).parse()
+
+
+def validate_model(pydantic_model, data):
+    # Helper for Pydantic v1 vs v2 compatibility
+    if hasattr(pydantic_model, 'model_validate'):
+        return pydantic_model.model_validate(data)
+    return pydantic_model.parse_obj(data)
+
+
+def parse_structured(text: str, pydantic_model):
+    return validate_model(pydantic_model, tolerant_loads(text))
+
+
+def parse_items(text: str, item_model, key: str) -> Tuple[list, List[str]]:
+    # For list responses ({key: [...]} or a bare array): every element is validated on its own, so one
+    # bad element costs only itself. Returns (valid items, one error per rejected element).
+    try:
+        data = tolerant_loads(text)
+        raw = data.get(key) if isinstance(data, dict) else data
+        if not isinstance(raw, list):
+            raise StructuredOutputError(f"Expected a list under {key!r}")
+    except StructuredOutputError:
+        raw = _TolerantParser(text).partial_array()
+        if not raw:
+            raise
+    items, errors = [], []
+    for i, entry in enumerate(raw):
+        try:
+            items.append(validate_model(item_model, entry))
+        except Exception as e:
+            errors.append(f"item {i}: {e}")
+    return items, errors
+
+
+def _traced_parse(text: str, pydantic_model):
+    # parse_structured split into its two telemetry phases
+    with span("parse", chars=len(text)):
+        data = tolerant_loads(text)
+    with span("validate", schema=pydantic_model.__name__):
+        return validate_model(pydantic_model, data)
+
+
+def repair_prompt(bad_output: str, error: Exception) -> str:
+    # Only the broken output and the error go back to the model, not the original instructions
+    if len(bad_output) > REPAIR_OUTPUT_LIMIT:
+        bad_output = bad_output[:REPAIR_OUTPUT_LIMIT]
+    return (
+        "Your previous response could not be parsed or validated.\n"
+        f"Error: {error}\n\n"
+        f"Previous response:\n{bad_output}\n\n"
+        "Return ONLY the corrected JSON object with the same content. "
+        "Use double quotes for all keys and strings and no markdown fences."
+    )
+
+
+class StructuredOutputStats:
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.window = window
+
+    def record(self, schema_name: str, parse_seconds: float, repairs: int, ok: bool, native: bool):
+        with self._lock:
+            entry = self._stats.setdefault(schema_name, {
+                "calls": 0, "repaired_calls": 0, "repair_attempts": 0, "failures": 0, "native_json_calls": 0,
+                "parse_seconds": deque(maxlen=self.window),
+            })
+            entry["calls"] += 1
+            entry["repair_attempts"] += repairs
+            entry["repaired_calls"] += 1 if repairs and ok else 0
+            entry["failures"] += 0 if ok else 1
+            entry["native_json_calls"] += 1 if native else 0
+            entry["parse_seconds"].append(parse_seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            result = {}
+            for name, entry in self._stats.items():
+                parse_times = sorted(entry["parse_seconds"])
+                result[name] = {
+                    "calls": entry["calls"],
+                    "repair_rate": entry["repair_attempts"] / entry["calls"],
+                    "repaired_calls": entry["repaired_calls"],
+                    "failures": entry["failures"],
+                    "native_json_calls": entry["native_json_calls"],
+                    "parse_ms_p50": parse_times[len(parse_times) // 2] * 1000 if parse_times else None,
+                    "parse_ms_max": parse_times[-1] * 1000 if parse_times else None,
+                }
+            return result
+
+
+def generate_structured(generate, prompt_text: str, pydantic_model, stats: StructuredOutputStats,
+                        native_json: bool = False, max_repairs: int = 2):
+    # `generate(prompt, generation_config)` performs one model call and returns its text.
+    generation_config = {"response_mime_type": "application/json"} if native_json else None
+    text = generate(prompt_text, generation_config)
+    repairs = 0
+    parse_seconds = 0.0
+    while True:
+        start = time.perf_counter()
+        try:
+            result = _traced_parse(text, pydantic_model)
+            parse_seconds += time.perf_counter() - start
+            stats.record(pydantic_model.__name__, parse_seconds, repairs, True, native_json)
+            annotate(repairs=repairs, native_json=native_json)
+            return result
+        except Exception as e:
+            parse_seconds += time.perf_counter() - start
+            if repairs >= max_repairs:
+                stats.record(pydantic_model.__name__, parse_seconds, repairs, False, native_json)
+                annotate(repairs=repairs, native_json=native_json)
+                print(f"Structured output failed for {pydantic_model.__name__} after {repairs} repairs: {e}")
+                raise
+            repairs += 1
+            print(f"Repairing {pydantic_model.__name__} output (attempt {repairs}): {e}")
+            text = generate(repair_prompt(text, e), generation_config)
+
+
+def generate_items(generate, prompt_text: str, item_model, key: str, stats: StructuredOutputStats,
+                   native_json: bool = False, max_repairs: int = 1) -> list:
+    # generate_structured for list responses: rejected elements are dropped (and counted), and a
+    # repair round is only spent when no element at all survived
+    generation_config = {"response_mime_type": "application/json"} if native_json else None
+    name = f"{item_model.__name__}[]"
+    text = generate(prompt_text, generation_config)
+    repairs = 0
+    parse_seconds = 0.0
+    while True:
+        start = time.perf_counter()
+        try:
+            with span("parse", chars=len(text)):
+                items, errors = parse_items(text, item_model, key)
+            if not items:
+                raise StructuredOutputError("; ".join(errors[:3]) or "Empty list")
+            parse_seconds += time.perf_counter() - start
+            stats.record(name, parse_seconds, repairs, True, native_json)
+            annotate(repairs=repairs, native_json=native_json, items=len(items), rejected_items=len(errors))
+            for error in errors:
+                print(f"Dropped invalid {item_model.__name__} from a batch: {error}")
+            return items
+        except Exception as e:
+            parse_seconds += time.perf_counter() - start
+            if repairs >= max_repairs:
+                stats.record(name, parse_seconds, repairs, False, native_json)
+                annotate(repairs=repairs, native_json=native_json)
+                print(f"Structured output failed for {name} after {repairs} repairs: {e}")
+                raise
+            repairs += 1
+            print(f"Repairing {name} output (attempt {repairs}): {e}")
+            text = generate(repair_prompt(text, e), generation_config)
+
+
+async def agenerate_structured(generate, prompt_text: str, pydantic_model, stats: StructuredOutputStats,
+                               native_json: bool = False, max_repairs: int = 2):
+    # Async twin of generate_structured; `generate` is a coroutine function with the same signature
+    generation_config = {"response_mime_type": "application/json"} if native_json else None
+    text = await generate(prompt_text, generation_config)
+    repairs = 0
+    parse_seconds = 0.0
+    while True:
+        start = time.perf_counter()
+        try:
+            result = _traced_parse(text, pydantic_model)
+            parse_seconds += time.perf_counter() - start
+            stats.record(pydantic_model.__name__, parse_seconds, repairs, True, native_json)
+            annotate(repairs=repairs, native_json=native_json)
+            return result
+        except Exception as e:
+            parse_seconds += time.perf_counter() - start
+            if repairs >= max_repairs:
+                stats.record(pydantic_model.__name__, parse_seconds, repairs, False, native_json)
+                annotate(repairs=repairs, native_json=native_json)
+                print(f"Structured output failed for {pydantic_model.__name__} after {repairs} repairs: {e}")
+                raise
+            repairs += 1
+            print(f"Repairing {pydantic_model.__name__} output (attempt {repairs}): {e}")
+            text = await generate(repair_prompt(text, e), generation_config)
@@ -0,0 +1,272 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, List, Optional
+
+# Structured spans for the hot paths (LLMManager calls and their phases, Streamlit reruns).
+#   with span("generate_mcq", task="mcq"):
+#       with span("network"):
+#           ...
+#       annotate(repairs=1)
+# Spans nest per thread and are handed to every configured sink when they end.
+# COGNITIO_TELEMETRY picks the sinks: "memory" (default), "jsonl:<path>", "otel", comma-separated.
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_wall = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_wall,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class RingBufferSink:
+    # Last `capacity` spans in memory; feeds the dev telemetry page
+    def __init__(self, capacity: int = 5000):
+        self._spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self._spans.append(span.as_dict())
+
+    def spans(self) -> List[dict]:
+        with self._lock:
+            return list(self._spans)
+
+    def summary(self) -> Dict[str, dict]:
+        durations: Dict[str, list] = {}
+        cpu: Dict[str, list] = {}
+        errors: Dict[str, int] = {}
+        for record in self.spans():
+            durations.setdefault(record["name"], []).append(record["duration_ms"])
+            if "cpu_ms" in record["attributes"]:
+                cpu.setdefault(record["name"], []).append(record["attributes"]["cpu_ms"])
+            errors[record["name"]] = errors.get(record["name"], 0) + (1 if record["error"] else 0)
+        result = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            result[name] = {
+                "count": len(values),
+                "p50_ms": round(values[len(values) // 2], 2),
+                "p95_ms": round(values[min(len(values) - 1, int(0.95 * len(values)))], 2),
+                "max_ms": round(values[-1], 2),
+                "errors": errors[name],
+            }
+            if name in cpu:
+                # Server CPU per run, for spans that record it (Streamlit reruns and fragment runs)
+                result[name]["cpu_p50_ms"] = round(sorted(cpu[name])[len(cpu[name]) // 2], 2)
+        return result
+
+
+class JSONLSink:
+    # One JSON object per line; lines are buffered and flushed in batches to keep I/O off the hot path
+    def __init__(self, path: str, flush_every: int = 50):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self._buffer.append(json.dumps(span.as_dict(), separators=(",", ":"), default=str))
+            if len(self._buffer) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        with open(self.path, "a") as f:
+            f.write("\n".join(self._buffer) + "\n")
+        self._buffer = []
+
+
+class OpenTelemetrySink:
+    # Re-emits finished traces through the OpenTelemetry API (needs opentelemetry-api plus an
+    # SDK/exporter configured by the deployment). Children finish before their parents, so spans
+    # are held per trace and exported parent-first once the root span ends.
+    def __init__(self, service_name: str = "cognitio-libera"):
+        from opentelemetry import trace  # optional dependency
+        self._trace = trace
+        self._tracer = trace.get_tracer(service_name)
+        self._pending: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self._pending.setdefault(span.trace_id, []).append(span)
+            if span.parent_id is not None:
+                return
+            spans = self._pending.pop(span.trace_id)
+        children: Dict[Optional[str], List[Span]] = {}
+        for s in spans:
+            children.setdefault(s.parent_id, []).append(s)
+        self._export(span, None, children)
+
+    def _export(self, span: Span, context, children):
+        start_ns = int(span.start_wall * 1e9)
+        attributes = {k: v for k, v in span.attributes.items() if isinstance(v, (str, bool, int, float))}
+        if span.error:
+            attributes["error"] = span.error
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=start_ns, attributes=attributes)
+        child_context = self._trace.set_span_in_context(otel_span)
+        for child in children.get(span.span_id, []):
+            self._export(child, child_context, children)
+        otel_span.end(end_time=start_ns + int((span.duration_ms or 0) * 1e6))
+
+
+class Telemetry:
+    def __init__(self, sinks: Optional[list] = None):
+        self.sinks = sinks if sinks is not None else [RingBufferSink()]
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> "Telemetry":
+        sinks = []
+        for spec in os.environ.get("COGNITIO_TELEMETRY", "memory").split(","):
+            spec = spec.strip()
+            if spec == "memory":
+                sinks.append(RingBufferSink())
+            elif spec.startswith("jsonl"):
+                sinks.append(JSONLSink(spec.partition(":")[2] or ".cognitio/telemetry.jsonl"))
+            elif spec == "otel":
+                try:
+                    sinks.append(OpenTelemetrySink())
+                except ImportError:
+                    print("COGNITIO_TELEMETRY=otel needs the opentelemetry packages; skipping that sink")
+        return cls(sinks)
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Optional[Span]:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def start(self, name: str, **attributes) -> Span:
+        new_span = Span(name, self.current(), **attributes)
+        self._stack().append(new_span)
+        return new_span
+
+    def end(self, span_obj: Span, error: Optional[BaseException] = None):
+        if span_obj.duration_ms is not None:
+            return
+        span_obj.duration_ms = (time.perf_counter() - span_obj._start) * 1000
+        if error is not None:
+            span_obj.error = f"{type(error).__name__}: {error}"
+        stack = self._stack()
+        if span_obj in stack:
+            del stack[stack.index(span_obj):]
+        for sink in self.sinks:
+            try:
+                sink.emit(span_obj)
+            except Exception as e:
+                print(f"Telemetry sink {type(sink).__name__} failed: {e}")
+
+    def discard(self, span_obj: Span):
+        # Drops an unfinished span (and anything opened under it) without emitting it
+        stack = self._stack()
+        if span_obj in stack:
+            del stack[stack.index(span_obj):]
+
+    def span(self, name: str, **attributes) -> "_SpanContext":
+        return _SpanContext(self, name, attributes)
+
+    def annotate(self, **attributes):
+        # Adds attributes to the innermost open span of this thread (no-op outside spans)
+        current = self.current()
+        if current is not None:
+            current.set(**attributes)
+
+    def ring_buffer(self) -> Optional[RingBufferSink]:
+        return next((s for s in self.sinks if isinstance(s, RingBufferSink)), None)
+
+    def flush(self):
+        for sink in self.sinks:
+            if hasattr(sink, "flush"):
+                sink.flush()
+
+
+class _SpanContext:
+    def __init__(self, telemetry: Telemetry, name: str, attributes: dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+
+    def __enter__(self) -> Span:
+        self.span = self.telemetry.start(self.name, **self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.end(self.span, exc)
+        return False
+
+
+def response_token_counts(response, prompt=None) -> dict:
+    # usage_metadata from the SDK when present, otherwise a ~4 chars/token estimate
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None and getattr(usage, "total_token_count", None):
+        return {"prompt_tokens": usage.prompt_token_count, "response_tokens": usage.candidates_token_count,
+                "cached_tokens": getattr(usage, "cached_content_token_count", 0) or 0}
+    counts = {"tokens_estimated": True}
+    if prompt is not None:
+        counts["prompt_tokens"] = len(str(prompt)) // 4 + 1
+    text = getattr(response, "text", None)
+    if isinstance(text, str):
+        counts["response_tokens"] = len(text) // 4 + 1
+    return counts
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry.from_env()
+            import atexit
+            atexit.register(_telemetry.flush)
+        return _telemetry
+
+
+def span(name: str, **attributes):
+    return get_telemetry().span(name, **attributes)
+
+
+def annotate(**attributes):
+    get_telemetry().annotate(**attributes)
@@ -0,0 +1,31 @@
+import os
+
+import streamlit as st
+
+from telemetry import get_telemetry
+from utils import rerun
+
+# Dev-only latency page, reached with ?view=telemetry when COGNITIO_DEV=1
+
+
+def is_dev_mode() -> bool:
+    return os.environ.get("COGNITIO_DEV") == "1"
+
+
+def render_telemetry_page():
+    st.title("📈 Telemetry")
+    buffer = get_telemetry().ring_buffer()
+    if buffer is None:
+        st.info("Add 'memory' to COGNITIO_TELEMETRY to collect spans in this process.")
+    else:
+        summary = buffer.summary()
+        if summary:
+            # Spans from every session served by this process
+            st.table([dict(operation=name, **row) for name, row in summary.items()])
+        else:
+            st.info("No spans recorded yet.")
+        with st.expander("Recent spans"):
+            st.json(buffer.spans()[-50:])
+    if st.button("Back to practice"):
+        del st.query_params["view"]
+        rerun()
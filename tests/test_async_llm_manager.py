@@ -0,0 +1,91 @@
+import asyncio
+
+from async_llm_manager import AsyncLLMManager, SyncLLMManager
+from eval_cache import EvaluationCache
+from fake_model import FakeGenerativeModel
+from llm_manager import CodingQuestion, Evaluation, LLMManager, MCQQuestion
+from llm_manager import TestCase as Case
+from telemetry import Telemetry
+
+QUESTION = CodingQuestion(title="Sum", description="Return the sum.", examples=[], constraints=[],
+                          starter_code="def solve(nums):\n    pass",
+                          test_cases=[Case(input="[[1, 2, 3]]", expected_output="6")])
+SOLUTION = "def solve(nums):\n    return sum(nums)\n"
+
+
+class CountingModel(FakeGenerativeModel):
+    # Tracks how many calls are in flight at once
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().generate_content_async(prompt, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+def test_fan_out_returns_typed_results():
+    model = CountingModel(latency=0.01)
+    manager = AsyncLLMManager(None, model=model, max_concurrency=8)
+
+    async def run():
+        return await manager.gather(
+            manager.generate_coding_question("Python", "Easy"),
+            manager.generate_mcq("Python", "Medium", topic="Strings"),
+            *(manager.evaluate_code(QUESTION, SOLUTION + f"# variant {i}\n", "Python", "Easy") for i in range(4)),
+        )
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], CodingQuestion)
+    assert isinstance(results[1], MCQQuestion)
+    assert all(isinstance(r, Evaluation) for r in results[2:])
+    assert model.calls == 6
+    # The calls really overlapped
+    assert model.peak > 1
+
+
+def test_concurrency_is_bounded_by_the_semaphore():
+    model = CountingModel(latency=0.02)
+    manager = AsyncLLMManager(None, model=model, max_concurrency=3)
+
+    async def run():
+        return await manager.gather(*(manager.generate_mcq("Python", "Easy", [str(i)]) for i in range(12)))
+
+    assert len(asyncio.run(run())) == 12
+    assert model.peak == 3
+
+
+def test_evaluations_use_the_shared_cache_and_spans(monkeypatch):
+    telemetry = Telemetry()
+    monkeypatch.setattr("telemetry._telemetry", telemetry)
+    model = FakeGenerativeModel()
+    manager = AsyncLLMManager.from_manager(LLMManager(None, model=model, eval_cache=EvaluationCache()))
+
+    async def run():
+        first = await manager.evaluate_code(QUESTION, SOLUTION, "Python", "Easy")
+        second = await manager.evaluate_code(QUESTION, SOLUTION, "Python", "Easy")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert model.calls == 1
+    spans = telemetry.ring_buffer().spans()
+    evaluations = [s for s in spans if s["name"] == "evaluate_code"]
+    assert [s["attributes"].get("cache_hit") for s in evaluations] == [False, True]
+    network = [s for s in spans if s["name"] == "network"]
+    assert len(network) == 1 and network[0]["parent_id"] == evaluations[0]["span_id"]
+
+
+def test_sync_facade():
+    manager = SyncLLMManager(None, model=FakeGenerativeModel())
+    try:
+        assert isinstance(manager.evaluate_code(QUESTION, SOLUTION, "Python", "Easy"), Evaluation)
+        futures = [manager.submit(manager.async_manager.generate_mcq("Python", "Easy", [str(i)])) for i in range(3)]
+        assert all(isinstance(f.result(timeout=10), MCQQuestion) for f in futures)
+    finally:
+        manager.close()
@@ -0,0 +1,30 @@
+from build_question_bank import build_one
+from dedup_index import DedupIndex
+from fake_model import FakeGenerativeModel
+from llm_manager import LLMManager
+from question_bank import QuestionBank
+
+
+class RecordingManager(LLMManager):
+    def __init__(self):
+        super().__init__(api_key=None, model=FakeGenerativeModel())
+        self.histories = []
+
+    def generate_coding_question(self, language, difficulty, topic_history=[], topic=None):
+        self.histories.append(list(topic_history))
+        return super().generate_coding_question(language, difficulty, topic_history, topic)
+
+
+def test_banked_titles_are_passed_as_history(tmp_path):
+    bank = QuestionBank(str(tmp_path / "qb.db"))
+    manager = RecordingManager()
+    dedup = DedupIndex(capacity=100)
+    titles = []
+    for _ in range(3):
+        outcome, question = build_one(manager, bank, dedup, "Python", "Easy", "coding", "Arrays")
+        assert outcome == "added"
+        titles.append(question.title)
+    assert manager.histories == [[], titles[:1], titles[:2]]
+    # History is per selection
+    assert bank.recent_titles("Python", "Easy", "coding", "Strings") == []
+    bank.close()
@@ -0,0 +1,23 @@
+from eval_cache import evaluation_cache_key, normalize_code
+from llm_manager import CodingQuestion
+
+QUESTION = CodingQuestion(title="Join", description="Join the words.", examples=[], constraints=[],
+                          starter_code="def solve(words):\n    pass", test_cases=[])
+
+
+def key(code, language="Python"):
+    return evaluation_cache_key(QUESTION, code, language, "model", "v1")
+
+
+def test_spacing_inside_string_literals_changes_the_key():
+    assert key('def solve(words):\n    return "a  b"\n') != key('def solve(words):\n    return "a b"\n')
+    assert key('function solve() { return "a  b"; }', "JavaScript") != key('function solve() { return "a b"; }', "JavaScript")
+
+
+def test_comments_line_endings_and_trailing_whitespace_are_ignored():
+    plain = 'def solve(words):\n    return " ".join(words)\n'
+    noisy = '# joins them\r\ndef solve(words):   \r\n\r\n    return " ".join(words)  # done\r\n'
+    assert key(plain) == key(noisy)
+    assert normalize_code("let x = 1; // one\n/* two */\n", "JavaScript") == "let x = 1;"
+    # Indentation is significant in Python
+    assert key("if x:\n    y()\nz()") != key("if x:\n    y()\n    z()")
@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+
+from fake_model import FakeGenerativeModel
+from model_router import MIN_HEDGE_DELAY, MIN_HEDGE_SAMPLES, ModelRouter, RouterUnavailable
+from rate_limiter import RateLimiter
+
+
+def test_failed_backend_falls_back_to_the_next():
+    broken, healthy = FakeGenerativeModel(error_rate=1.0), FakeGenerativeModel()
+    router = ModelRouter({"big": broken, "small": healthy}, hedge_after=None)
+    response = router.generate_content("prompt", task="mcq")
+    assert "title" in json.loads(response.text)
+    assert (broken.calls, healthy.calls) == (1, 1)
+    assert router.stats()["fallbacks"] == 1
+
+
+def test_circuit_opens_after_repeated_failures():
+    broken, healthy = FakeGenerativeModel(error_rate=1.0), FakeGenerativeModel()
+    # max_error_rate=1.0 keeps the broken backend first in line, so only the breaker stops it
+    router = ModelRouter({"big": broken, "small": healthy}, hedge_after=None, failure_threshold=2,
+                         max_error_rate=1.0)
+    for _ in range(4):
+        router.generate_content("prompt", task="summary")
+    # Open after two failures: later calls skip the broken backend entirely
+    assert broken.calls == 2
+    assert router.stats()["backends"]["big"]["circuit"] == "open"
+
+
+def test_all_backends_failing_raises():
+    router = ModelRouter({"a": FakeGenerativeModel(error_rate=1.0), "b": FakeGenerativeModel(error_rate=1.0)},
+                         hedge_after=None)
+    with pytest.raises(RouterUnavailable):
+        router.generate_content("prompt", task="mcq")
+
+
+def test_stream_falls_back_before_the_first_chunk():
+    router = ModelRouter({"a": FakeGenerativeModel(error_rate=1.0), "b": FakeGenerativeModel()})
+    text = "".join(chunk.text for chunk in router.generate_content("prompt", stream=True, task="report"))
+    assert text.startswith("# Progress Report")
+
+
+def test_slow_backend_is_hedged():
+    slow, fast = FakeGenerativeModel(latency=1.0), FakeGenerativeModel(latency=0.01)
+    router = ModelRouter({"slow": slow, "fast": fast}, hedge_after=0.3)
+    router.generate_content("prompt", task="mcq")
+    stats = router.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+    assert fast.calls == 1
+
+
+def test_hedge_delay_follows_task_p95_within_budget():
+    router = ModelRouter({"a": FakeGenerativeModel(latency=0.02)}, hedge_after=5.0,
+                         latency_budgets={"mcq": 3.0})
+    # Too few samples: the configured delay, capped by the task's budget
+    assert router.hedge_delay("mcq") == 3.0
+    assert router.hedge_delay("report") == 5.0
+    for _ in range(MIN_HEDGE_SAMPLES):
+        router.generate_content("prompt", task="mcq")
+    assert router.hedge_delay("mcq") == MIN_HEDGE_DELAY
+    # Each task keeps its own samples
+    assert router.hedge_delay("report") == 5.0
+    assert ModelRouter({"a": FakeGenerativeModel()}, hedge_after=None).hedge_delay("mcq") is None
+
+
+def test_hedge_is_skipped_without_spare_quota():
+    limiter = RateLimiter(requests_per_minute=2)
+    for _ in range(2):
+        limiter.acquire(1)
+    slow, fast = FakeGenerativeModel(latency=0.5), FakeGenerativeModel()
+    router = ModelRouter({"slow": slow, "fast": fast}, hedge_after=0.1, limiter=limiter)
+    router.generate_content("prompt", task="mcq")
+    stats = router.stats()
+    assert (stats["hedges"], stats["hedges_skipped"]) == (0, 1)
+    assert fast.calls == 0
+
+
+def test_hedge_is_charged_to_the_limiter():
+    limiter = RateLimiter(requests_per_minute=60)
+    router = ModelRouter({"slow": FakeGenerativeModel(latency=0.5), "fast": FakeGenerativeModel()},
+                         hedge_after=0.1, limiter=limiter)
+    router.generate_content("prompt", task="mcq")
+    assert router.stats()["hedges"] == 1
+    assert limiter.granted[1] == 1  # the hedge, at background priority
+    assert limiter.requests.level < 60
+
+
+def test_async_path_falls_back_and_hedges():
+    router = ModelRouter({"broken": FakeGenerativeModel(error_rate=1.0), "ok": FakeGenerativeModel()},
+                         hedge_after=None)
+    response = asyncio.run(router.generate_content_async("prompt", task="evaluation"))
+    assert json.loads(response.text)["is_correct"] is True
+
+    router = ModelRouter({"slow": FakeGenerativeModel(latency=1.0), "fast": FakeGenerativeModel()}, hedge_after=0.2)
+    asyncio.run(router.generate_content_async("prompt", task="mcq"))
+    assert router.stats()["hedges"] == 1
+
+
+def test_task_routes_pick_the_backend():
+    small, large = FakeGenerativeModel(), FakeGenerativeModel()
+    router = ModelRouter({"large": large, "small": small}, routes={"summary": ["small", "large"]}, hedge_after=None)
+    router.generate_content("prompt", task="summary")
+    router.generate_content("prompt", task="evaluation:hard")
+    # "summary" is routed to small first; unrouted tasks use registration order
+    assert (small.calls, large.calls) == (1, 1)
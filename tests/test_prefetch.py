@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fake_model import FakeGenerativeModel
+from llm_manager import LLMManager
+from prefetch import QuestionBatcher, QuestionPrefetcher
+
+KEY = ("Python", "Easy", "Quiz (MCQ)")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=3)
+    yield executor
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+@pytest.fixture
+def manager():
+    return LLMManager(None, model=FakeGenerativeModel(latency=0.01))
+
+
+def generate_with(manager):
+    def generate(language, difficulty, practice_mode, topic_history):
+        return manager.generate_mcq(language, difficulty, topic_history)
+    return generate
+
+
+def test_queue_refills_to_max_depth_below_the_watermark(manager, executor):
+    prefetcher = QuestionPrefetcher(generate_with(manager), max_depth=3, low_watermark=1, executor=executor)
+    prefetcher.set_active(KEY)
+    wait_for(lambda: prefetcher.depth(KEY) == 3)
+
+    first = prefetcher.get(KEY)
+    assert first is not None
+    # Two left: above the watermark, so nothing new is generated
+    assert prefetcher.depth(KEY) == 2
+    second = prefetcher.get(KEY)
+    wait_for(lambda: prefetcher.depth(KEY) == 3)
+    assert manager.model.calls == 5
+    assert first.title != second.title
+    assert prefetcher.stats.hits == 2
+
+
+def test_cancel_discards_queued_and_in_flight_questions(manager, executor):
+    release = threading.Event()
+    discarded = []
+
+    def generate(*args):
+        release.wait(5)
+        return manager.generate_mcq("Python", "Easy", [])
+
+    prefetcher = QuestionPrefetcher(generate, max_depth=2, low_watermark=0, executor=executor,
+                                    on_discard=lambda key, q: discarded.append(key))
+    prefetcher.set_active(KEY)
+    # Switching selection cancels the old queue while its workers are still generating
+    prefetcher.set_active(("Python", "Medium", "Quiz (MCQ)"))
+    release.set()
+    wait_for(lambda: discarded.count(KEY) == 2)
+    assert prefetcher.depth(KEY) == 0
+    assert prefetcher.get(KEY) is None
+
+    # Queued questions are handed to on_discard when cancelled, too
+    prefetcher.set_active(KEY)
+    wait_for(lambda: prefetcher.depth(KEY) == 2)
+    prefetcher.cancel(KEY)
+    assert discarded.count(KEY) == 4
+
+
+def test_served_and_queued_titles_are_not_served_again(manager, executor):
+    served = []
+    question = manager.generate_mcq("Python", "Easy", [])
+    # Every refill returns the same question
+    prefetcher = QuestionPrefetcher(lambda *args: question, max_depth=3, low_watermark=0, executor=executor,
+                                    on_serve=lambda key, q: served.append(q.title))
+    prefetcher.set_active(KEY)
+    wait_for(lambda: prefetcher.stats.refills == 3)
+    assert prefetcher.depth(KEY) == 1
+    assert prefetcher.stats.discarded == 2
+
+    assert prefetcher.get(KEY) is question
+    wait_for(lambda: prefetcher.stats.refills == 6)
+    # Copies of a served question never reach the queue
+    assert prefetcher.depth(KEY) == 0
+    assert prefetcher.get(KEY) is None
+    assert served == [question.title]
+
+
+def test_missed_question_marked_served_blocks_queued_copy(manager, executor):
+    question = manager.generate_mcq("Python", "Easy", [])
+    prefetcher = QuestionPrefetcher(lambda *args: question, max_depth=1, low_watermark=0, executor=executor)
+    prefetcher.set_active(KEY)
+    wait_for(lambda: prefetcher.depth(KEY) == 1)
+    prefetcher.mark_served(KEY, question)
+    assert prefetcher.get(KEY) is None
+
+
+def test_batcher_shares_one_call_and_skips_seen_titles(manager):
+    calls = []
+
+    def generate_batch(language, difficulty, practice_mode, topic_history, count):
+        calls.append(list(topic_history))
+        return manager.generate_mcq_batch(language, difficulty, count, topic_history)
+
+    batcher = QuestionBatcher(generate_batch, batch_size=3)
+    first = batcher.next(*KEY, [])
+    second = batcher.next(*KEY, [])
+    assert len(calls) == 1
+    assert first.title != second.title
+    # The last buffered question was already seen, so a new batch is generated
+    buffered = batcher._buffers[KEY][0]
+    batcher.next(*KEY, [first.title, second.title, buffered.title])
+    assert len(calls) == 2
+    assert batcher.as_dict()["discarded"] == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from llm_manager import CodingQuestion
+from llm_manager import TestCase as Case
+from profiler import ComplexityProfiler
+from sandbox import ExecutionEngine
+
+QUESTION = CodingQuestion(title="Sum", description="Return the sum.", examples=[],
+                          constraints=["1 <= nums.length <= 10^4"],
+                          starter_code="def solve(nums):\n    pass",
+                          test_cases=[Case(input="[[1, 2, 3]]", expected_output="6")])
+
+# A helper comes first; profiling it instead of solve() would measure the wrong function
+HELPER_FIRST = ("def add(a, b):\n    return a + b\n\n"
+                "def solve(nums):\n    total = 0\n    for n in nums:\n        total = add(total, n)\n    return total\n")
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = ExecutionEngine(max_workers=1, enabled=True)
+    yield engine
+    engine.shutdown()
+
+
+def test_profiles_the_starter_function(engine):
+    profiler = ComplexityProfiler(engine=engine, sizes=[100, 300, 1000, 3000, 10000], budget_ms=500)
+    result = profiler.profile(QUESTION, HELPER_FIRST, "Python")
+    assert result is not None
+    assert result.time_class != "O(1)"
+    assert not result.too_slow
+
+
+def test_nothing_runs_unless_local_execution_is_enabled():
+    engine = ExecutionEngine(max_workers=1)
+    try:
+        profiler = ComplexityProfiler(engine=engine)
+        assert not profiler.supports(QUESTION, "Python")
+        assert profiler.profile(QUESTION, HELPER_FIRST, "Python") is None
+    finally:
+        engine.shutdown()
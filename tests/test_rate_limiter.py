@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fake_model import FakeGenerativeModel
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimitedModel, RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_requests_per_minute_refill(clock):
+    limiter = RateLimiter(requests_per_minute=6, tokens_per_minute=10**6, background_reserve=0, clock=clock)
+    for _ in range(6):
+        assert limiter.acquire(1, INTERACTIVE) == 0.0
+    assert not limiter.try_acquire(1, INTERACTIVE)
+    # 6 per minute: one request comes back every 10 seconds
+    clock.advance(9)
+    assert not limiter.try_acquire(1, INTERACTIVE)
+    clock.advance(1)
+    assert limiter.try_acquire(1, INTERACTIVE)
+    assert not limiter.try_acquire(1, INTERACTIVE)
+    # Never refills past the bucket size
+    clock.advance(3600)
+    assert limiter.stats()["requests_available"] == 6
+
+
+def test_tokens_per_minute_refill(clock):
+    limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=600, background_reserve=0, clock=clock)
+    limiter.acquire(500, INTERACTIVE)
+    assert not limiter.try_acquire(200, INTERACTIVE)
+    assert limiter.try_acquire(100, INTERACTIVE)
+    # 10 tokens a second
+    clock.advance(19)
+    assert not limiter.try_acquire(200, INTERACTIVE)
+    clock.advance(1)
+    assert limiter.try_acquire(200, INTERACTIVE)
+
+
+def test_acquire_waits_for_the_refill(clock):
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10**6, clock=clock)
+    for _ in range(600):
+        limiter.acquire(1, INTERACTIVE)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        waiting = pool.submit(limiter.acquire, 1, INTERACTIVE)
+        # The waiter re-checks the (fake) clock after its 0.1s timeout
+        threading.Event().wait(0.05)
+        assert not waiting.done()
+        clock.advance(0.1)
+        assert waiting.result(timeout=5) == pytest.approx(0.1)
+
+
+def test_try_acquire_refusals(clock):
+    limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=10**6, background_reserve=0.2, clock=clock)
+    for _ in range(8):
+        assert limiter.try_acquire(1, BACKGROUND)
+    # Background calls leave the last 20% to interactive ones
+    assert not limiter.try_acquire(1, BACKGROUND)
+    assert limiter.try_acquire(1, INTERACTIVE)
+    granted = dict(limiter.granted)
+
+    # A 429 pauses the key, optional calls included
+    clock.advance(60)
+    limiter.backoff(0, Exception("429 quota exceeded, retry in 5s"))
+    assert not limiter.try_acquire(1, INTERACTIVE)
+    clock.advance(5)
+    assert limiter.try_acquire(1, INTERACTIVE)
+
+    # Nothing jumps ahead of a queued call
+    limiter._waiting.append((INTERACTIVE, -1))
+    assert not limiter.try_acquire(1, INTERACTIVE)
+    limiter._waiting.clear()
+    assert limiter.granted[BACKGROUND] == granted[BACKGROUND]
+
+
+def test_concurrent_identical_calls_share_one_request():
+    model = FakeGenerativeModel(latency=0.2)
+    limited = RateLimitedModel(model, RateLimiter(requests_per_minute=1000, tokens_per_minute=10**7))
+    barrier = threading.Barrier(5)
+
+    def evaluate():
+        barrier.wait()
+        return limited.generate_content("Evaluate this code: print(1)", task="evaluation").text
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        answers = list(pool.map(lambda _: evaluate(), range(5)))
+    assert model.calls == 1
+    assert len(set(answers)) == 1
+    assert limited.limiter.coalesced == 4
+
+
+def test_question_generation_is_not_coalesced():
+    model = FakeGenerativeModel(latency=0.05)
+    limited = RateLimitedModel(model, RateLimiter(requests_per_minute=1000, tokens_per_minute=10**7))
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(lambda _: limited.generate_content("Generate an MCQ", task="mcq"), range(3)))
+    assert model.calls == 3
+    assert limited.limiter.coalesced == 0
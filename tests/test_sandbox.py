@@ -0,0 +1,62 @@
+import shutil
+
+import pytest
+
+from llm_manager import CodingQuestion
+from llm_manager import TestCase as Case
+from precheck import PythonChecker
+from sandbox import ExecutionEngine, python_solution_entry
+
+
+def _question(starter_code: str = "def solve(nums):\n    pass") -> CodingQuestion:
+    return CodingQuestion(title="Sum", description="Return the sum.", examples=[], constraints=[],
+                          starter_code=starter_code,
+                          test_cases=[Case(input="[[1, 2, 3]]", expected_output="6"),
+                                      Case(input="[[-5, 5]]", expected_output="0")])
+
+
+HELPER_FIRST = "def add(a, b):\n    return a + b\n\ndef solve(nums):\n    total = 0\n    for n in nums:\n        total = add(total, n)\n    return total\n"
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = ExecutionEngine(max_workers=1, enabled=True)
+    yield engine
+    engine.shutdown()
+
+
+def test_entry_point_comes_from_the_starter_code():
+    assert python_solution_entry(_question(), HELPER_FIRST) == "solve"
+    # A bare signature (doesn't parse) still names the function
+    assert python_solution_entry(_question("def solve(nums):"), HELPER_FIRST) == "solve"
+    # Without a starter function, the user's first function is used
+    assert python_solution_entry(_question(""), "def total(nums):\n    return sum(nums)") == "total"
+    assert PythonChecker().entry_point("def solve(nums):") == "solve"
+
+
+def test_helper_defined_before_the_solution_is_graded_correctly(engine):
+    result = engine.run(_question(), HELPER_FIRST, "Python")
+    assert result.all_passed, result
+
+
+def test_wrong_answer_and_runtime_error(engine):
+    wrong = engine.run(_question(), "def solve(nums):\n    return 0", "Python")
+    assert (wrong.passed, wrong.total) == (1, 2)
+    broken = engine.run(_question(), "def solve(nums):\n    return nums[10]", "Python")
+    assert broken.passed == 0 and "IndexError" in (broken.cases[0].error or "")
+
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_javascript_entry_point_comes_from_the_starter_code(engine):
+    question = _question("function solve(nums) {\n}")
+    code = "function add(a, b) { return a + b; }\nfunction solve(nums) { return nums.reduce(add, 0); }"
+    assert engine.run(question, code, "JavaScript").all_passed
+
+
+def test_nothing_runs_unless_enabled():
+    engine = ExecutionEngine(max_workers=1)
+    assert not engine.supports("Python")
+    assert engine.run(_question(), HELPER_FIRST, "Python") is None
+    with pytest.raises(RuntimeError):
+        engine.run_harness(["true"], {}, [], None)
+    engine.shutdown()
@@ -0,0 +1,95 @@
+import pytest
+
+from llm_manager import Evaluation
+from session_store import (InProcessSessionStore, LocalRedis, RedisSessionStore, SessionConflict, _LocalPipeline,
+                           decode_state, encode_state)
+
+
+@pytest.fixture(params=["memory", "local-redis"])
+def store(request):
+    if request.param == "memory":
+        return InProcessSessionStore()
+    return RedisSessionStore(LocalRedis())
+
+
+def test_versions_start_at_one_and_grow_per_save(store):
+    assert store.load("s") == (None, 0)
+    assert store.save("s", b"jfirst", 0) == 1
+    assert store.save("s", b"jsecond", 1) == 2
+    assert store.load("s") == (b"jsecond", 2)
+    assert store.version("s") == 2
+
+
+def test_save_from_a_stale_version_conflicts(store):
+    store.save("s", b"jbase", 0)
+    # Two replicas load version 1; the first save wins, the second must not overwrite it
+    store.save("s", b"jreplica-a", 1)
+    with pytest.raises(SessionConflict) as conflict:
+        store.save("s", b"jreplica-b", 1)
+    assert (conflict.value.expected, conflict.value.actual) == (1, 2)
+    assert store.load("s") == (b"jreplica-a", 2)
+
+
+def test_creating_an_existing_session_conflicts(store):
+    store.save("s", b"jfirst", 0)
+    with pytest.raises(SessionConflict):
+        store.save("s", b"jagain", 0)
+
+
+def test_delete_resets_the_version(store):
+    store.save("s", b"jdata", 0)
+    store.delete("s")
+    assert store.load("s") == (None, 0)
+    assert store.save("s", b"jnew", 0) == 1
+
+
+class _RacingRedis(LocalRedis):
+    # Another replica writes the session between this save's WATCH and its EXEC
+    def __init__(self):
+        super().__init__()
+        self.race = None
+
+    def pipeline(self):
+        redis = self
+
+        class Pipeline(_LocalPipeline):
+            def multi(self):
+                if redis.race is not None:
+                    race, redis.race = redis.race, None
+                    race()
+                super().multi()
+        return Pipeline(self)
+
+
+def test_redis_write_between_watch_and_exec_conflicts():
+    client = _RacingRedis()
+    store = RedisSessionStore(client)
+    other = RedisSessionStore(client)
+    store.save("s", b"jbase", 0)
+    client.race = lambda: other.save("s", b"jother", 1)
+    with pytest.raises(SessionConflict) as conflict:
+        store.save("s", b"jmine", 1)
+    assert conflict.value.actual == 2
+    assert store.load("s") == (b"jother", 2)
+
+
+def test_expired_sessions_are_gone():
+    now = [1000.0]
+    memory = InProcessSessionStore(ttl=10, clock=lambda: now[0])
+    redis = RedisSessionStore(LocalRedis(clock=lambda: now[0]), ttl=10)
+    for store in (memory, redis):
+        store.save("s", b"jdata", 0)
+    now[0] += 11
+    for store in (memory, redis):
+        assert store.load("s") == (None, 0)
+        assert store.save("s", b"jfresh", 0) == 1
+
+
+def test_state_round_trips_models():
+    evaluation = Evaluation(is_correct=True, explanation="ok " * 300, tips=["a"], rating=9)
+    payload = encode_state({"feedback": evaluation, "score": 3})
+    # Large payloads are compressed
+    assert payload[:1] == b"z"
+    state = decode_state(payload)
+    assert state["score"] == 3
+    assert state["feedback"] == evaluation
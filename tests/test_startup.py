@@ -0,0 +1,12 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_startup_within_budget():
+    # Fresh interpreter, as check_startup.py needs: nothing imported by this test run may leak in
+    result = subprocess.run([sys.executable, "check_startup.py"], cwd=ROOT, capture_output=True, text=True,
+                            timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
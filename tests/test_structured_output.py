@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from llm_manager import Evaluation, MCQQuestion
+from structured_output import (StructuredOutputError, StructuredOutputStats, _TolerantParser, generate_items,
+                               generate_structured, parse_items, parse_structured)
+
+
+def _mcq(n: int) -> dict:
+    return {"title": f"Question {n}", "options": ["a", "b", "c", "d"], "correct_option_index": n % 4,
+            "explanation": "because"}
+
+
+EVALUATION = json.dumps({"is_correct": True, "explanation": "Fine.", "tips": ["Test more"], "rating": 8})
+
+
+class Scripted:
+    # generate(prompt, generation_config) that returns the queued responses in order
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+        self.configs = []
+
+    def __call__(self, prompt, generation_config):
+        self.prompts.append(prompt)
+        self.configs.append(generation_config)
+        return self.responses.pop(0)
+
+
+def test_tolerant_parse_accepts_common_model_mistakes():
+    text = "Sure! ```json\n{'is_correct': True, explanation: 'Fine.', 'tips': ['Test more',], 'rating': 8,}\n```"
+    assert parse_structured(text, Evaluation).rating == 8
+
+
+def test_partial_array_keeps_elements_complete_before_the_cut():
+    text = json.dumps({"questions": [_mcq(1), _mcq(2), _mcq(3)]})
+    cut = text[:text.index("Question 3") + 5]
+    assert [q["title"] for q in _TolerantParser(cut).partial_array()] == ["Question 1", "Question 2"]
+    assert _TolerantParser("no array here").partial_array() == []
+
+
+def test_parse_items_drops_only_invalid_elements():
+    bad = dict(_mcq(2), correct_option_index="not a number")
+    items, errors = parse_items(json.dumps({"questions": [_mcq(1), bad, _mcq(3)]}), MCQQuestion, "questions")
+    assert [q.title for q in items] == ["Question 1", "Question 3"]
+    assert len(errors) == 1 and errors[0].startswith("item 1")
+
+
+def test_parse_items_recovers_a_truncated_response():
+    text = json.dumps({"questions": [_mcq(1), _mcq(2)]})
+    items, errors = parse_items(text[:-30], MCQQuestion, "questions")
+    assert [q.title for q in items] == ["Question 1"]
+    assert errors == []
+    # A bare array works too
+    items, _ = parse_items(json.dumps([_mcq(5)]), MCQQuestion, "questions")
+    assert items[0].title == "Question 5"
+
+
+def test_parse_items_raises_when_nothing_is_readable():
+    with pytest.raises(StructuredOutputError):
+        parse_items("I could not come up with any questions.", MCQQuestion, "questions")
+
+
+def test_generate_structured_repairs_then_succeeds():
+    stats = StructuredOutputStats()
+    generate = Scripted('{"is_correct": true, "explanation": "Fi', EVALUATION)
+    evaluation = generate_structured(generate, "prompt", Evaluation, stats, native_json=True)
+    assert evaluation.rating == 8
+    # The repair round sends the broken output back and keeps JSON mode
+    assert "could not be parsed or validated" in generate.prompts[1]
+    assert '"explanation": "Fi' in generate.prompts[1]
+    assert generate.configs == [{"response_mime_type": "application/json"}] * 2
+    summary = stats.summary()["Evaluation"]
+    assert (summary["calls"], summary["repaired_calls"], summary["failures"]) == (1, 1, 0)
+
+
+def test_generate_structured_gives_up_after_max_repairs():
+    stats = StructuredOutputStats()
+    generate = Scripted("nope", "still nope")
+    with pytest.raises(StructuredOutputError):
+        generate_structured(generate, "prompt", Evaluation, stats, max_repairs=1)
+    assert len(generate.prompts) == 2
+    assert stats.summary()["Evaluation"]["failures"] == 1
+
+
+def test_generate_items_skips_repair_when_some_items_survive():
+    stats = StructuredOutputStats()
+    text = json.dumps({"questions": [_mcq(1), _mcq(2)]})
+    generate = Scripted(text[:-30])
+    items = generate_items(generate, "prompt", MCQQuestion, "questions", stats)
+    assert [q.title for q in items] == ["Question 1"]
+    assert len(generate.prompts) == 1
+    assert stats.summary()["MCQQuestion[]"]["repaired_calls"] == 0
+
+
+def test_generate_items_repairs_when_no_item_survives():
+    stats = StructuredOutputStats()
+    bad = json.dumps({"questions": [{"title": "Question 1"}]})
+    generate = Scripted(bad, json.dumps({"questions": [_mcq(1), _mcq(2)]}))
+    items = generate_items(generate, "prompt", MCQQuestion, "questions", stats)
+    assert len(items) == 2
+    assert stats.summary()["MCQQuestion[]"]["repaired_calls"] == 1
+
+    generate = Scripted(bad, bad)
+    with pytest.raises(StructuredOutputError):
+        generate_items(generate, "prompt", MCQQuestion, "questions", stats, max_repairs=1)
@@ -1,81 +1,167 @@
-from fpdf import FPDF
+import functools
 import io
+import time
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import base64
+import uuid
+from history_store import get_history_store
+from pdf_report import parse_markdown, render_pdf
+from prefetch import get_shared_executor
+from session_store import SessionConflict, decode_state, encode_state, get_session_store, payload_digest
+from telemetry import get_telemetry, span
+
+# Only the most recent answers stay in st.session_state; everything else is read from the history store
+HISTORY_WORKING_SET = 50
+TOPIC_HISTORY_LIMIT = 200
+
+# Keys mirrored to the session store so any replica can resume the session. Futures, the prefetcher,
+# the history digest and telemetry spans stay process-local and are rebuilt where they are missing.
+SESSION_KEYS = ("current_question", "question_start_time", "feedback", "question_answered", "trigger_next",
+                "practice_mode", "history", "topic_history", "score",
+                "language", "difficulty", "practice_mode_choice")  # the last three are sidebar widgets
+
+@functools.lru_cache(maxsize=None)
+def read_static(path):
+    # Static assets (style.css) are read from disk once per process, not on every rerun
+    with open(path) as f:
+        return f.read()
+
+def get_user_id():
+    # The session id lives in the URL (?sid=...), so a refresh or reconnect resumes the same history
+    sid = st.query_params.get("sid")
+    if not sid:
+        sid = uuid.uuid4().hex
+        st.query_params["sid"] = sid
+    return sid
 
 def init_session_state():
+    if "user_id" not in st.session_state:
+        st.session_state.user_id = get_user_id()
+    sync_session_state()
     if "messages" not in st.session_state:
         st.session_state.messages = []
     if "current_question" not in st.session_state:
         st.session_state.current_question = None
     if "history" not in st.session_state:
-        st.session_state.history = []
-    if "score" not in st.session_state:
-        st.session_state.score = 0
+        store = get_history_store()
+        st.session_state.history = store.query(st.session_state.user_id, limit=HISTORY_WORKING_SET)[::-1]
+        st.session_state.topic_history = store.recent_titles(st.session_state.user_id, limit=TOPIC_HISTORY_LIMIT)
+        st.session_state.score = store.score(st.session_state.user_id)
     if "question_start_time" not in st.session_state:
         st.session_state.question_start_time = None
     if "feedback" not in st.session_state:
         st.session_state.feedback = None
     if "question_answered" not in st.session_state:
         st.session_state.question_answered = False
+    if "mentor_request" not in st.session_state:
+        st.session_state.mentor_request = None
+    if "profile_future" not in st.session_state:
+        st.session_state.profile_future = None
 
-def create_pdf_report(markdown_text):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_margins(10, 10, 10)
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.set_font("Arial", size=12)
-    
-    # Calculate effective width: 210mm (A4) - 20mm (margins) = 190mm
-    effective_width = 190
+def sync_session_state():
+    # Adopts the stored copy when it is newer than ours: a new connection resuming the session, or a
+    # rerun served here after another replica handled the previous one. Must run before any widget.
+    store = get_session_store()
+    user_id = st.session_state.user_id
+    if store.version(user_id) == st.session_state.get("session_version", 0):
+        return
+    payload, version = store.load(user_id)
+    if payload is not None:
+        for key, value in decode_state(payload).items():
+            st.session_state[key] = value
+    st.session_state.session_version = version
+    st.session_state.session_digest = payload_digest(payload) if payload is not None else None
+
+def save_session_state():
+    # Writes SESSION_KEYS back when they changed during this run. Writes are optimistic: if another
+    # replica saved first, its copy wins and is picked up by sync_session_state on the next rerun.
+    state = {key: st.session_state[key] for key in SESSION_KEYS if key in st.session_state}
+    payload = encode_state(state)
+    digest = payload_digest(payload)
+    if digest == st.session_state.get("session_digest"):
+        return
+    user_id = st.session_state.user_id
+    with span("session_save", bytes=len(payload)):
+        try:
+            st.session_state.session_version = get_session_store().save(
+                user_id, payload, st.session_state.get("session_version", 0))
+            st.session_state.session_digest = digest
+        except SessionConflict as e:
+            print(f"Session {user_id} was saved elsewhere (version {e.actual}); keeping that copy")
 
-    # Sanitize text to latin-1 to avoid font issues with core fonts
-    def sanitize(text):
-        # Replace common problematic characters
-        text = text.replace('”', '"').replace('“', '"').replace('’', "'").replace('—', '-')
-        return text.encode('latin-1', 'replace').decode('latin-1')
+def record_history(entry):
+    # Appends to the persistent store and to the bounded in-session working set; returns the entry id
+    entry["id"] = get_history_store().append(st.session_state.user_id, entry)
+    st.session_state.history.append(entry)
+    del st.session_state.history[:-HISTORY_WORKING_SET]
+    st.session_state.topic_history.append(entry["question"])
+    del st.session_state.topic_history[:-TOPIC_HISTORY_LIMIT]
+    if entry.get("is_correct"):
+        st.session_state.score += 1
+    digest = st.session_state.get("history_digest")
+    if digest is not None and digest.add(entry):
+        # A chunk of older answers just completed; summarize it now so the report never waits on it
+        get_shared_executor().submit(digest.summarize_pending)
+    return entry["id"]
 
-    # Helper to split extremely long words that break PDF generation
-    def safe_text(text):
-        words = text.split()
-        safe_words = []
-        for word in words:
-            if len(word) > 45: # Break words longer than ~45 chars
-                # Insert chunks
-                chunks = [word[i:i+45] for i in range(0, len(word), 45)]
-                safe_words.append(" ".join(chunks))
-            else:
-                safe_words.append(word)
-        return " ".join(safe_words)
+def begin_rerun(name="streamlit_rerun", **attributes):
+    # One span per script run (or fragment-only run); LLM calls made by the script nest under it.
+    # cpu_ms is this thread's CPU time for the run, i.e. the server cost of one interaction.
+    telemetry = get_telemetry()
+    stale = st.session_state.get("rerun_span")
+    if stale is not None:
+        # The previous run ended in st.stop() or an exception and never closed its span
+        telemetry.discard(stale)
+    counts = st.session_state.setdefault("rerun_counts", {"app": 0, "fragment": 0})
+    counts["fragment" if name == "streamlit_fragment" else "app"] += 1
+    st.session_state.rerun_cpu_start = time.thread_time()
+    st.session_state.rerun_span = telemetry.start(name, **attributes)
 
-    lines = markdown_text.split('\n')
-    
-    for line in lines:
-        line = sanitize(line.strip())
-        if not line:
-            pdf.ln(5)
-            continue
-            
-        if line.startswith('# '):
-            pdf.set_font("Arial", 'B', 16)
-            pdf.multi_cell(0, 10, safe_text(line.replace('# ', '')))
-            pdf.set_font("Arial", size=12)
-        elif line.startswith('## '):
-            pdf.set_font("Arial", 'B', 14)
-            pdf.multi_cell(0, 10, safe_text(line.replace('## ', '')))
-            pdf.set_font("Arial", size=12)
-        elif line.startswith('### '):
-            pdf.set_font("Arial", 'B', 12)
-            pdf.multi_cell(0, 10, safe_text(line.replace('### ', '')))
-            pdf.set_font("Arial", size=12)
-        else:
-            line = line.replace('**', '')
-            # Use write() for better flow handling of wrapping
-            # Add a trailing space or newline to ensure separation
-            pdf.write(6, safe_text(line))
-            pdf.ln(6) # Explicit newline after paragraph
-            
-    return bytes(pdf.output(dest='S')) # Output as bytes
+def end_rerun(outcome="complete"):
+    span = st.session_state.get("rerun_span")
+    if span is not None:
+        st.session_state.rerun_span = None
+        cpu_ms = (time.thread_time() - st.session_state.get("rerun_cpu_start", time.thread_time())) * 1000
+        span.set(outcome=outcome, cpu_ms=round(cpu_ms, 3))
+        get_telemetry().end(span)
+
+def rerun(scope="app"):
+    # st.rerun() that saves the session and closes this run's telemetry span first.
+    # scope="fragment" needs a fragment-only run; inside a full run it falls back to a full rerun.
+    if scope == "fragment" and not fragment_rerun_active():
+        scope = "app"
+    save_session_state()
+    end_rerun("rerun")
+    st.rerun(scope=scope)
+
+def fragment_rerun_active():
+    # True while Streamlit reruns only fragments, so app.py's main body is not executing
+    ctx = get_script_run_ctx()
+    return bool(ctx is not None and ctx.fragment_ids_this_run)
+
+def fragment(func):
+    # st.fragment plus the bookkeeping app.py does around a full run (telemetry span, session save),
+    # applied when the fragment reruns on its own. Nested fragments inherit the outer one's.
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        if not fragment_rerun_active() or st.session_state.get("fragment_run_active"):
+            return func(*args, **kwargs)
+        st.session_state.fragment_run_active = True
+        try:
+            begin_rerun("streamlit_fragment", fragment=func.__name__)
+            func(*args, **kwargs)
+            save_session_state()
+            end_rerun()
+        finally:
+            st.session_state.fragment_run_active = False
+    return st.fragment(run)
+
+def create_pdf_report(markdown_text):
+    # PDF bytes for callers that need them in memory; the app serves pdf_report's cached file instead
+    buffer = io.BytesIO()
+    render_pdf(parse_markdown(markdown_text), buffer)
+    return buffer.getvalue()
 
 def get_base64_download_link(file_data, filename, label, mime_type='text/plain'):
     if isinstance(file_data, str):